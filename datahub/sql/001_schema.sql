@@ -103,3 +103,13 @@ create table if not exists features (
   unique(symbol, interval, open_time)
 );
 create index if not exists ix_features_sym_int_time on features(symbol, interval, open_time);
+
+-- Sketch P² dos quantis de regime (src/features/quantiles.py)
+create table if not exists feature_quantile_sketch (
+  symbol text not null,
+  interval text not null,
+  name text not null,
+  state jsonb not null,
+  updated_at timestamptz not null default now(),
+  primary key (symbol, interval, name)
+);
@@ -1,7 +1,9 @@
 import os, numpy as np, pandas as pd
 from utils.db import tx
-from ta.trend import ADXIndicator
-from ta.volatility import AverageTrueRange, BollingerBands
+from src.features.copy_writer import copy_upsert
+from src.features.zscore import group_zscore
+from src.features.quantiles import SKETCH_DDL, REGIME_QS, regime_labels, load_sketch, save_sketch
+from src.features import kernels as K
 import logging, sys
 logging.basicConfig(level=logging.INFO,
     format='%(asctime)s [%(levelname)s] %(message)s',
@@ -28,7 +30,19 @@ def load_candles(symbol, interval, lookback=1500):
     df = df.dropna(subset=["high","low","close"]).reset_index(drop=True)
     return df
 
-def compute_features(df: pd.DataFrame) -> pd.DataFrame:
+def load_regimes(symbol, interval, since):
+    """vol_regime já gravado em `features` (open_time UTC -> rótulo) a partir de since."""
+    with tx() as cur:
+        cur.execute("select open_time, vol_regime from features where symbol=%s and interval=%s and open_time >= %s",
+                    (symbol, interval, since))
+        rows = cur.fetchall()
+    if not rows: return pd.Series(dtype=object)
+    return pd.Series([r[1] for r in rows], index=pd.to_datetime([r[0] for r in rows], utc=True), dtype=object)
+
+def interval_delta(interval: str) -> pd.Timedelta:
+    return pd.Timedelta(int(interval[:-1]), unit={"m": "min", "h": "h", "d": "D", "w": "W"}[interval[-1]])
+
+def compute_features(df: pd.DataFrame, sketch=None, regimes=None) -> pd.DataFrame:
     if df.empty or len(df) < 50: return pd.DataFrame()
 
     # Tendência
@@ -39,27 +53,28 @@ def compute_features(df: pd.DataFrame) -> pd.DataFrame:
     df["vwap"] = pv / vv
     df["vwap_slope"] = df["vwap"].diff()
 
-    # ADX 14
-    adx = ADXIndicator(high=df["high"], low=df["low"], close=df["close"], window=14)
-    df["adx_14"] = adx.adx()
+    # ADX 14 / ATR 14 / Bollinger 20 (kernels NumPy com a semântica da biblioteca ta, method="ta")
+    h, l, c = (df[k].to_numpy() for k in ("high", "low", "close"))
+    df["adx_14"] = K.adx(h, l, c, 14, method="ta")
 
     # Volatilidade
-    atr = AverageTrueRange(high=df["high"], low=df["low"], close=df["close"], window=14).average_true_range()
-    df["atrp_14"] = atr / df["close"]
-    bb = BollingerBands(close=df["close"], window=20, window_dev=2)
-    mavg = df["close"].rolling(20).mean()
-    df["bb_width_20"] = (bb.bollinger_hband() - bb.bollinger_lband()) / mavg
+    df["atrp_14"] = K.atr(h, l, c, 14, method="ta") / c
+    df["bb_width_20"] = K.bb_width(c, 20, 2.0)
 
-    # Regime por quantis
+    # Regime por quantis (sketch P² persistido por símbolo/intervalo; sem sketch, quantis da janela);
+    # linhas já gravadas (`regimes`, open_time -> rótulo) mantêm o rótulo, só as novas usam as fronteiras atuais
     valid_atrp = df["atrp_14"].dropna()
     if valid_atrp.empty: return pd.DataFrame()
-    q_low, q_high = valid_atrp.quantile([0.33, 0.66])
-    def regime(x):
-        if pd.isna(x): return np.nan
-        if x <= q_low: return "low"
-        if x <= q_high: return "mid"
-        return "high"
-    df["vol_regime"] = df["atrp_14"].apply(regime)
+    if sketch is not None:
+        sketch.update(df["atrp_14"].to_numpy(), pd.DatetimeIndex(pd.to_datetime(df["open_time"], utc=True)).asi8)
+        bounds = sketch.bounds()
+    else:
+        bounds = valid_atrp.quantile(list(REGIME_QS)).to_numpy()
+    labels = regime_labels(df["atrp_14"].to_numpy(), bounds)
+    if regimes is not None and len(regimes):
+        old = regimes.reindex(pd.to_datetime(df["open_time"], utc=True))
+        labels = np.where(old.notna().to_numpy(), old.to_numpy(dtype=object), labels)
+    df["vol_regime"] = labels
 
     # Placeholders de fluxo
     if "delta_aggressor_5m" not in df.columns: df["delta_aggressor_5m"] = np.nan
@@ -67,14 +82,9 @@ def compute_features(df: pd.DataFrame) -> pd.DataFrame:
 
     # Z-scores por regime
     zcols = ["ema_slope_20","vwap_slope","adx_14","atrp_14","bb_width_20","delta_aggressor_5m","bid_ask_ratio_5m"]
-    for reg in ["low","mid","high"]:
-        m = df["vol_regime"] == reg
-        for col in zcols:
-            mu = df.loc[m, col].mean()
-            sd = df.loc[m, col].std()
-            denom = sd if (pd.notna(sd) and sd and sd>0) else 1.0
-            outcol = f"z_{'bb_width_20' if col=='bb_width_20' else col}"
-            df.loc[m, outcol] = (df.loc[m, col] - mu) / denom
+    z = group_zscore(df[zcols].to_numpy(dtype=float), df["vol_regime"].to_numpy(), fallback=1.0)
+    for i, col in enumerate(zcols):
+        df[f"z_{col}"] = z[:, i]
 
     # aliases para nomes esperados no upsert
     df["z_delta_aggr_5m"] = df["z_delta_aggressor_5m"] if "z_delta_aggressor_5m" in df else np.nan
@@ -82,49 +92,45 @@ def compute_features(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
+FEATURES_SPEC = [
+    ("symbol", "text"), ("interval", "text"), ("open_time", "timestamptz"),
+    ("ema_slope_20", "float8"), ("vwap_slope", "float8"), ("adx_14", "float8"),
+    ("atrp_14", "float8"), ("bb_width_20", "float8"),
+    ("delta_aggressor_5m", "float8"), ("bid_ask_ratio_5m", "float8"), ("vol_regime", "text"),
+    ("z_ema_slope_20", "float8"), ("z_vwap_slope", "float8"), ("z_adx_14", "float8"), ("z_atrp_14", "float8"),
+    ("z_bb_width_20", "float8"), ("z_delta_aggr_5m", "float8"), ("z_bidask_5m", "float8"),
+]
+
 def upsert_features(symbol: str, interval: str, df: pd.DataFrame):
-    cols = ["open_time","ema_slope_20","vwap_slope","adx_14","atrp_14","bb_width_20",
-            "delta_aggressor_5m","bid_ask_ratio_5m","vol_regime",
-            "z_ema_slope_20","z_vwap_slope","z_adx_14","z_atrp_14","z_bb_width_20","z_delta_aggr_5m","z_bidask_5m"]
+    cols = [c for c, _ in FEATURES_SPEC if c not in ("symbol", "interval")]
     out = df[cols].dropna(subset=["ema_slope_20","vwap_slope","adx_14","atrp_14","bb_width_20"]).tail(800)
     if out.empty: return
+    out = out.assign(symbol=symbol, interval=interval)
+    # COPY binário -> staging -> upsert (uma ida ao banco por lote, sem INSERT por linha)
     with tx() as cur:
-        for _, r in out.iterrows():
-            cur.execute("""
-            insert into features (symbol, interval, open_time,
-              ema_slope_20, vwap_slope, adx_14, atrp_14, bb_width_20,
-              delta_aggressor_5m, bid_ask_ratio_5m, vol_regime,
-              z_ema_slope_20, z_vwap_slope, z_adx_14, z_atrp_14, z_bb_width_20, z_delta_aggr_5m, z_bidask_5m)
-            values (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            on conflict (symbol, interval, open_time) do update set
-              ema_slope_20=excluded.ema_slope_20,
-              vwap_slope=excluded.vwap_slope,
-              adx_14=excluded.adx_14,
-              atrp_14=excluded.atrp_14,
-              bb_width_20=excluded.bb_width_20,
-              delta_aggressor_5m=excluded.delta_aggressor_5m,
-              bid_ask_ratio_5m=excluded.bid_ask_ratio_5m,
-              vol_regime=excluded.vol_regime,
-              z_ema_slope_20=excluded.z_ema_slope_20,
-              z_vwap_slope=excluded.z_vwap_slope,
-              z_adx_14=excluded.z_adx_14,
-              z_atrp_14=excluded.z_atrp_14,
-              z_bb_width_20=excluded.z_bb_width_20,
-              z_delta_aggr_5m=excluded.z_delta_aggr_5m,
-              z_bidask_5m=excluded.z_bidask_5m;
-            """,(symbol, interval, r["open_time"],
-                 r["ema_slope_20"], r["vwap_slope"], r["adx_14"], r["atrp_14"], r["bb_width_20"],
-                 r["delta_aggressor_5m"], r["bid_ask_ratio_5m"], r["vol_regime"],
-                 r["z_ema_slope_20"], r["z_vwap_slope"], r["z_adx_14"], r["z_atrp_14"],
-                 r["z_bb_width_20"], r["z_delta_aggr_5m"], r["z_bidask_5m"]))
+        copy_upsert(cur, "features", out, FEATURES_SPEC, key=("symbol", "interval", "open_time"))
 def run_once():
+    with tx() as cur:
+        cur.execute(SKETCH_DDL)
     for s in SYMBOLS:
         for itv in INTERVALS:
             df = load_candles(s, itv)
+            # só barras fechadas: a em formação entraria no sketch e seria gravada uma vez, incompleta
+            if not df.empty:
+                df = df[pd.to_datetime(df["open_time"], utc=True) + interval_delta(itv) <= pd.Timestamp.now(tz="UTC")].reset_index(drop=True)
             if df.empty: continue
-            fdf = compute_features(df)
+            with tx() as cur:
+                sketch = load_sketch(cur, s, itv)
+            regimes = load_regimes(s, itv, df["open_time"].iloc[0])
+            seen = sketch.last_ts
+            fdf = compute_features(df, sketch, regimes)
             if fdf.empty: continue
+            # grava só as barras depois da marca d'água do sketch: as anteriores já têm regime/z gravados
+            if seen is not None:
+                fdf = fdf[pd.DatetimeIndex(pd.to_datetime(fdf["open_time"], utc=True)).asi8 > seen]
             upsert_features(s, itv, fdf)
+            with tx() as cur:
+                save_sketch(cur, s, itv, sketch)
 
 if __name__ == "__main__":
     run_once()
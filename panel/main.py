@@ -158,3 +158,22 @@ def svc_stop(service_name: str, _: bool = Depends(auth)):
 def svc_restart(service_name: str, _: bool = Depends(auth)):
     svc = check_allowed(service_name)
     return {"ok": True, "out": run(["/usr/bin/sudo -n systemctl","restart",svc], use_sudo=True)}
+
+@app.get("/api/features/{symbol}/{timeframe}")
+def features_latest(symbol: str, timeframe: str, n: int = Query(20, ge=1, le=2000), _: bool = Depends(auth)):
+    # leitura read-only dos rings publicados por src.features.shm_ring (sem recalcular indicadores)
+    try:
+        from src.features.shm_ring import attach_or_none, list_rings
+    except ImportError as e:
+        raise HTTPException(status_code=503, detail=f"feature ring indisponível: {e}")
+    versions = list_rings(symbol, timeframe)
+    if not versions:
+        raise HTTPException(status_code=404, detail=f"nenhum ring publicado para {symbol} {timeframe}")
+    out = []
+    for v in versions:
+        ring = attach_or_none(symbol, timeframe, v)
+        if ring is None:
+            continue
+        df = ring.frame(n); ring.close()
+        out.append({"version": v, "rows": df.astype(str).to_dict("records")})
+    return out
@@ -2,5 +2,5 @@
 set -euo pipefail
 sudo -n systemctl --user stop features-engine.timer
 source datahub/.venv/bin/activate
-PYTHONPATH=$PWD/datahub/src python -m features.engine
+PYTHONPATH=$PWD/datahub/src:$PWD python -m features.engine
 sudo -n systemctl --user start features-engine.timer
@@ -0,0 +1,375 @@
+import numpy as np
+import pandas as pd
+from src.features.jit import NUMBA, njit
+
+# Núcleo de backtest sobre arrays para strategies/trend_v31.run_trend e meanrev_v31.run_meanrev.
+# - colunas viram arrays uma vez; a máquina de estados da posição roda sobre floats simples
+#   (compilada com numba quando disponível, mesma chave FEATURE_JIT=0 de src/features/jit.py);
+# - meanrev não carrega posição entre barras (sinal em i, saída em i+1): é inteiramente vetorizado;
+# - trades saem como array estruturado (TRADE); run_trend/run_meanrev devolvem a mesma tupla
+#   (pnl_total, trades, wins, losses) das versões originais, com as mesmas contas na mesma ordem;
+# - run_regimes é o laço dos orquestradores: blocos de regime por run-length (np.diff) e núcleos sobre
+#   fatias das colunas (sem cópia de DataFrame por bloco); single_pass=True roda cada estratégia uma
+#   vez no histórico inteiro com o bloco de regime como coluna de entrada (ver run_regimes);
+# - com sub-barras (src/backtest/intrabar.py) TP/stop viram ordens em repouso checadas contra o caminho
+#   1m de cada barra com posição aberta (primeiro toque); sem elas, tudo como antes (só o close).
+#
+# paridade/tempo: python -m src.scripts.bench_backtest
+
+TRADE = np.dtype([("bar", np.int64), ("pnl", np.float64), ("side", np.int8), ("partial", np.bool_)])
+
+
+def trend_params(cfg: dict) -> np.ndarray:
+    ex = cfg["execution"]; flt = cfg["filters"]; fee = cfg["slippage_fees"]; risk = cfg["risk"]
+    slip_base = fee.get("slip_bps_base", fee.get("slippage_bps", 0.0))
+    return np.array([
+        ex["tp_atr_mult"], ex["sl_atr_mult"], ex["partial_at_r"], ex["trailing_after_r"], ex["trailing_atr_mult"],
+        1.0 if ex["mode"] == "maker_first" else 0.0,
+        fee["maker_bps"], fee["taker_bps"], slip_base, fee.get("slip_bps_perc_of_atr", 0.10),
+        flt["adx_trend_min"], flt.get("block_funding_minutes", 0),
+        risk["capital_usdt"], risk["risk_per_trade_pct"] / 100.0, risk["max_consecutive_losses"],
+    ], dtype=np.float64)
+
+
+def _py_touch(op, hp, lp, lo, hi, side, tp, stop):
+    # primeiro toque de tp/stop nas sub-barras [lo, hi): (1 tp | -1 stop | 0 nada, preço de fill)
+    # stop antes de tp quando os dois cabem na mesma sub-barra (conservador); gap além do stop sai na abertura
+    for k in range(lo, hi):
+        o = op[k]
+        if side == 1:
+            if o <= stop:
+                return -1, o
+            if lp[k] <= stop:
+                return -1, stop
+            if hp[k] >= tp:
+                return 1, tp
+        else:
+            if o >= stop:
+                return -1, o
+            if hp[k] >= stop:
+                return -1, stop
+            if lp[k] <= tp:
+                return 1, tp
+    return 0, 0.0
+
+
+_touch = njit(cache=True, nogil=True)(_py_touch) if NUMBA else _py_touch
+
+
+def _py_trend(close, atr, adx, emaf, emas, minute, seg, keep, p, lo, hi, op, hp, lp):
+    # laço de run_trend; devolve (barra, pnl, lado, parcial)
+    # seg[i]: bloco de regime da linha (< 0 = fora de qualquer bloco: posição aberta é descartada, como no
+    # fim de uma chamada de run_trend); mudança de seg = novo bloco, sem posição e sem sequência de perdas
+    # keep[i] falso: linha cortada pelo filtro de quantil dentro do bloco (só as saídas pelo caminho 1m)
+    # lo/hi: sub-barras [lo[i], hi[i]) de op/hp/lp (abertura/máxima/mínima 1m) da barra i; vazio = só close
+    tp_mult = p[0]; sl_mult = p[1]; part_r = p[2]; trail_after = p[3]; trail_mult = p[4]
+    maker = p[5] > 0; maker_bps = p[6]; taker_bps = p[7]; slip_base = p[8]; slip_frac = p[9]
+    adx_min = p[10]; block_m = p[11]; cap = p[12]; risk_pct = p[13]; max_seq = p[14]
+    mk = maker_bps / 10000.0; tk = taker_bps / 10000.0
+    fee_in = mk if maker else tk
+
+    N = len(close)
+    bar = np.empty(2 * N, dtype=np.int64); pnls = np.empty(2 * N)
+    side = np.empty(2 * N, dtype=np.int8); part = np.empty(2 * N, dtype=np.bool_)
+    n = 0; losses_row = 0; cur = -1; stopped = False
+    pos = 0; qty = 0.0; ep = 0.0; tp = 0.0; sl = 0.0; trail = 0.0; has_trail = False
+
+    for i in range(N):
+        g = seg[i]
+        if g != cur:
+            cur = g; stopped = False; losses_row = 0
+            pos = 0; qty = 0.0; has_trail = False
+        if g < 0:
+            continue
+        path = hi[i] > lo[i]
+        if pos != 0 and path:
+            # TP (limite) e stop (a mercado, com slippage) em repouso desde o close anterior
+            stop = sl
+            if has_trail and ((pos == 1 and trail > sl) or (pos == -1 and trail < sl)):
+                stop = trail
+            kind, fill = _touch(op, hp, lp, lo[i], hi[i], pos, tp, stop)
+            if kind != 0:
+                a = atr[i]
+                bump = fill * (slip_base / 10000.0) + (a * slip_frac if a == a else 0.0)
+                ex_p = fill if kind == 1 else (fill - bump if pos == 1 else fill + bump)
+                cost = ep * qty * fee_in + ex_p * qty * tk
+                pnl = ((ex_p - ep) if pos == 1 else (ep - ex_p)) * qty - cost
+                bar[n] = i; pnls[n] = pnl; side[n] = pos; part[n] = False; n += 1
+                losses_row = losses_row + 1 if pnl < 0 else 0
+                pos = 0; qty = 0.0; has_trail = False
+                if losses_row >= max_seq:
+                    stopped = True
+                continue
+        if not keep[i] or stopped:
+            continue
+        price = close[i]; a = atr[i]
+        if block_m > 0 and (minute[i] < block_m or minute[i] >= 60 - block_m):
+            continue
+        if a != a or a <= 0:
+            continue
+        if adx[i] < adx_min:
+            continue
+        r_val = sl_mult * a
+        this_risk = cap * risk_pct
+        plan_qty = (this_risk / r_val) if r_val > 0 else 0.0
+        trend_up = emaf[i] > emas[i]
+        near_fast = abs(price - emaf[i]) <= (0.25 * a)
+        bump = price * (slip_base / 10000.0) + a * slip_frac
+
+        if pos == 0:
+            if plan_qty <= 0 or not near_fast:
+                continue
+            if trend_up:
+                pos = 1; qty = plan_qty
+                ep = price if maker else price + bump
+                tp = ep + tp_mult * a; sl = ep - sl_mult * a; has_trail = False
+            else:
+                pos = -1; qty = plan_qty
+                ep = price if maker else price - bump
+                tp = ep - tp_mult * a; sl = ep + sl_mult * a; has_trail = False
+            continue
+
+        # saída na direção oposta à posição
+        ex_p = price if maker else (price - bump if pos == 1 else price + bump)
+        if pos == 1:
+            if part_r > 0 and (price - ep) >= part_r * r_val and qty > 0:
+                half = qty * 0.5
+                cost = ep * half * fee_in + ex_p * half * tk
+                pnl = (ex_p - ep) * half - cost
+                bar[n] = i; pnls[n] = pnl; side[n] = 1; part[n] = True; n += 1
+                qty -= half
+                if ep < sl:
+                    sl = ep
+            if trail_after > 0 and (price - ep) >= trail_after * r_val:
+                t = price - trail_mult * a
+                trail = t if t > sl else sl; has_trail = True
+            hit = not path and (price >= tp or price <= sl or (has_trail and price <= trail))
+        else:
+            if part_r > 0 and (ep - price) >= part_r * r_val and qty > 0:
+                half = qty * 0.5
+                cost = ep * half * fee_in + ex_p * half * tk
+                pnl = (ep - ex_p) * half - cost
+                bar[n] = i; pnls[n] = pnl; side[n] = -1; part[n] = True; n += 1
+                qty -= half
+                if ep > sl:
+                    sl = ep
+            if trail_after > 0 and (ep - price) >= trail_after * r_val:
+                t = price + trail_mult * a
+                trail = t if t < sl else sl; has_trail = True
+            hit = not path and (price <= tp or price >= sl or (has_trail and price >= trail))
+        if hit:
+            cost = ep * qty * fee_in + ex_p * qty * tk
+            pnl = ((ex_p - ep) if pos == 1 else (ep - ex_p)) * qty - cost
+            bar[n] = i; pnls[n] = pnl; side[n] = pos; part[n] = False; n += 1
+            losses_row = losses_row + 1 if pnl < 0 else 0
+            pos = 0; qty = 0.0; has_trail = False
+            if losses_row >= max_seq:
+                stopped = True
+    return bar[:n], pnls[:n], side[:n], part[:n]
+
+
+_trend = njit(cache=True, nogil=True)(_py_trend) if NUMBA else _py_trend
+
+
+def _trades(bar, pnl, side, partial) -> np.ndarray:
+    out = np.empty(len(bar), dtype=TRADE)
+    out["bar"] = bar; out["pnl"] = pnl; out["side"] = side; out["partial"] = partial
+    return out
+
+
+_NO_SUB = np.empty(0, dtype=np.float64)
+
+
+def columns(df: pd.DataFrame, sub=None) -> dict:
+    """Colunas usadas pelos núcleos como arrays (uma conversão por frame; os blocos são fatias delas).
+    `sub`: intrabar.SubBars alinhado às linhas de df (caminho 1m por barra) ou None."""
+    c = {k: df[k].to_numpy(dtype=np.float64)
+         for k in ("close", "atr", "adx", "ema_fast", "ema_slow", "atr_pct", "high", "low", "volume") if k in df}
+    c["minute"] = df["close_time"].dt.minute.to_numpy(dtype=np.int64)
+    c["complete"] = df.notna().all(axis=1).to_numpy()   # linhas que sobrevivem ao dropna() do meanrev
+    if sub is None:
+        c["sub_lo"] = c["sub_hi"] = np.zeros(len(df), dtype=np.int64)
+        c["sub"] = (_NO_SUB, _NO_SUB, _NO_SUB)
+    else:
+        # sub-barras de outro frame (ex.: SubBars do histórico inteiro com df recortado) apontariam para barras erradas
+        if not len(sub.lo) == len(sub.hi) == len(df):
+            raise ValueError(f"SubBars com {len(sub.lo)}/{len(sub.hi)} barras para um frame de {len(df)} linhas")
+        c["sub_lo"], c["sub_hi"], c["sub"] = sub.lo, sub.hi, (sub.open, sub.high, sub.low)
+    return c
+
+
+def _quantile(v: np.ndarray, q: float) -> float:
+    # Series.quantile (linear, ignora NaN) sem montar Series
+    v = v[~np.isnan(v)]
+    return float(np.percentile(v, np.asarray(q) * 100, method="linear")) if len(v) else np.nan
+
+
+def trend_keep(atr_pct: np.ndarray, cfg: dict) -> np.ndarray:
+    """Linhas que passam o filtro de quantil de atr_pct de run_trend (quantis sobre `atr_pct`)."""
+    flt = cfg["filters"]
+    if not (flt["use_atr_quantile"] and len(atr_pct) > 10):
+        return np.ones(len(atr_pct), dtype=np.bool_)
+    low = _quantile(atr_pct, flt["atrq_low"]); high = _quantile(atr_pct, flt["atrq_high"])
+    return (atr_pct >= low) & (atr_pct <= high)
+
+
+def trend_rows(c: dict, seg: np.ndarray, keep: np.ndarray, p: np.ndarray, start: int = 0) -> np.ndarray:
+    """Trades TRADE de run_trend nas linhas [start, start+len(seg)) das colunas `c` (fatias, sem cópia);
+    seg/keep como em _py_trend; `bar` é absoluto."""
+    s, e = start, start + len(seg)
+    cols = [c[k][s:e] for k in ("close", "atr", "adx", "ema_fast", "ema_slow")]
+    minute = c["minute"][s:e] if p[11] > 0 else np.zeros(e - s, dtype=np.int64)
+    lo, hi = c["sub_lo"][s:e], c["sub_hi"][s:e]
+    if NUMBA:
+        bar, pnl, side, part = _trend(*cols, minute, seg, keep, p, lo, hi, *c["sub"])
+    else:
+        # sem numba: floats do Python (mesma aritmética IEEE, bem mais rápido que escalares NumPy);
+        # as sub-barras ficam como arrays (mmap): só as das barras com posição aberta são lidas
+        bar, pnl, side, part = _trend(*(x.tolist() for x in cols), minute.tolist(), seg.tolist(), keep.tolist(),
+                                      p.tolist(), lo.tolist(), hi.tolist(), *c["sub"])
+    return _trades(bar + start, pnl, side, part)
+
+
+def trend_core(df: pd.DataFrame, cfg: dict, sub=None):
+    """(frame, trades TRADE) de run_trend; `bar` indexa o frame devolvido."""
+    d = df.reset_index(drop=True)
+    c = columns(d, sub)
+    seg = np.zeros(len(d), dtype=np.int64)
+    return d, trend_rows(c, seg, trend_keep(c["atr_pct"], cfg), trend_params(cfg))
+
+
+def vwap(c: dict, w: int, start: int = 0, end: int | None = None) -> np.ndarray:
+    """VWAP móvel de run_meanrev nas linhas [start, end) (a janela reinicia em start, como num bloco)."""
+    s, e = start, end
+    close = pd.Series(c["close"][s:e])
+    if "volume" not in c:
+        return close.rolling(w).mean().to_numpy()
+    vol = pd.Series(c["volume"][s:e])
+    return ((close * vol).rolling(w).sum() / vol.rolling(w).sum()).to_numpy()
+
+
+def meanrev_rows(c: dict, vw: np.ndarray, seg: np.ndarray, cfg: dict, start: int = 0) -> np.ndarray:
+    """Trades TRADE de run_meanrev nas linhas [start, start+len(seg)); seg < 0 = linha fora (o dropna()
+    original), entrada numa linha e saída na próxima linha válida do mesmo seg; `bar` (saída) é absoluto."""
+    ex = cfg["execution"]; flt = cfg["filters"]; fee = cfg["slippage_fees"]; risk = cfg["risk"]
+    s, e = start, start + len(seg)
+    r = np.flatnonzero(seg >= 0)
+    same = seg[r[:-1]] == seg[r[1:]]
+    a, b = r[:-1][same], r[1:][same]
+    col = lambda k, rows: c[k][s:e][rows]
+    price, atr, atr_pct, adx = col("close", a), col("atr", a), col("atr_pct", a), col("adx", a)
+    vw = vw[a]
+    hi, lo = col("high", b), col("low", b)
+    tp_mult = ex["tp_atr_mult"]; sl_mult = ex["sl_atr_mult"]
+    cap = risk["capital_usdt"]; rpct = risk["risk_per_trade_pct"]/100.0
+    mk = fee["maker_bps"]/10000.0; tk = fee["taker_bps"]/10000.0
+
+    r_val = sl_mult*atr
+    with np.errstate(divide="ignore", invalid="ignore"):
+        qty = np.where(r_val > 0, (cap*rpct)/r_val, 0.0)
+    side = np.where(price < vw*(1-0.10*atr_pct), 1, np.where(price > vw*(1+0.10*atr_pct), -1, 0))
+    take = ~(adx >= flt["adx_trend_min"]) & (atr > 0) & (qty > 0) & (side != 0)
+    i = np.flatnonzero(take)
+    sd, ep, at, q = side[i], price[i], atr[i], qty[i]
+    tp = np.where(sd > 0, ep + tp_mult*at, ep - tp_mult*at)
+    sl = np.where(sd > 0, ep - sl_mult*at, ep + sl_mult*at)
+    hit_tp = np.where(sd > 0, hi[i] >= tp, lo[i] <= tp)
+    hit_sl = np.where(sd > 0, lo[i] <= sl, hi[i] >= sl)
+    # SL quando os dois tocam no mesmo candle (conservador), a menos que o caminho 1m diga quem veio antes
+    ex_price = np.where(hit_tp & ~hit_sl, tp, sl)
+    lo, hi = c["sub_lo"][s:e], c["sub_hi"][s:e]
+    for j in np.flatnonzero(hit_tp & hit_sl & (hi[b[i]] > lo[b[i]])):
+        k = b[i[j]]
+        kind, fill = _py_touch(*c["sub"], lo[k], hi[k], sd[j], tp[j], sl[j])
+        if kind != 0:
+            ex_price[j] = fill
+    fee_cost = (ep*q*(mk if ex["mode"] == "maker_first" else tk)) + (ex_price*q*tk)
+    pnl = np.where(sd > 0, (ex_price-ep)*q, (ep-ex_price)*q) - fee_cost
+    return _trades(b[i] + start, pnl, sd, np.zeros(len(i), dtype=np.bool_))
+
+
+def meanrev_core(df: pd.DataFrame, cfg: dict, sub=None):
+    """(frame, trades TRADE) de run_meanrev; `bar` é o candle de saída (próxima linha sem NaN) no frame."""
+    d = df.reset_index(drop=True)
+    c = columns(d, sub)
+    vw = vwap(c, cfg["indicators"].get("vwap_window", 20))
+    return d, meanrev_rows(c, vw, np.where(c["complete"] & ~np.isnan(vw), 0, -1), cfg)
+
+
+def summary(trades: np.ndarray):
+    """(pnl_total, wins, losses) somando na ordem dos trades, como os laços originais."""
+    pnl = trades["pnl"]
+    total = float(np.cumsum(pnl)[-1]) if len(pnl) else 0.0
+    wins = int((pnl > 0).sum())
+    return total, wins, len(pnl) - wins
+
+
+def run_trend(df: pd.DataFrame, cfg: dict, sub=None):
+    d, t = trend_core(df, cfg, sub)
+    total, wins, losses = summary(t)
+    times = d["close_time"].iloc[t["bar"]].tolist()
+    return total, [{"pnl": float(p), "time": ts} for p, ts in zip(t["pnl"], times)], wins, losses
+
+
+def run_meanrev(df: pd.DataFrame, cfg: dict, sub=None):
+    d, t = meanrev_core(df, cfg, sub)
+    total, wins, losses = summary(t)
+    times = d["close_time"].iloc[t["bar"]].tolist()
+    return total, [{"pnl": float(p), "time": ts, "side": int(s), "mode": "mr_nextbar"}
+                   for p, ts, s in zip(t["pnl"], times, t["side"])], wins, losses
+
+
+def segments(regime: np.ndarray):
+    """(inícios, fins) dos blocos de regime constante (run-length), fim exclusivo."""
+    cut = np.flatnonzero(np.diff(regime)) + 1
+    return np.r_[0, cut], np.r_[cut, len(regime)]
+
+
+def run_regimes(df: pd.DataFrame, cfg: dict, single_pass: bool | None = None, sub=None):
+    """(pnl_total, trades, wins, losses) do laço dos orquestradores v31/v33: blocos com adx >= adx_trend_min
+    vão para run_trend, os demais para run_meanrev, blocos com até 10 barras ficam de fora.
+
+    Padrão: um núcleo por bloco sobre fatias das colunas, mesmo resultado do laço original (iloc + cópia
+    por bloco). single_pass=True (ou orchestrator.single_pass no cfg): uma chamada de cada núcleo no
+    histórico inteiro, com o bloco como coluna de entrada (posição e sequência de perdas zeram na troca
+    de bloco; posição aberta no fim do bloco é descartada, como no modo por bloco); quantis de atr_pct e VWAP passam a ser do histórico inteiro em vez de reiniciar por bloco.
+    `sub`: intrabar.SubBars de df para TP/stop por primeiro toque no caminho 1m.
+    """
+    if single_pass is None:
+        single_pass = bool(cfg.get("orchestrator", {}).get("single_pass", False))
+    d = df.reset_index(drop=True)
+    c = columns(d, sub)
+    trend = c["adx"] >= cfg["filters"]["adx_trend_min"]   # NaN conta como range
+    starts, ends = segments(trend)
+    long = ends - starts > 10
+    p = trend_params(cfg); w = cfg["indicators"].get("vwap_window", 20)
+
+    if single_pass:
+        blk = np.repeat(np.where(long, np.arange(len(starts)), -1), ends - starts)
+        vw = vwap(c, w)
+        # posição de tendência fecha sem trade ao sair do bloco (como o fim da fatia no modo por bloco)
+        tt = trend_rows(c, np.where(trend, blk, -1), trend_keep(c["atr_pct"], cfg), p)
+        tm = meanrev_rows(c, vw, np.where(~trend & c["complete"] & ~np.isnan(vw), blk, -1), cfg)
+        t = np.concatenate([tt, tm])
+        mr = np.r_[np.zeros(len(tt), dtype=np.bool_), np.ones(len(tm), dtype=np.bool_)]
+        order = np.argsort(t["bar"], kind="stable")   # blocos são disjuntos: ordem por barra = ordem por bloco
+        t, mr = t[order], mr[order]
+        total = summary(t)[0]
+    else:
+        parts, total = [], 0.0
+        for s, e in zip(starts[long], ends[long]):
+            if trend[s]:
+                x = trend_rows(c, np.zeros(e - s, dtype=np.int64), trend_keep(c["atr_pct"][s:e], cfg), p, s)
+            else:
+                vw = vwap(c, w, s, e)
+                x = meanrev_rows(c, vw, np.where(c["complete"][s:e] & ~np.isnan(vw), 0, -1), cfg, s)
+            parts.append((x, not trend[s]))
+            total += summary(x)[0]
+        t = np.concatenate([x for x, _ in parts]) if parts else np.empty(0, dtype=TRADE)
+        mr = np.concatenate([np.full(len(x), m) for x, m in parts]) if parts else np.empty(0, dtype=np.bool_)
+
+    times = d["close_time"].iloc[t["bar"]].tolist()
+    trades = [{"pnl": float(v), "time": ts, "side": int(sd), "mode": "mr_nextbar"} if m else {"pnl": float(v), "time": ts}
+              for v, ts, sd, m in zip(t["pnl"], times, t["side"], mr)]
+    wins = int((t["pnl"] > 0).sum())
+    return total, trades, wins, len(t) - wins
@@ -0,0 +1,282 @@
+import hashlib, json, time
+from math import sqrt
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import deepcopy
+from itertools import product
+from multiprocessing import shared_memory
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.backtest.history import locate
+from src.features.batch import IndicatorCache, build_features_cached
+
+# Grid de parâmetros de backtest em paralelo.
+# - as combinações são agrupadas por conjunto de indicadores (símbolo/tf/dias + períodos): os candles são
+#   lidos (history.locate: store colunar ou CSV) e as features calculadas uma vez por grupo;
+# - as colunas das features vão para um bloco de memória compartilhada (SharedFrame); os processos do
+#   pool montam o DataFrame a partir dele, sem pickle do frame por tarefa;
+# - cada resultado vira uma linha JSON no arquivo de progresso assim que termina (flush);
+#   resume=True pula as combinações já gravadas (as que deram erro são refeitas).
+#
+# uso: ver src/scripts/grid_v33.py
+
+
+def merge(a: dict, b: dict) -> dict:
+    z = deepcopy(a)
+    for k, v in b.items():
+        z[k] = merge(z[k], v) if isinstance(v, dict) and isinstance(z.get(k), dict) else v
+    return z
+
+
+def combos(grid: dict):
+    """[{(seção, chave): valor}] no produto cartesiano de `grid`, na ordem de itertools.product."""
+    keys = list(grid)
+    return [dict(zip(keys, vals)) for vals in product(*(grid[k] for k in keys))]
+
+
+def apply(cfg: dict, params: dict) -> dict:
+    over = {}
+    for (sec, key), v in params.items():
+        over.setdefault(sec, {})[key] = v
+    return merge(cfg, over)
+
+
+def param_cols(params: dict) -> dict:
+    return {f"{sec}.{key}": v for (sec, key), v in params.items()}
+
+
+def combo_key(cfg: dict) -> str:
+    """Hash estável da configuração completa (o que identifica a combinação no resume)."""
+    return hashlib.blake2b(json.dumps(cfg, sort_keys=True, default=str).encode(), digest_size=12).hexdigest()
+
+
+def data_key(cfg: dict):
+    return cfg["symbols"][0], cfg["timeframe"], cfg["history_days"]
+
+
+def feature_key(cfg: dict):
+    ind = cfg["indicators"]
+    return (data_key(cfg), ind["ema_fast"], ind["ema_slow"], ind["atr_period"], ind["adx_period"],
+            ind.get("vwap_window", 20))
+
+
+def trade_pnls(raw):
+    out = []
+    for t in (raw or []):
+        if isinstance(t, (int, float)): out.append(float(t)); continue
+        if isinstance(t, dict):
+            for k in ("pnl", "pnl_usdt", "profit", "pl", "result", "ret"):
+                if k in t:
+                    try: out.append(float(t[k])); break
+                    except (TypeError, ValueError): pass
+    return out
+
+
+def metrics(p) -> dict:
+    """trades / pnl_total / pf / mdd / sharpe de uma lista de pnls (critérios do grid_v33)."""
+    import statistics as st
+    pos = sum(x for x in p if x > 0); neg = -sum(x for x in p if x < 0)
+    pf = (pos / (neg if neg > 1e-9 else 1e-9)) if p else 0.0
+    eq = 0; peak = 0; dd = 0
+    for x in p:
+        eq += x; peak = max(peak, eq); dd = min(dd, eq - peak)
+    sh = (st.mean(p) / (st.pstdev(p) or 1e-9)) * sqrt(252) if p else 0.0
+    return {"trades": len(p), "pnl_total": round(sum(p), 2), "pf": round(pf, 2),
+            "mdd": round(abs(dd), 2), "sharpe": round(sh, 2)}
+
+
+def backtest(feats: pd.DataFrame, cfg: dict, cached: bool = True) -> dict:
+    """run_backtest_orchestrated (v33) passando pelo cache de resultados (src/backtest/result_cache.py)."""
+    from src.backtest.result_cache import CACHE, frame_fingerprint
+    from src.strategies.orchestrator_v33 import run_backtest_orchestrated
+    if not cached:
+        return run_backtest_orchestrated(feats, cfg)
+    return CACHE.run(frame_fingerprint(feats), cfg, lambda: run_backtest_orchestrated(feats, cfg), tag="orch_v33")
+
+
+def evaluate(feats: pd.DataFrame, cfg: dict) -> dict:
+    """Backtest orquestrado (v33) + metrics; o evaluate padrão dos grids."""
+    return metrics(trade_pnls(backtest(feats, cfg).get("trades")))
+
+
+def evaluate_uncached(feats: pd.DataFrame, cfg: dict) -> dict:
+    """evaluate sem o cache de resultados (quem mede CPU por avaliação, como src/backtest/search.py)."""
+    return metrics(trade_pnls(backtest(feats, cfg, cached=False).get("trades")))
+
+
+_CANDLES = {}
+_CACHE = IndicatorCache()
+
+
+def load_features(cfg: dict):
+    """Features de ta_v31 para os candles do cfg (store colunar ou CSV; None se não houver dados)."""
+    key, *ind = feature_key(cfg)
+    if key not in _CANDLES:
+        src = locate(*key)
+        if src is None:
+            return None
+        _CANDLES[key] = src.load()
+    return build_features_cached(_CANDLES[key], *ind, _CACHE)
+
+
+class SharedFrame:
+    """Colunas numéricas/bool/datetime de um DataFrame num bloco de shared_memory (8 bytes por célula).
+
+    Colunas de outro tipo (texto, object, categorias) levantam ValueError: o frame montado nos processos
+    precisa ter as mesmas colunas que o evaluate veria com workers=1.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        cols = []
+        for c in df.columns:
+            s = df[c]
+            if pd.api.types.is_datetime64_any_dtype(s):
+                cols.append((c, "M", str(s.dt.tz) if s.dt.tz is not None else None))
+            elif (pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s)) and s.dtype.itemsize <= 8:
+                cols.append((c, s.dtype.str, None))
+            else:
+                raise ValueError(f"SharedFrame: coluna {c!r} com dtype {s.dtype} não vai para shared_memory")
+        n = len(df)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(8 * n * len(cols), 8))
+        self.meta = {"name": self.shm.name, "n": n, "cols": cols}
+        for j, (c, kind, tz) in enumerate(cols):
+            s = df[c]
+            if kind == "M":
+                s = s.dt.tz_convert("UTC").dt.tz_localize(None) if tz else s
+                _view(self.shm, j, n, kind)[:] = s.to_numpy("datetime64[ns]").view(np.int64)
+            else:
+                _view(self.shm, j, n, kind)[:] = s.to_numpy()
+
+    def close(self):
+        self.shm.close(); self.shm.unlink()
+
+
+def _view(shm, j: int, n: int, kind: str):
+    dt = np.int64 if kind == "M" else np.dtype(kind)
+    return np.ndarray(n, dtype=dt, buffer=shm.buf, offset=8 * n * j) if n else np.empty(0, dtype=dt)
+
+
+_ATTACHED = {}
+
+
+def attach(meta: dict) -> pd.DataFrame:
+    """DataFrame montado a partir do bloco compartilhado (um anexo por processo e por bloco)."""
+    hit = _ATTACHED.get(meta["name"])
+    if hit is None:
+        for old, _ in _ATTACHED.values():
+            old.close()
+        # filhos do pool usam o resource_tracker do pai: quem remove o bloco é o SharedFrame.close()
+        shm = shared_memory.SharedMemory(name=meta["name"])
+        n, out = meta["n"], {}
+        for j, (c, kind, tz) in enumerate(meta["cols"]):
+            v = _view(shm, j, n, kind)
+            if kind == "M":
+                t = pd.to_datetime(v.view("datetime64[ns]"))
+                out[c] = t.tz_localize("UTC").tz_convert(tz) if tz else t
+            else:
+                out[c] = v
+        _ATTACHED.clear()
+        hit = _ATTACHED[meta["name"]] = (shm, pd.DataFrame(out))
+    return hit[1]
+
+
+def _task(job, feats=None):
+    evaluate, meta, cfg, i, key = job
+    try:
+        res = evaluate(attach(meta) if feats is None else feats, cfg)
+    except Exception as e:
+        res = {"error": f"{type(e).__name__}: {e}"}
+    return i, key, {"error": "sem resultado"} if res is None else res
+
+
+def done_keys(path: Path) -> set:
+    """Combinações já concluídas no arquivo de progresso (linhas com erro não contam)."""
+    keys = set()
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                r = json.loads(line)
+            except ValueError:
+                continue   # linha cortada por uma interrupção
+            if "error" not in r:
+                keys.add(r["key"])
+    return keys
+
+
+def trim_partial(path: Path):
+    """Corta o arquivo de progresso na última linha completa (escrita interrompida no meio de uma linha)."""
+    if not path.exists():
+        return
+    with open(path, "rb+") as fh:
+        data = fh.read()
+        if data and not data.endswith(b"\n"):
+            fh.truncate(data.rfind(b"\n") + 1)
+
+
+def read_results(path: Path, keys=None) -> pd.DataFrame:
+    """Linhas concluídas do arquivo de progresso; com `keys`, só as dessas combinações."""
+    rows = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            r = json.loads(line)
+        except ValueError:
+            continue
+        if keys is None or r["key"] in keys:
+            rows[r["key"]] = r   # a última tentativa de cada combinação vale
+    return pd.DataFrame([r for r in rows.values() if "error" not in r])
+
+
+def run_grid(base: dict, grid: dict, evaluate, progress, workers: int = 1, resume: bool = False,
+             features=load_features, group=feature_key, log=print) -> pd.DataFrame:
+    """Roda evaluate(features, cfg) -> dict para cada combinação; devolve todas as linhas concluídas.
+
+    evaluate precisa ser função de módulo (vai por pickle ao pool) e não deve alterar o frame recebido;
+    com workers > 1 o frame só pode ter colunas numéricas/bool/datetime (ver SharedFrame).
+    """
+    progress = Path(progress)
+    progress.parent.mkdir(parents=True, exist_ok=True)
+    keys, jobs = set(), {}
+    for i, params in enumerate(combos(grid)):
+        cfg = apply(base, params)
+        key = combo_key(cfg)
+        keys.add(key)
+        jobs.setdefault(group(cfg), []).append((i, key, cfg, params))
+    # resume: só contam as linhas do grid atual (o arquivo pode ter combinações de um grid anterior);
+    # a linha cortada é removida para o próximo registro não ser colado nela
+    if resume:
+        trim_partial(progress)
+    skip = done_keys(progress) & keys if resume else set()
+    jobs = {g: [j for j in items if j[1] not in skip] for g, items in jobs.items()}
+    jobs = {g: items for g, items in jobs.items() if items}
+    todo = sum(len(v) for v in jobs.values())
+    log(f"[grid] {todo} combinações a rodar ({len(skip)} já feitas), {len(jobs)} conjuntos de features, workers={workers}")
+    pool = ProcessPoolExecutor(workers) if workers > 1 and todo else None
+    n, t0 = 0, time.perf_counter()
+    try:
+        with open(progress, "a" if resume else "w", encoding="utf-8") as fh:
+            for g, items in jobs.items():
+                feats = features(items[0][2])
+                if feats is None:
+                    log(f"[grid] sem dados para {g}; {len(items)} combinações ignoradas")
+                    continue
+                shared = SharedFrame(feats) if pool is not None else None
+                try:
+                    params = {i: p for i, _, _, p in items}
+                    if pool is None:
+                        results = (_task((evaluate, None, cfg, i, key), feats) for i, key, cfg, _ in items)
+                    else:
+                        futs = [pool.submit(_task, (evaluate, shared.meta, cfg, i, key)) for i, key, cfg, _ in items]
+                        results = (f.result() for f in as_completed(futs))
+                    for i, key, res in results:
+                        fh.write(json.dumps({"key": key, "i": i, **res, **param_cols(params[i])}, default=float) + "\n")
+                        fh.flush()
+                        n += 1
+                        if n % 50 == 0 or n == todo:
+                            log(f"[grid] {n}/{todo} em {time.perf_counter()-t0:.1f}s")
+                finally:
+                    if shared is not None:
+                        shared.close()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return read_results(progress, keys) if progress.exists() else pd.DataFrame()
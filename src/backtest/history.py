@@ -0,0 +1,208 @@
+import hashlib, json, os, re, shutil, time
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Histórico de candles em formato colunar binário (um .npy por coluna, lido com mmap):
+#   data/history/{SYMBOL}_{tf}/{open_time,close_time,open,high,low,close,volume,...}.npy + meta.json
+# - um conjunto de arquivos por símbolo/timeframe com todo o histórico (sem um CSV por history_days);
+# - tempos em int64 ns UTC; recorte por tempo com searchsorted no open_time mapeado (sem parse);
+# - write() mescla com o que já existe (open_time único, o novo vence; união das colunas, a que faltar
+#   de um lado fica NaN) e troca o diretório de uma vez;
+# - locate() escolhe a fonte de um backtest: o store se tiver o par, senão o CSV data/{sym}_{tf}_{days}d.csv.
+#
+# conversão: python -m src.backtest.history convert data/*.csv     (nomes {SYM}_{tf}[_{N}d].csv)
+# inspeção:  python -m src.backtest.history info
+
+ROOT = Path(os.getenv("HISTORY_DIR", "data/history"))
+TIMES = ("open_time", "close_time")
+FLOATS = ("open", "high", "low", "close", "volume", "qav", "taker_base", "taker_quote")
+INTS = ("num_trades",)
+NS = 1_000_000_000
+
+
+def _ns(s: pd.Series) -> np.ndarray:
+    t = pd.to_datetime(s, utc=True) if not pd.api.types.is_datetime64_any_dtype(s) else s
+    t = t.dt.tz_localize("UTC") if t.dt.tz is None else t.dt.tz_convert("UTC")
+    return t.dt.tz_localize(None).to_numpy("datetime64[ns]").view(np.int64)
+
+
+def write_columns(final: Path, data: dict, meta: dict):
+    """Grava um diretório {coluna}.npy + meta.json num temporário e troca pelo `final` de uma vez."""
+    tmp = final.with_name(final.name + f".tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for c, v in data.items():
+        np.save(tmp / f"{c}.npy", np.ascontiguousarray(v))
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=1))
+    old_dir = final.with_name(final.name + f".old{os.getpid()}")
+    if final.exists():
+        final.rename(old_dir)
+    tmp.rename(final)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class HistoryStore:
+    def __init__(self, root=None):
+        self.root = Path(root or ROOT)
+
+    def path(self, symbol: str, tf: str) -> Path:
+        return self.root / f"{symbol.upper()}_{tf}"
+
+    def has(self, symbol: str, tf: str) -> bool:
+        return (self.path(symbol, tf) / "meta.json").exists()
+
+    def meta(self, symbol: str, tf: str) -> dict:
+        return json.loads((self.path(symbol, tf) / "meta.json").read_text())
+
+    def column(self, symbol: str, tf: str, name: str) -> np.ndarray:
+        return np.load(self.path(symbol, tf) / f"{name}.npy", mmap_mode="r")
+
+    def write(self, symbol: str, tf: str, df: pd.DataFrame) -> int:
+        """Mescla df (colunas de kline) no histórico do par; devolve o total de linhas."""
+        new = {"open_time": _ns(df["open_time"])}
+        if "close_time" in df:
+            new["close_time"] = _ns(df["close_time"])
+        for c in FLOATS + INTS:
+            if c in df:
+                new[c] = pd.to_numeric(df[c], errors="coerce").to_numpy(np.int64 if c in INTS else np.float64)
+        if self.has(symbol, tf):
+            old = {c: np.asarray(self.column(symbol, tf, c)) for c in self.meta(symbol, tf)["columns"]}
+            miss = [c for c in TIMES if (c in old) != (c in new)]
+            if miss:
+                raise ValueError(f"{symbol} {tf}: {miss} só de um lado (store x frame novo); sem como preencher tempos")
+            # união das colunas: a que falta de um lado vira NaN (colunas inteiras passam a float64)
+            cols = list(old) + [c for c in new if c not in old]
+            n_old, n_new = len(old["open_time"]), len(new["open_time"])
+            t = np.concatenate([old["open_time"], new["open_time"]])
+            data = {}
+            for c in cols:
+                x, y = old.get(c, np.full(n_old, np.nan)), new.get(c, np.full(n_new, np.nan))
+                if x.dtype != y.dtype:
+                    x, y = x.astype(np.float64), y.astype(np.float64)
+                data[c] = np.concatenate([x, y])
+        else:
+            t, data = new["open_time"], new
+        # último por open_time (o novo vence), ordenado
+        _, last = np.unique(t[::-1], return_index=True)
+        keep = len(t) - 1 - last
+        data = {c: v[keep] for c, v in data.items()}
+
+        t = data["open_time"]
+        write_columns(self.path(symbol, tf), data, {
+            "symbol": symbol.upper(), "timeframe": tf, "rows": int(len(t)), "columns": list(data),
+            "first": str(pd.Timestamp(int(t[0]), tz="UTC")) if len(t) else None,
+            "last": str(pd.Timestamp(int(t[-1]), tz="UTC")) if len(t) else None,
+        })
+        return int(len(t))
+
+    def bounds(self, symbol: str, tf: str, start=None, end=None):
+        """(lo, hi) das linhas com start <= open_time < end."""
+        t = self.column(symbol, tf, "open_time")
+        lo = 0 if start is None else int(np.searchsorted(t, pd.Timestamp(start).value, side="left"))
+        hi = len(t) if end is None else int(np.searchsorted(t, pd.Timestamp(end).value, side="left"))
+        return lo, hi
+
+    def last_days(self, symbol: str, tf: str, days: float):
+        """(lo, hi) dos últimos `days` dias até o último candle do store."""
+        t = self.column(symbol, tf, "open_time")
+        if not len(t):
+            return 0, 0
+        return int(np.searchsorted(t, int(t[-1]) - int(days * 86400 * NS), side="right")), len(t)
+
+    def read(self, symbol: str, tf: str, start=None, end=None, columns=None, rows=None) -> pd.DataFrame:
+        """DataFrame com os tempos como datetime UTC; `rows` = (lo, hi) já calculado."""
+        lo, hi = rows or self.bounds(symbol, tf, start, end)
+        out = {}
+        for c in columns or self.meta(symbol, tf)["columns"]:
+            v = np.array(self.column(symbol, tf, c)[lo:hi])
+            out[c] = pd.to_datetime(v, unit="ns", utc=True) if c in TIMES else v
+        return pd.DataFrame(out)
+
+    def fingerprint(self, symbol: str, tf: str, rows) -> str:
+        lo, hi = rows
+        h = hashlib.blake2b(digest_size=16)
+        for c in self.meta(symbol, tf)["columns"]:
+            h.update(c.encode()); h.update(np.ascontiguousarray(self.column(symbol, tf, c)[lo:hi]).tobytes())
+        return h.hexdigest()
+
+
+@dataclass(frozen=True)
+class Candles:
+    """Fonte de candles de um backtest: store colunar (preferido) ou CSV legado."""
+    symbol: str
+    tf: str
+    days: int
+    csv: Path | None = None
+    store: HistoryStore | None = None
+
+    def rows(self):
+        return self.store.last_days(self.symbol, self.tf, self.days)
+
+    def fingerprint(self) -> str:
+        if self.store is not None:
+            return self.store.fingerprint(self.symbol, self.tf, self.rows())
+        from src.backtest.result_cache import file_fingerprint
+        return file_fingerprint(self.csv)
+
+    def load(self) -> pd.DataFrame:
+        if self.store is not None:
+            return self.store.read(self.symbol, self.tf, rows=self.rows())
+        return pd.read_csv(self.csv, parse_dates=["open_time", "close_time"])
+
+    def __str__(self):
+        return f"{self.store.path(self.symbol, self.tf)} ({self.days}d)" if self.store is not None else str(self.csv)
+
+
+def locate(symbol: str, tf: str, days: int, store: HistoryStore | None = None, data_dir="data"):
+    """Candles para (símbolo, tf, dias) ou None se não houver nem store nem CSV."""
+    store = store or HistoryStore()
+    if store.has(symbol, tf):
+        return Candles(symbol, tf, days, store=store)
+    csv = Path(data_dir) / f"{symbol}_{tf}_{days}d.csv"
+    return Candles(symbol, tf, days, csv=csv) if csv.exists() else None
+
+
+NAME = re.compile(r"^(?P<sym>[A-Z0-9]+)_(?P<tf>\d+[smhdwM])(?:_(?P<days>\d+)d)?\.csv$")
+
+
+def convert(paths, store: HistoryStore | None = None, log=print):
+    store = store or HistoryStore()
+    for p in map(Path, paths):
+        m = NAME.match(p.name)
+        if not m:
+            log(f"[history] ignorado (nome fora do padrão SYM_tf[_Nd].csv): {p}")
+            continue
+        sym, tf = m["sym"], m["tf"]
+        t0 = time.perf_counter()
+        df = pd.read_csv(p, parse_dates=["open_time", "close_time"])
+        t_csv = time.perf_counter() - t0
+        n = store.write(sym, tf, df)
+        t0 = time.perf_counter()
+        got = store.read(sym, tf, df["open_time"].iloc[0] if len(df) else None)
+        t_bin = time.perf_counter() - t0
+        log(f"[history] {p} -> {store.path(sym, tf)}: {len(df)} linhas (total {n}) | "
+            f"read_csv {t_csv*1000:.1f} ms x store {t_bin*1000:.2f} ms ({len(got)} linhas)")
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("convert", help="importa CSVs de kline para o store")
+    c.add_argument("paths", nargs="+")
+    sub.add_parser("info")
+    ap.add_argument("--root", default=None)
+    args = ap.parse_args()
+    store = HistoryStore(args.root)
+    if args.cmd == "convert":
+        convert(args.paths, store)
+    else:
+        for m in sorted(store.root.glob("*/meta.json")):
+            meta = json.loads(m.read_text())
+            print(f"{meta['symbol']:12s} {meta['timeframe']:4s} rows={meta['rows']:8d} {meta['first']} -> {meta['last']}")
+
+
+if __name__ == "__main__":
+    main()
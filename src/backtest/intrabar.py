@@ -0,0 +1,78 @@
+import time
+import numpy as np
+import pandas as pd
+from src.backtest.array_engine import _py_touch
+from src.backtest.history import HistoryStore
+
+# Simulação intrabar: TP/stop das barras de timeframe maior resolvidos pelo caminho 1m (primeiro toque),
+# em vez de só pelo close (5m que toca os dois níveis deixava de ser arbitrário; stop sai no nível, ou
+# na abertura da sub-barra se o preço saltar além dele, com slippage).
+# - SubBars.build alinha um frame de features ao timeframe menor do store colunar (src/backtest/history.py):
+#   lo/hi por barra via searchsorted no open_time, calculado uma vez; open/high/low 1m ficam em mmap e
+#   só as sub-barras das barras com posição aberta chegam a ser lidas;
+# - consumido por array_engine (run_trend / run_meanrev / run_regimes com sub=...), pelos orquestradores
+#   (sub=...) e por strategies/baseline_atr_v3 (path=...);
+# - barra sem sub-barras no store (buraco, fora do período baixado) cai na regra antiga (close).
+#
+# dados 1m:   python -m src.scripts.fetch_klines_range --tf 1m   (ou history convert de um CSV 1m)
+# comparação: python -m src.backtest.intrabar [--preset config/presets/btc_trend_v33.yml] [--sub-tf 1m]
+
+
+class SubBars:
+    """Caminho de sub-barras por barra de um frame: barra i -> sub-barras [lo[i], hi[i]) de open/high/low."""
+
+    def __init__(self, lo, hi, open, high, low):
+        self.lo, self.hi = lo, hi
+        self.open, self.high, self.low = open, high, low
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, symbol: str, tf: str = "1m", store: HistoryStore | None = None):
+        """SubBars das linhas de df (open_time/close_time) no store; None se o store não tiver o par."""
+        store = store or HistoryStore()
+        if not store.has(symbol, tf):
+            return None
+        t = store.column(symbol, tf, "open_time")
+        lo = np.searchsorted(t, pd.DatetimeIndex(df["open_time"]).asi8, side="left")
+        hi = np.searchsorted(t, pd.DatetimeIndex(df["close_time"]).asi8, side="right")
+        return cls(lo.astype(np.int64), np.maximum(hi, lo).astype(np.int64),
+                   *(np.asarray(store.column(symbol, tf, c)) for c in ("open", "high", "low")))
+
+    def coverage(self) -> float:
+        """Fração das barras com sub-barras."""
+        return float((self.hi > self.lo).mean()) if len(self.lo) else 0.0
+
+    def touch(self, i: int, side: int, tp: float, stop: float):
+        """(1 tp | -1 stop | 0 nada, preço) do primeiro toque na barra i; lado 1 = comprado."""
+        return _py_touch(self.open, self.high, self.low, int(self.lo[i]), int(self.hi[i]), side, tp, stop)
+
+
+def main():
+    import argparse, yaml
+    from src.backtest.array_engine import run_trend
+    from src.backtest.grid import load_features, merge, metrics, trade_pnls
+    from src.strategies.orchestrator_v33 import run_backtest_orchestrated
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--preset", default="config/presets/btc_trend_v33.yml")
+    ap.add_argument("--sub-tf", default="1m")
+    args = ap.parse_args()
+    cfg = merge(yaml.safe_load(open("config/settings_v31.yml")), yaml.safe_load(open(args.preset)))
+    sym = cfg["symbols"][0]
+    feats = load_features(cfg)
+    if feats is None:
+        raise SystemExit(f"[intrabar] sem histórico {sym} {cfg['timeframe']}")
+    t0 = time.perf_counter()
+    sub = SubBars.build(feats, sym, args.sub_tf)
+    if sub is None:
+        raise SystemExit(f"[intrabar] sem {sym} {args.sub_tf} no store (data/history); baixe/converta antes")
+    print(f"[intrabar] índice {args.sub_tf}: {len(feats)} barras, cobertura {sub.coverage():.1%}, "
+          f"{(time.perf_counter() - t0) * 1000:.1f} ms")
+    for name, fn in (("trend", lambda s: run_trend(feats, cfg, s)[1]),
+                     ("orch_v33", lambda s: run_backtest_orchestrated(feats, cfg, sub=s)["trades"])):
+        for label, s in (("close", None), ("intrabar", sub)):
+            t0 = time.perf_counter()
+            m = metrics(trade_pnls(fn(s)))
+            print(f"{name:9s} {label:9s} {(time.perf_counter() - t0) * 1000:8.1f} ms | {m}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,516 @@
+import heapq, json, os, time
+from dataclasses import dataclass
+from math import inf, nan
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.backtest.history import write_columns
+
+# Replay tick a tick de md_trades + md_book (top of book) com agendador de eventos em heap.
+# - fontes: arquivo colunar de ticks (TickArchive, data/ticks/{SYM}/{trades|book}/{AAAAMMDD}/*.npy, lido
+#   com mmap, um dia por vez) exportado do Postgres, ou DataFrames (frames());
+# - o heap guarda a próxima linha de cada fonte + ordens (com latência), cancelamentos e timers da
+#   estratégia; uma fonte é drenada em sequência enquanto estiver antes do próximo evento do heap
+#   (push/pop só nas trocas de fonte), o que mantém milhões de eventos por minuto;
+# - ordens: limite (post_only = GTX, rejeitada se cruzaria o livro na chegada), mercado e stop (a mercado
+#   quando um trade toca o preço); limite em repouso enche quando um trade atravessa o preço, ou em
+#   trades no próprio preço depois de consumir a fila estimada à frente (tamanho do topo na chegada,
+#   reduzido quando o topo encolhe; nível fora do topo fica sem estimativa até virar topo);
+# - MakerFirst executa sinais como execution.mode maker_first (GTX no topo, reenvio se rejeitada,
+#   mercado no timeout) e mede quanto teria enchido como maker.
+#
+# export: python -m src.backtest.replay export --symbol BTCUSDT --start 2025-01-01 --end 2025-01-08
+# replay: python -m src.backtest.replay run --symbol BTCUSDT --signals reports/sinais.csv [--latency-ms 50]
+# vazão:  python -m src.scripts.bench_replay
+
+TICKS = Path(os.getenv("TICKS_DIR", "data/ticks"))
+COLS = {"trades": ("ts", "price", "qty", "is_buyer_maker"),
+        "book": ("ts", "bid_price", "bid_qty", "ask_price", "ask_qty")}
+KEYS = {"trades": ["ts", "price", "qty"], "book": ["ts"]}   # chaves primárias de md_trades / md_book
+DAY = 86400 * 1_000_000_000
+
+BUY, SELL = 1, -1
+LIMIT, MARKET, STOP = "limit", "market", "stop"
+# tipos de evento no heap; no mesmo ts: livro, trade, ordem, cancelamento, timer
+_BOOK, _TRADE, _ORDER, _CANCEL, _TIMER = range(5)
+
+
+def _ns(v) -> np.ndarray:
+    return np.asarray(v, dtype=np.int64) if np.issubdtype(np.asarray(v).dtype, np.integer) else pd.DatetimeIndex(v).asi8
+
+
+class TickArchive:
+    def __init__(self, root=None):
+        self.root = Path(root or TICKS)
+
+    def path(self, symbol: str, kind: str, day: str | None = None) -> Path:
+        p = self.root / symbol.upper() / kind
+        return p / day if day else p
+
+    def days(self, symbol: str, kind: str) -> list:
+        p = self.path(symbol, kind)
+        return sorted(d.name for d in p.iterdir() if (d / "meta.json").exists()) if p.exists() else []
+
+    def write(self, symbol: str, kind: str, df: pd.DataFrame) -> int:
+        """Mescla df (colunas COLS[kind]; ts datetime ou int ns) nos dias do arquivo; devolve linhas novas."""
+        df = df.loc[:, list(COLS[kind])].assign(ts=lambda d: _ns(d["ts"]))
+        for day, g in df.groupby(df["ts"] // DAY):
+            name = pd.Timestamp(int(day) * DAY, tz="UTC").strftime("%Y%m%d")
+            if name in self.days(symbol, kind):
+                g = pd.concat([self.read_day(symbol, kind, name), g], ignore_index=True)
+            g = g.sort_values("ts", kind="stable").drop_duplicates(KEYS[kind], keep="last")
+            data = {c: g[c].to_numpy(bool if c == "is_buyer_maker" else np.int64 if c == "ts" else np.float64) for c in COLS[kind]}
+            write_columns(self.path(symbol, kind, name), data, {"symbol": symbol.upper(), "kind": kind, "rows": len(g)})
+        return len(df)
+
+    def read_day(self, symbol: str, kind: str, day: str) -> pd.DataFrame:
+        p = self.path(symbol, kind, day)
+        return pd.DataFrame({c: np.load(p / f"{c}.npy") for c in COLS[kind]})
+
+    def chunks(self, symbol: str, kind: str, start=None, end=None):
+        """Um dict coluna -> array (mmap) por dia, em ordem de tempo, recortado em [start, end)."""
+        lo = pd.Timestamp(start).value if start is not None else None
+        hi = pd.Timestamp(end).value if end is not None else None
+        for day in self.days(symbol, kind):
+            d0 = pd.Timestamp(day, tz="UTC").value
+            if (hi is not None and d0 >= hi) or (lo is not None and d0 + DAY <= lo):
+                continue
+            p = self.path(symbol, kind, day)
+            cols = {c: np.load(p / f"{c}.npy", mmap_mode="r") for c in COLS[kind]}
+            t = cols["ts"]
+            a = 0 if lo is None else int(np.searchsorted(t, lo, side="left"))
+            b = len(t) if hi is None else int(np.searchsorted(t, hi, side="left"))
+            if b > a:
+                yield {c: v[a:b] for c, v in cols.items()}
+
+
+def frames(df: pd.DataFrame, kind: str, rows: int = 1_000_000):
+    """Fonte a partir de um DataFrame (colunas COLS[kind], ordenado por ts), em blocos de `rows`."""
+    for a in range(0, len(df), rows):
+        g = df.iloc[a:a + rows]
+        yield {c: (_ns(g[c]) if c == "ts" else g[c].to_numpy()) for c in COLS[kind]}
+
+
+@dataclass(eq=False)
+class SimOrder:
+    id: int
+    side: int                  # BUY | SELL
+    qty: float
+    type: str = LIMIT
+    price: float = nan         # limite / gatilho do stop
+    post_only: bool = False    # GTX
+    tag: object = None
+    filled: float = 0.0
+    queue: float = inf         # quantidade à frente no nível (inf = sem estimativa)
+    status: str = "pending"    # pending | open | filled | canceled | rejected
+
+    @property
+    def left(self) -> float:
+        return self.qty - self.filled
+
+
+@dataclass
+class Fill:
+    ts: int
+    order: int
+    side: int
+    qty: float
+    price: float
+    maker: bool
+    fee: float
+    tag: object = None
+
+
+class Strategy:
+    """Ganchos do replay; só os sobrescritos são chamados."""
+    def on_start(self, sim): pass
+    def on_book(self, sim): pass
+    def on_trade(self, sim, price, qty, buyer_maker): pass
+    def on_fill(self, sim, order, fill): pass
+    def on_order(self, sim, order): pass    # rejeitada ou cancelada
+    def on_timer(self, sim, tag): pass
+
+
+BLOCK = 1 << 16
+
+
+def _blocks(chunks, names):
+    # listas de escalares do Python (acesso por índice bem mais barato que em arrays NumPy), BLOCK linhas
+    # por vez para não materializar um dia inteiro
+    for ch in chunks:
+        for a in range(0, len(ch["ts"]), BLOCK):
+            yield [np.asarray(ch[c][a:a + BLOCK]).tolist() for c in names]
+
+
+class _Source:
+    def __init__(self, kind, chunks):
+        self.kind = kind
+        self.it = _blocks(chunks, COLS["book" if kind == _BOOK else "trades"])
+        self.cols, self.i, self.n = None, 0, 0
+
+    def next_chunk(self) -> bool:
+        for cols in self.it:
+            self.cols, self.i, self.n = cols, 0, len(cols[0])
+            return True
+        return False
+
+
+class Replay:
+    def __init__(self, strategy: Strategy, maker_bps=0.0, taker_bps=0.0, latency_ms=0.0, impact_bps=0.0):
+        self.strategy = strategy
+        hook = lambda name: getattr(strategy, name) if getattr(type(strategy), name) is not getattr(Strategy, name) else None
+        self._on_book, self._on_trade, self._on_fill, self._on_order, self._on_timer = (
+            hook(n) for n in ("on_book", "on_trade", "on_fill", "on_order", "on_timer"))
+        self.mk, self.tk = maker_bps / 10000.0, taker_bps / 10000.0
+        self.latency = int(latency_ms * 1_000_000)
+        self.impact = impact_bps / 10000.0   # acima do tamanho do topo, a mercado
+        self.now = 0
+        self.bid = self.ask = self.last = nan
+        self.bid_qty = self.ask_qty = 0.0
+        self.bids, self.asks, self.stops = [], [], []
+        self.pos = self.cash = self.fees = 0.0
+        self.fills, self.events, self.elapsed = [], 0, 0.0
+        self._heap, self._seq, self._ids = [], 0, 0
+
+    # ----- API da estratégia -----
+    def submit(self, side: int, qty: float, type: str = LIMIT, price: float = nan, post_only: bool = False, tag=None) -> SimOrder:
+        self._ids += 1
+        o = SimOrder(self._ids, side, qty, type, price, post_only, tag)
+        self._push(self.now + self.latency, _ORDER, o)
+        return o
+
+    def cancel(self, o: SimOrder):
+        if o.status in ("pending", "open"):
+            self._push(self.now + self.latency, _CANCEL, o)
+
+    def schedule(self, ts: int, tag):
+        self._push(int(ts), _TIMER, tag)
+
+    @property
+    def mid(self) -> float:
+        return (self.bid + self.ask) / 2
+
+    # ----- laço -----
+    def _push(self, ts, kind, ref):
+        self._seq += 1
+        heapq.heappush(self._heap, (ts, kind, self._seq, ref))
+
+    def run(self, trades=(), book=()) -> dict:
+        for kind, chunks in ((_BOOK, book), (_TRADE, trades)):
+            s = _Source(kind, chunks)
+            if s.next_chunk():
+                self._push(s.cols[0][0], kind, s)
+        self.strategy.on_start(self)
+        heap, pop = self._heap, heapq.heappop
+        t0 = time.perf_counter()
+        while heap:
+            ts, kind, _, ref = pop(heap)
+            if kind == _TRADE:
+                self._drain_trades(ref)
+            elif kind == _BOOK:
+                self._drain_book(ref)
+            else:
+                self.now = ts; self.events += 1
+                if kind == _ORDER:
+                    self._activate(ref)
+                elif kind == _CANCEL:
+                    if ref.status in ("pending", "open"):
+                        self._drop(ref, "canceled")
+                elif self._on_timer is not None:
+                    self._on_timer(self, ref)
+        self.elapsed = time.perf_counter() - t0
+        return self.result()
+
+    def _resume(self, s):
+        # recoloca a fonte no heap (ou passa ao próximo bloco)
+        if s.i < s.n or s.next_chunk():
+            self._push(s.cols[0][s.i], s.kind, s)
+
+    def _drain_trades(self, s):
+        heap, on_trade = self._heap, self._on_trade
+        ts, px, qty, bm = s.cols
+        i, n = s.i, s.n
+        # a primeira linha é o mínimo do heap; as seguintes só enquanto vierem antes do próximo evento
+        while True:
+            self.now = ts[i]; p = px[i]; self.last = p
+            if self.stops:
+                self._trigger(p)
+            if bm[i]:
+                if self.bids:
+                    self._hit(self.bids, p, qty[i], BUY)
+            elif self.asks:
+                self._hit(self.asks, p, qty[i], SELL)
+            if on_trade is not None:
+                on_trade(self, p, qty[i], bm[i])
+            i += 1
+            if i >= n or (heap and ts[i] >= heap[0][0]):
+                break
+        self.events += i - s.i; s.i = i
+        self._resume(s)
+
+    def _drain_book(self, s):
+        heap, on_book = self._heap, self._on_book
+        ts, b, bq, a, aq = s.cols
+        i, n = s.i, s.n
+        while True:
+            self.now = ts[i]
+            self.bid, self.bid_qty, self.ask, self.ask_qty = b[i], bq[i], a[i], aq[i]
+            if self.bids or self.asks:
+                self._requeue()
+            if on_book is not None:
+                on_book(self)
+            i += 1
+            if i >= n or (heap and ts[i] >= heap[0][0]):
+                break
+        self.events += i - s.i; s.i = i
+        self._resume(s)
+
+    # ----- ordens -----
+    def _fill(self, o, qty, price, maker):
+        fee = qty * price * (self.mk if maker else self.tk)
+        o.filled += qty
+        self.pos += o.side * qty; self.cash -= o.side * qty * price + fee; self.fees += fee
+        f = Fill(self.now, o.id, o.side, qty, price, maker, fee, o.tag)
+        self.fills.append(f)
+        if o.left <= 1e-12:
+            o.status = "filled"
+        if self._on_fill is not None:
+            self._on_fill(self, o, f)
+
+    def _drop(self, o, status):
+        o.status = status
+        for book in (self.bids, self.asks, self.stops):
+            if o in book:
+                book.remove(o)
+        if self._on_order is not None:
+            self._on_order(self, o)
+
+    def _market(self, o):
+        top, top_q = (self.ask, self.ask_qty) if o.side == BUY else (self.bid, self.bid_qty)
+        if top != top:
+            top, top_q = self.last, inf
+        if top != top:
+            self._drop(o, "rejected")   # sem preço ainda
+            return
+        inside = min(o.left, top_q)
+        rest = o.left - inside
+        if inside > 0:
+            self._fill(o, inside, top, False)
+        if rest > 0:
+            self._fill(o, rest, top * (1 + o.side * self.impact), False)
+
+    def _activate(self, o):
+        if o.status != "pending":
+            return
+        if o.type == MARKET:
+            self._market(o)
+            return
+        if o.type == STOP:
+            o.status = "open"; self.stops.append(o)
+            self._trigger(self.last)
+            return
+        top, top_q = (self.ask, self.ask_qty) if o.side == BUY else (self.bid, self.bid_qty)
+        if (o.side == BUY and o.price >= top) or (o.side == SELL and o.price <= top):
+            if o.post_only:
+                self._drop(o, "rejected")
+                return
+            if top_q > 0:
+                self._fill(o, min(o.left, top_q), top, False)
+            if o.status == "filled":
+                return
+        o.status = "open"
+        if o.side == BUY:
+            o.queue = self.bid_qty if o.price == self.bid else (0.0 if o.price > self.bid else inf)
+            self.bids.append(o)
+        else:
+            o.queue = self.ask_qty if o.price == self.ask else (0.0 if o.price < self.ask else inf)
+            self.asks.append(o)
+
+    def _trigger(self, p):
+        hit = [o for o in self.stops if (o.side == BUY and p >= o.price) or (o.side == SELL and p <= o.price)]
+        for o in hit:
+            self.stops.remove(o)
+            self._market(o)
+
+    def _hit(self, book, p, q, side):
+        # agressor do outro lado negociou q a p: ordens com preço atravessado enchem inteiras; no próprio
+        # preço, só o que sobra depois da fila à frente (ordens próprias no nível dividem o mesmo q)
+        for o in book:
+            L = o.price
+            if (p < L) if side == BUY else (p > L):
+                self._fill(o, o.left, L, True)
+            elif p == L and o.queue != inf:
+                take = min(q - o.queue, o.left)
+                o.queue = max(o.queue - q, 0.0)
+                if take > 0:
+                    self._fill(o, take, L, True); q -= take
+        book[:] = [o for o in book if o.status == "open"]
+
+    def _requeue(self):
+        # topo mudou: livro que cruzou o preço enche a ordem; fila à frente nunca maior que o topo
+        b, a = self.bid, self.ask
+        for o in self.bids:
+            if a <= o.price:
+                self._fill(o, o.left, o.price, True)
+            elif o.price == b:
+                o.queue = self.bid_qty if o.queue == inf else min(o.queue, self.bid_qty)
+            elif o.price > b:
+                o.queue = 0.0
+        for o in self.asks:
+            if b >= o.price:
+                self._fill(o, o.left, o.price, True)
+            elif o.price == a:
+                o.queue = self.ask_qty if o.queue == inf else min(o.queue, self.ask_qty)
+            elif o.price < a:
+                o.queue = 0.0
+        self.bids[:] = [o for o in self.bids if o.status == "open"]
+        self.asks[:] = [o for o in self.asks if o.status == "open"]
+
+    def result(self) -> dict:
+        mark = self.last if self.last == self.last else 0.0
+        maker = sum(f.qty for f in self.fills if f.maker); total = sum(f.qty for f in self.fills)
+        return {"events": self.events, "seconds": round(self.elapsed, 3),
+                "events_per_min": int(self.events / self.elapsed * 60) if self.elapsed > 0 else 0,
+                "fills": len(self.fills), "maker_frac": round(maker / total, 4) if total else 0.0,
+                "pos": self.pos, "pnl": round(self.cash + self.pos * mark, 4), "fees": round(self.fees, 4)}
+
+
+class MakerFirst(Strategy):
+    """Sinais (ts ns, lado, qty) executados como maker_first: GTX no topo do próprio lado; rejeitada, reenvia
+    no novo topo (até `retries`); o que faltar em `timeout_ms` é cancelado e completado a mercado."""
+
+    def __init__(self, signals, timeout_ms: float = 2000, retries: int = 3):
+        self.signals = [(int(t), int(s), float(q)) for t, s, q in signals]
+        self.timeout = int(timeout_ms * 1_000_000)
+        self.retries = retries
+        self.state = {}
+
+    def on_start(self, sim):
+        for k, (ts, _, _) in enumerate(self.signals):
+            sim.schedule(ts, ("signal", k))
+
+    def _post(self, sim, k):
+        st = self.state[k]
+        side, left = st["side"], st["qty"] - st["filled"]
+        px = sim.bid if side == BUY else sim.ask
+        if st["expired"] or px != px:
+            st["order"] = sim.submit(side, left, MARKET, tag=k)
+        else:
+            st["tries"] += 1
+            st["order"] = sim.submit(side, left, LIMIT, px, post_only=True, tag=k)
+
+    def on_timer(self, sim, tag):
+        what, k = tag
+        if what == "signal":
+            ts, side, qty = self.signals[k]
+            self.state[k] = {"ts": sim.now, "side": side, "qty": qty, "mid": sim.mid, "tries": 0, "filled": 0.0,
+                             "notional": 0.0, "maker": 0.0, "done": None, "expired": False, "order": None}
+            self._post(sim, k)
+            sim.schedule(sim.now + self.timeout, ("timeout", k))
+        else:
+            st = self.state[k]
+            if st["done"] is None:
+                st["expired"] = True
+                if st["order"].type == LIMIT:
+                    sim.cancel(st["order"])   # o resto vai a mercado quando o cancelamento chegar
+
+    def on_order(self, sim, o):
+        st = self.state[o.tag]
+        if st["done"] is not None or o.type == MARKET:   # mercado rejeitada = sem preço nenhum ainda
+            return
+        if o.status == "rejected" and st["tries"] >= self.retries:
+            st["expired"] = True   # rejeições esgotadas: mercado
+        self._post(sim, o.tag)
+
+    def on_fill(self, sim, o, f):
+        st = self.state[o.tag]
+        st["filled"] += f.qty; st["notional"] += f.qty * f.price
+        if f.maker:
+            st["maker"] += f.qty
+        if st["filled"] >= st["qty"] - 1e-12:
+            st["done"] = sim.now
+            if o.status == "open":
+                sim.cancel(o)
+
+    def report(self) -> pd.DataFrame:
+        rows = []
+        for k, st in sorted(self.state.items()):
+            avg = st["notional"] / st["filled"] if st["filled"] else nan
+            rows.append({"signal_ts": pd.Timestamp(st["ts"], tz="UTC"), "side": st["side"], "qty": st["qty"],
+                         "filled": st["filled"], "maker_frac": st["maker"] / st["filled"] if st["filled"] else 0.0,
+                         "wait_ms": (st["done"] - st["ts"]) / 1e6 if st["done"] is not None else nan,
+                         "tries": st["tries"], "avg_price": avg,
+                         "slip_bps": st["side"] * (avg - st["mid"]) / st["mid"] * 1e4 if st["mid"] == st["mid"] else nan})
+        return pd.DataFrame(rows)
+
+
+async def _export(symbol, start, end, archive, source):
+    from src.utils.db import get_pool
+    pool = await get_pool()
+    qs = {"trades": """
+        select trade_time as ts, cast(price as double precision) as price, cast(qty as double precision) as qty, is_buyer_maker
+        from md_trades where symbol=$1 and trade_time >= $2 and trade_time < $3 order by trade_time""",
+          "book": """
+        select ts, cast(bid_price as double precision) as bid_price, cast(bid_qty as double precision) as bid_qty,
+               cast(ask_price as double precision) as ask_price, cast(ask_qty as double precision) as ask_qty
+        from md_book where source=$4 and symbol=$1 and ts >= $2 and ts < $3 order by ts"""}
+    try:
+        for day in pd.date_range(start, end, freq="D", tz="UTC", inclusive="left"):
+            for kind, q in qs.items():
+                args = (symbol, day.to_pydatetime(), (day + pd.Timedelta(days=1)).to_pydatetime())
+                async with pool.acquire() as con:
+                    rows = await con.fetch(q, *args, *((source,) if kind == "book" else ()))
+                n = archive.write(symbol, kind, pd.DataFrame(rows, columns=list(COLS[kind]))) if rows else 0
+                print(f"[replay] {symbol} {kind} {day:%Y-%m-%d}: {n} linhas")
+    finally:
+        await pool.close()
+
+
+def main():
+    import argparse, asyncio, yaml
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    e = sub.add_parser("export", help="md_trades/md_book do Postgres -> arquivo de ticks")
+    e.add_argument("--symbol", required=True)
+    e.add_argument("--start", required=True)
+    e.add_argument("--end", required=True)
+    e.add_argument("--source", default="futures")
+    sub.add_parser("info")
+    r = sub.add_parser("run", help="replay de sinais maker_first")
+    r.add_argument("--symbol", required=True)
+    r.add_argument("--signals", required=True, help="CSV com time, side (1/-1 ou BUY/SELL), qty")
+    r.add_argument("--start", default=None)
+    r.add_argument("--end", default=None)
+    r.add_argument("--timeout-ms", type=float, default=2000)
+    r.add_argument("--latency-ms", type=float, default=0.0)
+    r.add_argument("--out", default=None)
+    ap.add_argument("--root", default=None)
+    args = ap.parse_args()
+    archive = TickArchive(args.root)
+    if args.cmd == "export":
+        asyncio.run(_export(args.symbol.upper(), args.start, args.end, archive, args.source))
+    elif args.cmd == "info":
+        for p in sorted(archive.root.glob("*/*")):
+            days = archive.days(p.parent.name, p.name)
+            rows = sum(json.loads((p / d / "meta.json").read_text())["rows"] for d in days)
+            print(f"{p.parent.name:12s} {p.name:6s} dias={len(days):4d} linhas={rows:12d} {days[0] if days else ''} -> {days[-1] if days else ''}")
+    else:
+        fees = yaml.safe_load(open("config/settings_v31.yml"))["slippage_fees"]
+        sig = pd.read_csv(args.signals)
+        side = sig["side"].map(lambda s: BUY if str(s).upper() in ("1", "BUY", "LONG") else SELL)
+        strat = MakerFirst(zip(_ns(pd.to_datetime(sig["time"], utc=True)), side, sig["qty"]), args.timeout_ms)
+        sim = Replay(strat, fees["maker_bps"], fees["taker_bps"], args.latency_ms)
+        res = sim.run(archive.chunks(args.symbol, "trades", args.start, args.end),
+                      archive.chunks(args.symbol, "book", args.start, args.end))
+        rep = strat.report()
+        out = Path(args.out or f"reports/replay_{args.symbol.upper()}.csv")
+        out.parent.mkdir(parents=True, exist_ok=True)
+        rep.to_csv(out, index=False)
+        print(f"[replay] {res}")
+        if len(rep):
+            print(f"[replay] sinais={len(rep)} maker={rep['maker_frac'].mean():.1%} espera média={rep['wait_ms'].mean():.0f} ms "
+                  f"slip médio={rep['slip_bps'].mean():.2f} bps -> {out}")
+
+
+if __name__ == "__main__":
+    main()
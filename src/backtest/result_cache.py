@@ -0,0 +1,213 @@
+import hashlib, json, os, tempfile, time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Cache de resultados de backtest endereçado por conteúdo:
+#   chave = hash(impressão digital dos dados + cfg mesclado + versão do código + tag do pipeline)
+# - dados: hash do arquivo (file_fingerprint, memorizado por tamanho/mtime) ou das colunas do frame
+#   (frame_fingerprint, para recortes como folds do walk-forward);
+# - versão do código: hash dos fontes de estratégias/backtest/indicadores (mudou o código, muda a chave);
+# - cada resultado é um .npz colunar (pnl/time/... dos trades + resumo em JSON), escrito de forma atômica
+#   (vários processos do grid podem gravar ao mesmo tempo);
+# - prune por tamanho total (remove os menos usados primeiro) e por idade.
+#
+# BACKTEST_CACHE=0 desliga; BACKTEST_CACHE_DIR muda o diretório (padrão .cache/backtests).
+# manutenção: python -m src.backtest.result_cache [--stats] [--prune --max-mb 500 --max-age-days 30] [--clear]
+
+ROOT = Path(__file__).resolve().parents[2]
+CODE = ("src/strategies/*.py", "src/backtest/*.py", "src/features/ta_v31.py", "src/features/kernels.py",
+        "src/features/jit.py", "src/features/batch.py", "src/features/spec.py", "src/features/unified.py",
+        "src/features/store.py")
+
+_FILES = {}
+_FRAMES = {}
+_CODE = None
+
+
+def file_fingerprint(path) -> str:
+    p = Path(path)
+    st = p.stat()
+    k = (str(p.resolve()), st.st_size, st.st_mtime_ns)
+    if k not in _FILES:
+        h = hashlib.blake2b(digest_size=16)
+        with open(p, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                h.update(block)
+        _FILES[k] = h.hexdigest()
+    return _FILES[k]
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Hash das colunas do frame (um por objeto; o mesmo DataFrame não é re-hasheado)."""
+    hit = _FRAMES.get(id(df))
+    if hit is not None and hit[0] is df:
+        return hit[1]
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps(list(map(str, df.columns))).encode())
+    for c in df.columns:
+        s = df[c]
+        v = s.dt.tz_convert("UTC").dt.tz_localize(None) if getattr(s.dtype, "tz", None) is not None else s
+        h.update(np.ascontiguousarray(v.to_numpy()).tobytes() if v.dtype != object else "\x1f".join(map(str, v)).encode())
+    fp = h.hexdigest()
+    _FRAMES.clear()
+    _FRAMES[id(df)] = (df, fp)
+    return fp
+
+
+def code_version() -> str:
+    global _CODE
+    if _CODE is None:
+        h = hashlib.blake2b(digest_size=8)
+        for f in sorted({f for g in CODE for f in ROOT.glob(g)}):
+            h.update(f.relative_to(ROOT).as_posix().encode()); h.update(f.read_bytes())
+        _CODE = h.hexdigest()
+    return _CODE
+
+
+def _encode(res: dict) -> dict:
+    trades = list(res.get("trades") or [])
+    keys = list(dict.fromkeys(k for t in trades for k in t))
+    arrays, cols = {}, {}
+    for k in keys:
+        vals = [t.get(k) for t in trades]
+        present = [k in t for t in trades]
+        if not all(present):
+            arrays[f"has:{k}"] = np.array(present)
+        got = [v for v, p in zip(vals, present) if p]
+        if got and all(isinstance(v, pd.Timestamp) for v in got):
+            cols[k] = ["time", str(got[0].tz) if got[0].tz is not None else None]
+            arrays[f"col:{k}"] = np.array([v.value if p else 0 for v, p in zip(vals, present)], dtype=np.int64)
+        elif all(isinstance(v, (bool, np.bool_)) for v in got):
+            cols[k] = ["bool", None]; arrays[f"col:{k}"] = np.array([bool(v) for v in vals])
+        elif all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in got):
+            cols[k] = ["int", None]; arrays[f"col:{k}"] = np.array([int(v or 0) for v in vals], dtype=np.int64)
+        elif all(isinstance(v, (int, float, np.number)) for v in got):
+            cols[k] = ["float", None]; arrays[f"col:{k}"] = np.array([np.nan if v is None else v for v in vals], dtype=np.float64)
+        else:
+            cols[k] = ["str", None]; arrays[f"col:{k}"] = np.array(["" if v is None else str(v) for v in vals])
+    summary = {k: (v.item() if isinstance(v, np.generic) else v) for k, v in res.items() if k != "trades"}
+    arrays["meta"] = np.array(json.dumps({"summary": summary, "cols": cols, "keys": keys, "n": len(trades)}))
+    return arrays
+
+
+def _decode(z) -> dict:
+    meta = json.loads(str(z["meta"]))
+    n, cols = meta["n"], {}
+    for k in meta["keys"]:
+        kind, tz = meta["cols"][k]
+        a = z[f"col:{k}"]
+        if kind == "time":
+            t = pd.to_datetime(a, unit="ns", utc=True)
+            vals = list(t.tz_convert(tz) if tz else t.tz_localize(None))
+        else:
+            vals = a.tolist()
+        has = z[f"has:{k}"] if f"has:{k}" in z.files else None
+        cols[k] = (vals, has)
+    trades = [{k: v[i] for k, (v, has) in cols.items() if has is None or has[i]} for i in range(n)]
+    return {**meta["summary"], "trades": trades}
+
+
+class ResultCache:
+    def __init__(self, root=None, enabled: bool | None = None):
+        self.root = Path(root or os.getenv("BACKTEST_CACHE_DIR", ROOT / ".cache" / "backtests"))
+        self.enabled = os.getenv("BACKTEST_CACHE", "1") != "0" if enabled is None else enabled
+        self.hits = self.misses = 0
+
+    def key(self, data_fp: str, cfg: dict, tag: str = "") -> str:
+        blob = json.dumps({"data": data_fp, "cfg": cfg, "code": code_version(), "tag": tag}, sort_keys=True, default=str)
+        return hashlib.blake2b(blob.encode(), digest_size=16).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.npz"
+
+    def get(self, key: str):
+        p = self.path(key)
+        if not self.enabled or not p.exists():
+            return None
+        try:
+            with np.load(p, allow_pickle=False) as z:
+                res = _decode(z)
+        except (OSError, ValueError, KeyError):
+            return None   # arquivo corrompido/parcial: recalcula
+        os.utime(p)   # mtime = último uso (prune por LRU)
+        return res
+
+    def put(self, key: str, res: dict):
+        if not self.enabled:
+            return
+        p = self.path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=p.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                np.savez_compressed(fh, **_encode(res))
+            os.replace(tmp, p)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def run(self, data_fp: str, cfg: dict, fn, tag: str = "") -> dict:
+        """Resultado de fn() (dict do orquestrador) pelo cache; fn só roda em miss."""
+        key = self.key(data_fp, cfg, tag)
+        res = self.get(key)
+        if res is not None:
+            self.hits += 1
+            return res
+        self.misses += 1
+        res = fn()
+        self.put(key, res)
+        return res
+
+    def files(self):
+        return sorted(self.root.glob("*/*.npz"), key=lambda f: f.stat().st_mtime) if self.root.exists() else []
+
+    def stats(self) -> dict:
+        fs = self.files()
+        return {"dir": str(self.root), "entries": len(fs), "mb": round(sum(f.stat().st_size for f in fs) / 2**20, 2),
+                "hits": self.hits, "misses": self.misses}
+
+    def prune(self, max_mb: float | None = None, max_age_days: float | None = None) -> int:
+        """Remove entradas mais velhas que max_age_days e, depois, as menos usadas até caber em max_mb."""
+        fs, removed = self.files(), 0
+        if max_age_days is not None:
+            cut = time.time() - max_age_days * 86400
+            for f in [f for f in fs if f.stat().st_mtime < cut]:
+                f.unlink(missing_ok=True); removed += 1
+            fs = self.files()
+        if max_mb is not None:
+            total = sum(f.stat().st_size for f in fs)
+            for f in fs:
+                if total <= max_mb * 2**20:
+                    break
+                total -= f.stat().st_size
+                f.unlink(missing_ok=True); removed += 1
+        for f in self.root.glob("*/*.tmp") if self.root.exists() else []:
+            if f.stat().st_mtime < time.time() - 3600:   # sobras de escritas interrompidas
+                f.unlink(missing_ok=True)
+        return removed
+
+
+CACHE = ResultCache()
+
+
+def main():
+    import argparse, shutil
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--stats", action="store_true")
+    ap.add_argument("--prune", action="store_true")
+    ap.add_argument("--max-mb", type=float, default=None)
+    ap.add_argument("--max-age-days", type=float, default=None)
+    ap.add_argument("--clear", action="store_true")
+    args = ap.parse_args()
+    if args.clear and CACHE.root.exists():
+        shutil.rmtree(CACHE.root)
+        print(f"[cache] removido {CACHE.root}")
+    if args.prune:
+        n = CACHE.prune(args.max_mb, args.max_age_days)
+        print(f"[cache] prune: {n} entradas removidas")
+    print(f"[cache] {CACHE.stats()} code={code_version()}")
+
+
+if __name__ == "__main__":
+    main()
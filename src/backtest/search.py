@@ -0,0 +1,238 @@
+import math, time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.backtest.grid import SharedFrame, apply, attach, combos, evaluate_uncached, param_cols
+
+# Busca adaptativa de parâmetros no mesmo espaço discreto do grid ({(seção, chave): [valores]}) e com a
+# mesma interface de override (grid.apply = merge(BASE, over)):
+# - successive_halving: muitos candidatos em pouca história (as barras mais recentes), mantém o melhor
+#   1/eta e multiplica a história por eta até chegar ao histórico inteiro;
+# - tpe: Tree-structured Parzen Estimator; separa as avaliações em boas (top gamma) e ruins e sorteia o
+#   próximo ponto maximizando l(x)/g(x), parâmetro a parâmetro (vizinhos na lista contam como parecidos).
+# Orçamento em segundos de CPU somando o processo e os workers (time.process_time de cada avaliação).
+# As avaliações não passam pelo cache de resultados (grid.evaluate_uncached): um acerto do cache sairia
+# quase de graça e o orçamento deixaria de medir o custo real da busca.
+#
+# uso: python -m src.backtest.search [--budget-frac 0.25] [--workers 4]   (compara com o grid inteiro do grid_v33)
+
+
+def rank_key(m: dict, min_trades: int = 5) -> tuple:
+    """Ordenação do grid_v33 (pf, sharpe, pnl_total), com quem tem poucos trades por último."""
+    if m is None or "error" in m:
+        return (False, -math.inf, -math.inf, -math.inf)
+    return (m["trades"] >= min_trades, m["pf"], m["sharpe"], m["pnl_total"])
+
+
+def _timed(job):
+    evaluate_fn, meta, cfg = job
+    t0 = time.process_time()
+    try:
+        m = evaluate_fn(attach(meta), cfg)
+    except Exception as e:
+        m = {"error": f"{type(e).__name__}: {e}"}
+    return m, time.process_time() - t0
+
+
+class Evaluator:
+    """Avalia combinações (índices de grid.combos) num recorte das features, contando a CPU gasta.
+
+    evaluate_fn não deve usar o cache de resultados (ver grid.evaluate_uncached).
+    """
+
+    def __init__(self, base: dict, grid: dict, feats: pd.DataFrame, budget: float = math.inf,
+                 evaluate_fn=evaluate_uncached, workers: int = 1, min_trades: int = 5):
+        self.base, self.feats, self.budget, self.evaluate = base, feats.reset_index(drop=True), budget, evaluate_fn
+        self.params = combos(grid)
+        self.workers, self.min_trades = workers, min_trades
+        self.cpu = 0.0
+        self.history = []   # (índice, barras, métricas, cpu)
+        self.pool = ProcessPoolExecutor(workers) if workers > 1 else None
+
+    def left(self) -> float:
+        return self.budget - self.cpu
+
+    def run(self, idx, bars: int | None = None) -> list:
+        """Métricas de cada índice usando as últimas `bars` barras (todas se None)."""
+        feats = self.feats if bars is None or bars >= len(self.feats) else self.feats.iloc[-bars:].reset_index(drop=True)
+        cfgs = [apply(self.base, self.params[i]) for i in idx]
+        if self.pool is None:
+            out = []
+            for cfg in cfgs:
+                t0 = time.process_time()
+                try:
+                    m = self.evaluate(feats, cfg)
+                except Exception as e:
+                    m = {"error": f"{type(e).__name__}: {e}"}
+                out.append((m, time.process_time() - t0))
+        else:
+            shared = SharedFrame(feats)
+            try:
+                out = list(self.pool.map(_timed, [(self.evaluate, shared.meta, c) for c in cfgs]))
+            finally:
+                shared.close()
+        for i, (m, cpu) in zip(idx, out):
+            self.cpu += cpu
+            self.history.append((i, len(feats), m, cpu))
+        return [m for m, _ in out]
+
+    def key(self, m) -> tuple:
+        return rank_key(m, self.min_trades)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def successive_halving(ev: Evaluator, n: int | None = None, eta: int = 3, min_bars: int = 1000, seed: int = 0,
+                       log=print):
+    """(índice vencedor, métricas no histórico inteiro). n = candidatos iniciais (padrão: cabem no orçamento).
+
+    O orçamento é conferido a cada lote dentro do degrau. O vencedor precisa de min_trades no histórico
+    inteiro: se ninguém do último degrau tiver, os eliminados antes (melhores primeiro) são avaliados nele
+    enquanto houver orçamento; sem nenhum que passe, devolve o melhor avaliado e avisa no log.
+    """
+    rng = np.random.default_rng(seed)
+    N, total = len(ev.params), len(ev.feats)
+    rungs = max(int(math.log(max(total / min_bars, 1), eta)), 0)
+    sizes = [int(total / eta ** (rungs - r)) for r in range(rungs + 1)]
+    if n is None and not math.isfinite(ev.left()):
+        n = N
+    elif n is None:
+        # custo por avaliação medido na menor e na maior história (o backtest tem custo fixo por chamada),
+        # interpolado por degrau; n = quantos candidatos cabem no orçamento restante
+        probe = int(rng.integers(N))
+        ev.run([probe], sizes[0]); c0 = ev.history[-1][3]
+        ev.run([probe]); cf = ev.history[-1][3]
+        cost = lambda b: c0 + (cf - c0) * (b - sizes[0]) / max(total - sizes[0], 1)
+        n = int(ev.left() / max(sum(cost(b) / eta ** r for r, b in enumerate(sizes)), 1e-6))
+    n = int(min(max(n, eta), N))
+    cand = list(rng.permutation(N)[:n])
+    step = max(ev.workers, 1)
+    ranked = []   # ordem de cada degrau avaliado, do melhor ao pior
+    for r, bars in enumerate(sizes):
+        ms = {}
+        for k in range(0, len(cand), step):
+            if ev.left() <= 0 and (ms or r):
+                break
+            chunk = cand[k:k + step]
+            ms.update(zip(chunk, ev.run(chunk, None if r == rungs else bars)))
+        if not ms:
+            break
+        # mínimo de trades proporcional à história do degrau
+        key = lambda i: rank_key(ms[i], ev.min_trades * min(bars / total, 1.0))
+        ranked.append(sorted(ms, key=key, reverse=True))
+        if len(ms) < len(cand):   # orçamento acabou no meio do degrau
+            break
+        cand = ranked[-1][:max(len(ms) // eta, 1)]
+    # fila do vencedor: último degrau primeiro, depois os eliminados dos degraus anteriores
+    queue = list(dict.fromkeys(i for order in reversed(ranked) for i in order))
+    full = {i: m for i, b, m, _ in ev.history if b == total}
+    for k, i in enumerate(queue):
+        if any(rank_key(full[j], ev.min_trades)[0] for j in queue if j in full):
+            break
+        if i not in full:
+            if k and ev.left() <= 0:   # o primeiro da fila sempre é medido no histórico inteiro
+                break
+            full[i] = ev.run([i])[0]
+    i = max([j for j in queue if j in full], key=lambda j: rank_key(full[j], ev.min_trades))
+    if not rank_key(full[i], ev.min_trades)[0]:
+        log(f"[search] successive_halving: nenhum candidato avaliado no histórico inteiro tem >= {ev.min_trades} "
+            f"trades; o devolvido não se qualifica")
+    return i, full[i]
+
+
+def tpe(ev: Evaluator, n_startup: int = 10, gamma: float = 0.25, n_candidates: int = 24, batch: int | None = None,
+        bandwidth: float = 1.0, seed: int = 0):
+    """(índice vencedor, métricas) do TPE sobre o histórico inteiro, até esgotar o orçamento ou o espaço."""
+    rng = np.random.default_rng(seed)
+    keys = list(ev.params[0])
+    sizes = [len({p[k] for p in ev.params}) for k in keys]
+    values = [sorted({p[k] for p in ev.params}) for k in keys]
+    coords = {tuple(values[d].index(p[k]) for d, k in enumerate(keys)): i for i, p in enumerate(ev.params)}
+    batch = batch or max(ev.workers, 1)
+    seen, results = set(), []   # (coord, métricas)
+
+    def density(obs, d):
+        # Parzen sobre os índices do parâmetro d (lista ordenada): kernel gaussiano + prior uniforme
+        j = np.arange(sizes[d])
+        w = np.ones(sizes[d]) / sizes[d]
+        for o in obs:
+            w = w + np.exp(-0.5 * ((j - o[d]) / bandwidth) ** 2)
+        return w / w.sum()
+
+    while len(seen) < len(coords) and ev.left() > 0:
+        if len(results) < n_startup:
+            pick = [c for c in coords if c not in seen]
+            pick = [pick[k] for k in rng.permutation(len(pick))[:batch]]
+        else:
+            order = sorted(results, key=lambda r: ev.key(r[1]), reverse=True)
+            n_good = max(1, int(math.ceil(gamma * len(order))))
+            good, bad = [c for c, _ in order[:n_good]], [c for c, _ in order[n_good:]]
+            lg = [density(good, d) for d in range(len(keys))]
+            gg = [density(bad, d) for d in range(len(keys))]
+            pick = []
+            for _ in range(batch):
+                cand = [tuple(int(rng.choice(sizes[d], p=lg[d])) for d in range(len(keys))) for _ in range(n_candidates)]
+                cand = [c for c in cand if c not in seen and c not in pick]
+                if not cand:
+                    rest = [c for c in coords if c not in seen and c not in pick]
+                    cand = rest[:1]
+                if not cand:
+                    break
+                score = [sum(math.log(lg[d][c[d]]) - math.log(gg[d][c[d]]) for d in range(len(keys))) for c in cand]
+                pick.append(cand[int(np.argmax(score))])
+        if not pick:
+            break
+        ms = ev.run([coords[c] for c in pick])
+        seen.update(pick)
+        results += list(zip(pick, ms))
+    c, m = max(results, key=lambda r: ev.key(r[1]))
+    return coords[c], m
+
+
+def main():
+    import argparse
+    from pathlib import Path
+    from src.backtest.grid import load_features, merge
+    from src.scripts.grid_v33 import BASE, OVER, grid
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--budget-frac", type=float, default=0.25, help="orçamento = fração da CPU do grid inteiro")
+    ap.add_argument("--budget", type=float, default=None, help="segundos de CPU (sobrepõe --budget-frac)")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--min-trades", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="reports/search_vs_grid.csv")
+    args = ap.parse_args()
+    base = merge(BASE, OVER)
+    feats = load_features(base)
+    if feats is None:
+        raise SystemExit("[search] sem histórico (data/history ou data/*.csv) para o preset do grid_v33")
+
+    full = Evaluator(base, grid, feats, workers=args.workers, min_trades=args.min_trades)
+    ms = full.run(range(len(full.params)))
+    full.close()
+    order = sorted(range(len(ms)), key=lambda i: full.key(ms[i]), reverse=True)
+    rank = {i: r + 1 for r, i in enumerate(order)}
+    budget = args.budget if args.budget is not None else args.budget_frac * full.cpu
+    print(f"[search] grid inteiro: {len(ms)} combinações, CPU {full.cpu:.1f}s; orçamento {budget:.1f}s")
+
+    rows = [{"method": "grid", "cpu_s": round(full.cpu, 2), "evals": len(ms), "rank_in_grid": 1,
+             "qualified": full.key(ms[order[0]])[0], **param_cols(full.params[order[0]]), **ms[order[0]]}]
+    for name, fn in (("successive_halving", successive_halving), ("tpe", tpe)):
+        ev = Evaluator(base, grid, feats, budget, workers=args.workers, min_trades=args.min_trades)
+        try:
+            i, m = fn(ev, seed=args.seed)
+        finally:
+            ev.close()
+        rows.append({"method": name, "cpu_s": round(ev.cpu, 2), "evals": len(ev.history), "rank_in_grid": rank[i],
+                     "qualified": ev.key(m)[0], **param_cols(ev.params[i]), **m})
+    out = pd.DataFrame(rows)
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    out.to_csv(args.out, index=False)
+    print(out.to_string(index=False))
+    print(f"\n[OK] salvo {args.out}")
+
+
+if __name__ == "__main__":
+    main()
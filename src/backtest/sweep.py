@@ -0,0 +1,197 @@
+import time
+import numpy as np
+import pandas as pd
+from src.backtest.array_engine import trend_params
+
+# Sweep vetorizado de run_trend: K conjuntos de parâmetros avaliados juntos, um vetor de estado
+# (posição, qty, entrada, TP/SL, trailing, perdas seguidas) por conjunto, todos avançando a cada barra.
+# Mesmas regras e mesmas contas de strategies/trend_v31.run_trend (= array_engine.run_trend), então
+# pnl_total/trades/wins/losses batem exatamente com a execução um a um.
+#
+# Parâmetros que podem variar (o resto vem do cfg): execution.{tp_atr_mult, sl_atr_mult, partial_at_r,
+# trailing_after_r, trailing_atr_mult}, filters.{adx_trend_min, atrq_low, atrq_high},
+# risk.max_consecutive_losses.
+#
+# uso: python -m src.backtest.sweep [--csv data/BTCUSDT_5m_60d.csv] [--preset config/presets/btc_trend_v33.yml] [--check 20]
+
+VARY = {
+    ("execution", "tp_atr_mult"): 0, ("execution", "sl_atr_mult"): 1, ("execution", "partial_at_r"): 2,
+    ("execution", "trailing_after_r"): 3, ("execution", "trailing_atr_mult"): 4,
+    ("filters", "adx_trend_min"): 10, ("risk", "max_consecutive_losses"): 14,
+}
+QUANTILES = (("filters", "atrq_low"), ("filters", "atrq_high"))
+
+
+def expand(grid: dict) -> dict:
+    """{(seção, chave): lista} -> {(seção, chave): array K} no produto cartesiano (ordem de grid.combos)."""
+    from src.backtest.grid import combos
+    rows = combos(grid)
+    return {k: np.array([r[k] for r in rows], dtype=np.float64) for k in grid}
+
+
+def sweep_trend(df: pd.DataFrame, cfg: dict, params: dict) -> pd.DataFrame:
+    """Uma linha por conjunto de `params` ({(seção, chave): array K}) com o resultado de run_trend."""
+    bad = set(params) - set(VARY) - set(QUANTILES)
+    if bad:
+        raise ValueError(f"parâmetros não suportados no sweep: {sorted(bad)}")
+    K = len(next(iter(params.values())))
+    base = trend_params(cfg)
+    P = {k: np.asarray(params.get(k, np.full(K, base[j])), dtype=np.float64) for k, j in VARY.items()}
+    tp_mult, sl_mult, part_r, trail_after, trail_mult, adx_min, max_seq = (P[k] for k in VARY)
+    maker = base[5] > 0; mk = base[6] / 10000.0; tk = base[7] / 10000.0
+    slip_base = base[8]; slip_frac = base[9]; block_m = base[11]; cap = base[12]; risk_pct = base[13]
+    fee_in = mk if maker else tk
+
+    flt = cfg["filters"]
+    d = df.reset_index(drop=True)
+    atr_pct = d["atr_pct"].to_numpy(dtype=np.float64)
+    # filtro de quantis do ATR%: limites por conjunto (quantis calculados uma vez por valor distinto)
+    if flt["use_atr_quantile"] and len(d) > 10:
+        q = {k: np.asarray(params.get(k, np.full(K, flt[k[1]])), dtype=np.float64) for k in QUANTILES}
+        uq = np.unique(np.concatenate(list(q.values())))
+        val = dict(zip(uq, (float(d["atr_pct"].quantile(x)) for x in uq)))
+        low = np.array([val[x] for x in q[QUANTILES[0]]]); high = np.array([val[x] for x in q[QUANTILES[1]]])
+    else:
+        low = np.full(K, -np.inf); high = np.full(K, np.inf)
+
+    close, atr, adx, emaf, emas = (d[c].to_numpy(dtype=np.float64) for c in ("close", "atr", "adx", "ema_fast", "ema_slow"))
+    ok = (atr == atr) & ~(atr <= 0)
+    if block_m > 0:
+        m = d["close_time"].dt.minute.to_numpy()
+        ok &= ~((m < block_m) | (m >= 60 - block_m))
+
+    pos = np.zeros(K, dtype=np.int8); qty = np.zeros(K); ep = np.zeros(K); tp = np.zeros(K); sl = np.zeros(K)
+    trail = np.zeros(K); has_trail = np.zeros(K, dtype=bool); losses_row = np.zeros(K); stopped = np.zeros(K, dtype=bool)
+    total = np.zeros(K); n = np.zeros(K, dtype=np.int64); wins = np.zeros(K, dtype=np.int64)
+    gross_win = np.zeros(K); gross_loss = np.zeros(K); eq = np.zeros(K); peak = np.zeros(K); dd = np.zeros(K)
+    s1 = np.zeros(K); s2 = np.zeros(K)
+    this_risk = cap * risk_pct
+
+    def book(mask, pnl):
+        # registra trades (na ordem em que run_trend os anexa) e as estatísticas de equity
+        nonlocal total, eq, peak, dd
+        p = np.where(mask, pnl, 0.0)
+        total = np.where(mask, total + pnl, total)
+        n[mask] += 1; wins[mask & (pnl > 0)] += 1
+        gross_win[mask & (pnl > 0)] += p[mask & (pnl > 0)]
+        gross_loss[mask & (pnl < 0)] -= p[mask & (pnl < 0)]
+        eq = np.where(mask, eq + pnl, eq)
+        peak = np.maximum(peak, eq); dd = np.minimum(dd, eq - peak)
+        s1[mask] += p[mask]; s2[mask] += p[mask] * p[mask]
+
+    for i in np.flatnonzero(ok):
+        a = atr[i]; price = close[i]
+        act = ~stopped & (atr_pct[i] >= low) & (atr_pct[i] <= high) & ~(adx[i] < adx_min)
+        if not act.any():
+            continue
+        r_val = sl_mult * a
+        bump = price * (slip_base / 10000.0) + a * slip_frac
+        held = act & (pos != 0)
+
+        if held.any():
+            lg = held & (pos == 1); sh = held & (pos == -1)
+            ex_l = price if maker else price - bump
+            ex_s = price if maker else price + bump
+            ex_p = np.where(lg, ex_l, ex_s)
+            # parcial
+            part = (part_r > 0) & (qty > 0) & ((lg & ((price - ep) >= part_r * r_val)) | (sh & ((ep - price) >= part_r * r_val)))
+            if part.any():
+                half = qty * 0.5
+                cost = ep * half * fee_in + ex_p * half * tk
+                pnl = np.where(lg, (ex_p - ep) * half, (ep - ex_p) * half) - cost
+                book(part, pnl)
+                qty = np.where(part, qty - half, qty)
+                sl = np.where(part & ((lg & (ep < sl)) | (sh & (ep > sl))), ep, sl)
+            # trailing
+            tl = (trail_after > 0) & ((lg & ((price - ep) >= trail_after * r_val)) | (sh & ((ep - price) >= trail_after * r_val)))
+            if tl.any():
+                t_l = price - trail_mult * a; t_s = price + trail_mult * a
+                trail = np.where(tl & lg, np.where(t_l > sl, t_l, sl), np.where(tl & sh, np.where(t_s < sl, t_s, sl), trail))
+                has_trail |= tl
+            hit = (lg & ((price >= tp) | (price <= sl) | (has_trail & (price <= trail)))) | \
+                  (sh & ((price <= tp) | (price >= sl) | (has_trail & (price >= trail))))
+            if hit.any():
+                cost = ep * qty * fee_in + ex_p * qty * tk
+                pnl = np.where(lg, ex_p - ep, ep - ex_p) * qty - cost
+                book(hit, pnl)
+                losses_row = np.where(hit, np.where(pnl < 0, losses_row + 1, 0), losses_row)
+                stopped |= hit & (losses_row >= max_seq)
+                pos[hit] = 0; qty[hit] = 0.0; has_trail[hit] = False
+
+        # entrada (só quem estava flat no início da barra)
+        if abs(price - emaf[i]) <= (0.25 * a):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                plan_qty = np.where(r_val > 0, this_risk / r_val, 0.0)
+            enter = act & ~held & (pos == 0) & (plan_qty > 0)
+            if enter.any():
+                up = emaf[i] > emas[i]
+                e = price if maker else (price + bump if up else price - bump)
+                pos[enter] = 1 if up else -1
+                qty = np.where(enter, plan_qty, qty)
+                ep[enter] = e
+                tp = np.where(enter, e + tp_mult * a if up else e - tp_mult * a, tp)
+                sl = np.where(enter, e - sl_mult * a if up else e + sl_mult * a, sl)
+                has_trail[enter] = False
+
+    out = pd.DataFrame({f"{s}.{k}": v for (s, k), v in params.items()})
+    mean = np.divide(s1, n, out=np.zeros(K), where=n > 0)
+    sd = np.sqrt(np.maximum(np.divide(s2, n, out=np.zeros(K), where=n > 0) - mean * mean, 0.0))
+    out["trades"] = n; out["wins"] = wins; out["losses"] = n - wins
+    out["pnl_total"] = total
+    out["pf"] = np.where(n > 0, gross_win / np.where(gross_loss > 1e-9, gross_loss, 1e-9), 0.0)
+    out["mdd"] = np.abs(dd)
+    out["sharpe"] = np.where(n > 0, mean / np.where(sd > 0, sd, 1e-9) * np.sqrt(252), 0.0)
+    return out
+
+
+def main():
+    import argparse, yaml
+    from src.backtest.array_engine import run_trend
+    from src.backtest.grid import apply, combos, merge
+    from src.backtest.history import locate
+    from src.features.ta_v31 import build_features
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv", default=None, help="padrão: histórico do preset (locate: store colunar ou CSV)")
+    ap.add_argument("--preset", default="config/presets/btc_trend_v33.yml")
+    ap.add_argument("--check", type=int, default=0, help="confere N conjuntos sorteados contra run_trend")
+    ap.add_argument("--out", default="reports/sweep_trend.csv")
+    args = ap.parse_args()
+    cfg = merge(yaml.safe_load(open("config/settings_v31.yml")), yaml.safe_load(open(args.preset)))
+    ind = cfg["indicators"]
+    if args.csv:
+        df = pd.read_csv(args.csv, parse_dates=["open_time", "close_time"])
+    else:
+        src = locate(cfg["symbols"][0], cfg["timeframe"], cfg["history_days"])
+        if src is None:
+            raise SystemExit("[sweep] sem histórico para o preset; use --csv")
+        df = src.load()
+    feats = build_features(df, ind["ema_fast"], ind["ema_slow"], ind["atr_period"], ind["adx_period"], ind.get("vwap_window", 20))
+    grid = {
+        ("execution", "tp_atr_mult"): np.round(np.arange(1.2, 3.01, 0.1), 2).tolist(),
+        ("execution", "sl_atr_mult"): np.round(np.arange(0.6, 1.51, 0.1), 2).tolist(),
+        ("filters", "adx_trend_min"): list(range(14, 28, 2)),
+        ("filters", "atrq_high"): [0.75, 0.8, 0.85, 0.9, 0.95],
+        ("execution", "trailing_atr_mult"): [0.6, 0.8, 1.0],
+    }
+    params = expand(grid)
+    t0 = time.perf_counter()
+    res = sweep_trend(feats, cfg, params)
+    print(f"[sweep] {len(res)} conjuntos x {len(feats)} barras em {time.perf_counter()-t0:.2f}s")
+    ok = True
+    if args.check:
+        rows = combos(grid)
+        for k in np.random.default_rng(0).choice(len(rows), min(args.check, len(rows)), replace=False):
+            pnl, trades, w, l = run_trend(feats, apply(cfg, rows[k]))
+            r = res.iloc[k]
+            same = (pnl, len(trades), w, l) == (r["pnl_total"], r["trades"], r["wins"], r["losses"])
+            ok &= same
+            if not same:
+                print(f"  [dif] {rows[k]}: run_trend={pnl, len(trades), w, l} sweep={tuple(r[['pnl_total','trades','wins','losses']])}")
+        print(f"[sweep] conferência com run_trend ({args.check} conjuntos): {'ok' if ok else 'DIVERGENTE'}")
+    res.sort_values(["pf", "sharpe", "pnl_total"], ascending=False, kind="stable").to_csv(args.out, index=False)
+    print(f"[OK] salvo {args.out}")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
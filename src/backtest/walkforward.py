@@ -0,0 +1,134 @@
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.backtest.grid import apply, backtest, combos, evaluate, load_features, metrics, param_cols, run_grid, trade_pnls
+
+# Walk-forward: janelas móveis de treino/teste sobre o histórico.
+# - features calculadas uma vez no histórico inteiro (indicadores são causais) e recortadas por fold;
+# - em cada fold o grid roda no treino (src/backtest/grid.py, pool de processos, progresso/resume
+#   por fold), o vencedor é aplicado ao teste seguinte;
+# - os trades de teste são costurados numa curva de equity fora da amostra.
+#
+# uso: python -m src.backtest.walkforward [--preset config/presets/btc_trend_v33.yml] [--train-days 30]
+#      [--test-days 7] [--workers 8] [--resume]
+
+DEFAULT_GRID = {
+    ("execution", "tp_atr_mult"): [1.7, 1.8, 2.0],
+    ("execution", "sl_atr_mult"): [0.8, 0.9, 1.0],
+    ("filters", "adx_trend_min"): [16, 18, 20],
+    ("filters", "atrq_high"): [0.80, 0.85, 0.90],
+}
+RANK = ["pf", "sharpe", "pnl_total"]
+
+
+def folds(ts: pd.Series, train: pd.Timedelta, test: pd.Timedelta, step: pd.Timedelta | None = None):
+    """[(train_lo, train_hi, test_hi)] em posições de `ts` (crescente); treino [lo, hi), teste [hi, test_hi).
+
+    step < test daria janelas de teste sobrepostas (trades contados duas vezes na equity costurada): ValueError.
+    """
+    t = pd.DatetimeIndex(ts).asi8
+    step = step or test
+    if step < test:
+        raise ValueError(f"step ({step}) menor que test ({test}): janelas de teste se sobrepõem")
+    out = []
+    s = pd.Timestamp(t[0], tz=getattr(ts.dt, "tz", None)) if len(t) else None
+    while len(t):
+        a, b, c = (int(np.searchsorted(t, (s + x).value, side="left")) for x in (pd.Timedelta(0), train, train + test))
+        if b >= len(t):
+            break
+        out.append((a, b, c))
+        s += step
+    return out
+
+
+def pick(res: pd.DataFrame, min_trades: int):
+    """Melhor linha do treino por RANK (desempate pela ordem do grid); None se nada tiver trades suficientes."""
+    ok = res[res["trades"] >= min_trades] if len(res) else res
+    if ok.empty:
+        return None
+    return ok.sort_values("i").sort_values(RANK, ascending=False, kind="stable").iloc[0]
+
+
+def walk_forward(base: dict, grid: dict, feats: pd.DataFrame, train: pd.Timedelta, test: pd.Timedelta,
+                 step: pd.Timedelta | None = None, workers: int = 1, resume: bool = False,
+                 out_dir="reports/walkforward", min_trades: int = 5, log=print):
+    """(tabela por fold, trades fora da amostra costurados).
+
+    `feats` já vem calculado com os indicadores de `base`; o grid não pode variar a seção indicators.
+    """
+    ind = sorted(key for sec, key in grid if sec == "indicators")
+    if ind:
+        raise ValueError(f"grid varia indicators {ind}: walk_forward usa as features de base para todas as combinações")
+    feats = feats.reset_index(drop=True)
+    out_dir = Path(out_dir)
+    rows, oos = [], []
+    params = combos(grid)
+    for k, (a, b, c) in enumerate(folds(feats["close_time"], train, test, step)):
+        tr, te = feats.iloc[a:b], feats.iloc[b:c]
+        t0, t1, t2 = (feats["close_time"].iloc[x] for x in (a, b, c - 1))
+        tag = f"fold{k:02d}_{t0:%Y%m%d}_{t1:%Y%m%d}"
+        log(f"[wf] {tag}: treino {len(tr)} barras ({t0} -> {t1}), teste {len(te)} barras (até {t2})")
+        res = run_grid(base, grid, evaluate, out_dir / f"{tag}.jsonl", workers, resume,
+                       features=lambda cfg, tr=tr: tr, group=lambda cfg: tag, log=log)
+        best = pick(res, min_trades)
+        row = {"fold": k, "train_start": t0, "test_start": t1, "test_end": t2}
+        if best is None:
+            log(f"[wf] {tag}: nenhuma combinação com >= {min_trades} trades no treino; teste sem operar")
+            rows.append(row)
+            continue
+        chosen = params[int(best["i"])]
+        got = pd.DataFrame([t for t in _trades(te, apply(base, chosen))], columns=["pnl", "time"])
+        got["fold"] = k
+        oos.append(got)
+        m = metrics(got["pnl"].tolist())
+        rows.append({**row, **param_cols(chosen), **{f"train_{x}": best[x] for x in m}, **{f"test_{x}": v for x, v in m.items()}})
+        log(f"[wf] {tag}: vencedor {param_cols(chosen)} | treino pf={best['pf']} pnl={best['pnl_total']} "
+            f"| teste pf={m['pf']} pnl={m['pnl_total']} trades={m['trades']}")
+    oos = [x for x in oos if len(x)]   # fold sem trades no teste não entra na concatenação
+    trades = pd.concat(oos, ignore_index=True) if oos else pd.DataFrame(columns=["pnl", "time", "fold"])
+    trades["equity"] = trades["pnl"].cumsum()
+    return pd.DataFrame(rows), trades
+
+
+def _trades(feats, cfg):
+    raw = backtest(feats, cfg).get("trades") or []
+    return [(p, t.get("time")) for p, t in zip(trade_pnls(raw), raw)]
+
+
+def main():
+    import argparse, yaml
+    from src.backtest.grid import merge
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--preset", default="config/presets/btc_trend_v33.yml")
+    ap.add_argument("--train-days", type=float, default=30)
+    ap.add_argument("--test-days", type=float, default=7)
+    ap.add_argument("--step-days", type=float, default=None, help="padrão = test-days; não pode ser menor (testes sem sobreposição)")
+    ap.add_argument("--min-trades", type=int, default=5)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--resume", action="store_true")
+    ap.add_argument("--out-dir", default="reports/walkforward")
+    args = ap.parse_args()
+
+    base = merge(yaml.safe_load(open("config/settings_v31.yml")), yaml.safe_load(open(args.preset)))
+    feats = load_features(base)
+    if feats is None:
+        raise SystemExit(f"[wf] sem histórico: {base['symbols'][0]} {base['timeframe']} {base['history_days']}d")
+    days = lambda x: pd.Timedelta(days=x) if x is not None else None
+    table, trades = walk_forward(base, DEFAULT_GRID, feats, days(args.train_days), days(args.test_days),
+                                 days(args.step_days), args.workers, args.resume, args.out_dir, args.min_trades)
+    if table.empty:
+        raise SystemExit(f"[wf] histórico de {len(feats)} barras não cabe um fold de treino {args.train_days}d + "
+                         f"teste {args.test_days}d")
+    out = Path(args.out_dir); name = Path(args.preset).stem
+    out.mkdir(parents=True, exist_ok=True)
+    table.to_csv(out / f"{name}_folds.csv", index=False)
+    trades.to_csv(out / f"{name}_oos_equity.csv", index=False)
+    m = metrics(trades["pnl"].tolist())
+    print(table.to_string(index=False))
+    print(f"\n[wf] fora da amostra ({len(table)} folds): {m}")
+    print(f"[OK] salvo {out / f'{name}_folds.csv'} e {out / f'{name}_oos_equity.csv'}")
+
+
+if __name__ == "__main__":
+    main()
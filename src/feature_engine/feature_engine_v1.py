@@ -3,7 +3,8 @@ import pandas as pd
 import numpy as np
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
-import ta
+from src.features import kernels as K
+from src.features.asof import AsofCache, join_aux, NS
 
 load_dotenv()
 PG_DSN=os.getenv("PG_DSN")
@@ -61,25 +62,16 @@ def load_candles(sym,tf,n):
     if df.empty: return df
     return df.sort_values("ts").reset_index(drop=True)
 
-def load_oi(sym, ts_min, ts_max):
-    q=text("""
-        SELECT ts, open_interest AS oi_5m
-        FROM public.open_interest
-        WHERE symbol=:s AND timeframe='5m' AND ts BETWEEN :a AND :b
-        ORDER BY ts
-    """)
-    with engine.begin() as c:
-        return pd.read_sql(q,c,params={"s":sym,"a":ts_min,"b":ts_max})
-
-def load_spread(sym, tf, ts_min, ts_max):
-    q=text("""
-        SELECT ts, spread_pct
-        FROM public.spread_perp_spot
-        WHERE symbol=:s AND timeframe=:tf AND ts BETWEEN :a AND :b
-        ORDER BY ts
-    """)
-    with engine.begin() as c:
-        return pd.read_sql(q,c,params={"s":sym,"tf":tf,"a":ts_min,"b":ts_max})
+def load_aux(sym, tf, ts, cache):
+    # OI e spread alinhados ao fechamento de cada barra (as-of, com limite de staleness)
+    conn=engine.raw_connection()
+    try:
+        cur=conn.cursor()
+        aux=join_aux(cur,"ts",("oi_5m","spread_pct"),sym,tf,ts,TF_MIN[tf]*60*NS,cache)
+        cur.close()
+    finally:
+        conn.close()
+    return aux
 
 def upsert(df: pd.DataFrame):
     if df.empty: return
@@ -114,25 +106,20 @@ def build(df):
     out["ema20_slope"]=slope(out["ema20"],3)
     out["ema50_slope"]=slope(out["ema50"],3)
     out["vwap_slope"]=slope(out["vwap"],3)
-    try: out["adx14"]=ta.trend.adx(high=out["high"], low=out["low"], close=out["close"], window=14)
-    except Exception: out["adx14"]=np.nan
-    try:
-        atr=ta.volatility.average_true_range(high=out["high"], low=out["low"], close=out["close"], window=14)
-        out["atrp14"]=(atr/out["close"])*100.0
-    except Exception: out["atrp14"]=np.nan
-    try:
-        bb_h=ta.volatility.bollinger_hband(out["close"],window=20,window_dev=2)
-        bb_l=ta.volatility.bollinger_lband(out["close"],window=20,window_dev=2)
-        bb_m=ta.volatility.bollinger_mavg(out["close"],window=20)
-        out["bb_width"]=((bb_h-bb_l)/bb_m.replace(0,np.nan))*100.0
-    except Exception: out["bb_width"]=np.nan
+    h,l,c=(out[k].to_numpy(dtype=float) for k in ("high","low","close"))
+    out["adx14"]=K.adx(h,l,c,14,method="ta")
+    out["atrp14"]=(K.atr(h,l,c,14,method="ta")/c)*100.0
+    out["bb_width"]=K.bb_width(c,20,2.0)*100.0
     # placeholders
     out["delta_aggr"]=np.nan; out["bid_ask_ratio"]=np.nan
     for c in ["ema20_slope","ema50_slope","vwap_slope","adx14","atrp14","bb_width"]:
         out[f"z_{c}"]=zroll(out[c],win=500)
     return out
 
-def order(tf): return {"1m":1,"3m":3,"5m":5,"15m":15,"30m":30,"1h":60}.get(tf,999)
+TF_MIN={"1m":1,"3m":3,"5m":5,"15m":15,"30m":30,"1h":60}
+def order(tf): return TF_MIN.get(tf,999)
+
+AUX_CACHE=AsofCache()
 
 def main():
     for sym in SYMBOLS:
@@ -142,20 +129,9 @@ def main():
                 print(f"[WARN] Sem candles para {sym} {tf}"); continue
             feats=build(df)
 
-            # integra OI (5m) via merge_asof (último <= ts)
-            oi = load_oi(sym, feats["ts"].min(), feats["ts"].max())
-            if not oi.empty:
-                feats = pd.merge_asof(feats.sort_values("ts"), oi.sort_values("ts"),
-                                      on="ts", direction="backward")
-            else:
-                feats["oi_5m"]=np.nan
-
-            # integra spread (match exato ts/tf)
-            sp = load_spread(sym, tf, feats["ts"].min(), feats["ts"].max())
-            if not sp.empty:
-                feats = feats.merge(sp, on="ts", how="left")
-            else:
-                feats["spread_pct"]=np.nan
+            # integra OI (5m) e spread (mesmo tf): as-of no fechamento da barra, sem merge por linha
+            ts=pd.DatetimeIndex(pd.to_datetime(feats["ts"],utc=True)).asi8
+            for k,v in load_aux(sym,tf,ts,AUX_CACHE).items(): feats[k]=v
 
             # z-scores dos novos campos
             feats["z_oi_5m"]      = zroll(feats["oi_5m"], win=500)
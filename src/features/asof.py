@@ -0,0 +1,150 @@
+import os
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+# Séries auxiliares (open interest, spread perp/spot, funding) alinhadas às barras por as-of join:
+# para cada fechamento de barra, o último valor disponível até ali, desde que não mais velho que max_age.
+# Uma consulta por série/símbolo (intervalo inteiro) + searchsorted nos arrays ordenados; nada por linha.
+#
+# - `lag`: quanto depois de `ts` o valor passa a ser conhecido ("tf" = duração do timeframe, p/ valores
+#   de fechamento de candle como spread_perp_spot);
+# - staleness: FEATURE_AUX_MAX_AGE="oi_5m=900,spread_pct=600" (segundos) sobrescreve os padrões;
+# - AsofCache guarda os arrays por (série, símbolo) e só busca linhas novas no loop ao vivo.
+
+NS = 1_000_000_000
+
+
+@dataclass(frozen=True)
+class AuxSeries:
+    name: str
+    table: str
+    time_col: str
+    value_col: str
+    where: str = ""          # filtro fixo, ex. "timeframe='5m'"
+    tf_col: str | None = None  # filtra pelo timeframe da barra
+    max_age: int = 900       # segundos
+    lag: int | str = 0       # segundos ou "tf"
+
+    def query(self, since: bool) -> str:
+        cond = ["symbol=%s"] + ([self.where] if self.where else []) + ([f"{self.tf_col}=%s"] if self.tf_col else [])
+        cond.append(f"{self.time_col} > %s" if since else f"{self.time_col} >= %s")
+        cond.append(f"{self.time_col} <= %s")
+        return (f"select {self.time_col}, {self.value_col}::float8 from {self.table} "
+                f"where {' and '.join(cond)} order by {self.time_col}")
+
+    def load(self, cur, symbol: str, tf: str, start, end, since: bool = False):
+        args = (symbol,) + ((tf,) if self.tf_col else ()) + (start, end)
+        cur.execute(self.query(since), args)
+        rows = cur.fetchall()
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        ts, v = zip(*rows)
+        return (pd.DatetimeIndex(pd.to_datetime(list(ts), utc=True)).asi8,
+                np.array([np.nan if x is None else x for x in v], dtype=np.float64))
+
+    def lag_ns(self, tf_ns: int) -> int:
+        return tf_ns if self.lag == "tf" else int(self.lag) * NS
+
+
+# por família de tabelas (mesmas chaves de sinks.SOURCES)
+AUX_SOURCES = {
+    # src/collectors/*.py (tabelas public.* com ts timestamp)
+    "ts": {
+        "oi_5m": AuxSeries("oi_5m", "public.open_interest", "ts", "open_interest", where="timeframe='5m'",
+                           max_age=900),
+        "spread_pct": AuxSeries("spread_pct", "public.spread_perp_spot", "ts", "spread_pct", tf_col="timeframe",
+                                max_age=600, lag="tf"),
+        "funding_rate": AuxSeries("funding_rate", "public.funding_rates", "ts", "funding_rate", max_age=9 * 3600),
+    },
+    # src/sql/schema.sql
+    "md": {
+        "oi_5m": AuxSeries("oi_5m", "md_open_interest", "ts", "open_interest", max_age=900),
+        "spread_pct": AuxSeries("spread_pct", "md_spread", "ts", "spread_bps / 100.0", max_age=600),
+        "funding_rate": AuxSeries("funding_rate", "md_funding", "ts", "last_funding_rate", max_age=9 * 3600),
+    },
+    # datahub/sql/001_schema.sql
+    "datahub": {
+        "oi_5m": AuxSeries("oi_5m", "open_interest", "event_time", "open_interest", max_age=900),
+        "spread_pct": AuxSeries("spread_pct", "perp_spot_spread", "event_time", "spread_bps / 100.0", max_age=600),
+        "funding_rate": AuxSeries("funding_rate", "funding_rates", "funding_time", "funding_rate",
+                                  max_age=9 * 3600),
+    },
+}
+
+
+def max_ages(env: str | None = None) -> dict:
+    raw = os.getenv("FEATURE_AUX_MAX_AGE", "") if env is None else env
+    return {k.strip(): int(v) for k, v in (p.split("=") for p in raw.split(",") if "=" in p)}
+
+
+def asof_join(at_ns, ts_ns, values, max_age_ns: int | None = None) -> np.ndarray:
+    """Último values[j] com ts_ns[j] <= at_ns[i] (ambos crescentes); NaN se não houver ou estiver velho."""
+    at_ns = np.asarray(at_ns, dtype=np.int64)
+    out = np.full(len(at_ns), np.nan)
+    if len(ts_ns) == 0:
+        return out
+    j = np.searchsorted(ts_ns, at_ns, side="right") - 1
+    ok = j >= 0
+    if max_age_ns is not None:
+        ok &= (at_ns - ts_ns[np.maximum(j, 0)]) <= max_age_ns
+    out[ok] = values[j[ok]]
+    return out
+
+
+class AsofCache:
+    """Arrays ordenados por (série, símbolo, tf); refresh busca só o que chegou depois do último ts."""
+
+    def __init__(self, retention: int = 7 * 86400):
+        self.retention = retention * NS
+        self.data = {}
+
+    def get(self, cur, s: AuxSeries, symbol: str, tf: str, start_ns: int, end_ns: int):
+        key = (s.name, symbol, tf if s.tf_col else None)
+        if key not in self.data or start_ns < self.data[key][0]:
+            loaded, (ts, v) = start_ns, s.load(cur, symbol, tf, _dt(start_ns), _dt(end_ns))
+        else:
+            loaded, ts, v = self.data[key]
+            nt, nv = s.load(cur, symbol, tf, _dt(int(ts[-1]) if len(ts) else loaded), _dt(end_ns), since=len(ts) > 0)
+            ts, v = np.r_[ts, nt], np.r_[v, nv]
+        loaded = max(loaded, end_ns - self.retention)
+        k = int(np.searchsorted(ts, loaded, side="left"))
+        self.data[key] = (loaded, ts[k:], v[k:])
+        lo = int(np.searchsorted(ts, start_ns, side="left"))
+        return ts[lo:], v[lo:]
+
+
+def _dt(ns: int):
+    return pd.Timestamp(int(ns), tz="UTC").to_pydatetime()
+
+
+def join_aux(cur, family: str, names, symbol: str, tf: str, open_ns, tf_ns: int,
+             cache: AsofCache | None = None, ages: dict | None = None) -> dict:
+    """{nome: array alinhado às barras} para as séries auxiliares pedidas, as-of do fechamento de cada barra."""
+    open_ns = np.asarray(open_ns, dtype=np.int64)
+    ages = {**max_ages(), **(ages or {})}
+    out = {}
+    for name in names:
+        s = AUX_SOURCES[family][name]
+        age = ages.get(name, s.max_age) * NS
+        if len(open_ns) == 0:
+            out[name] = np.empty(0)
+            continue
+        at = open_ns + tf_ns   # fechamento da barra
+        lag = s.lag_ns(tf_ns)
+        lo, hi = int(at[0] - lag - age), int(at[-1] - lag)
+        ts, v = cache.get(cur, s, symbol, tf, lo, hi) if cache is not None else s.load(cur, symbol, tf, _dt(lo), _dt(hi))
+        out[name] = asof_join(at, ts + lag, v, age)
+    return out
+
+
+def attach_aux(cur, source, names, symbol: str, tf: str, ts_ns, arrays: dict,
+               cache: AsofCache | None = None, specs=None) -> dict:
+    """arrays + séries auxiliares que `names` precisa (nada muda se nenhuma for usada)."""
+    from src.features.spec import DEFAULT_SPECS, aux_needed
+    from src.features.multi_tf import tf_minutes
+    need = aux_needed(names, specs or DEFAULT_SPECS)
+    if not need or len(ts_ns) == 0:
+        return arrays
+    tf_ns = tf_minutes(tf) * 60 * NS
+    return {**arrays, **join_aux(cur, source.aux, need, symbol, tf, ts_ns, tf_ns, cache)}
@@ -0,0 +1,214 @@
+import os, time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+import numpy as np
+import pandas as pd
+from src.features.spec import DEFAULT_SPECS, resolve, max_warmup
+from src.features.unified import compute
+
+# Backfill de features num intervalo de datas (ex.: depois de mudar um parâmetro de indicador).
+# - o intervalo vira blocos de `chunk` barras; cada bloco é calculado com `overlap` barras anteriores
+#   (aquecimento) num pool de processos e só as barras do próprio bloco são mantidas;
+# - vol_regime usa quantis da janela inteira, então os cortes são fixados uma vez sobre o intervalo
+#   todo antes de dividir (senão cada bloco teria seus próprios regimes);
+# - z-score por regime usa as últimas n barras do mesmo regime, que podem estar bem antes do bloco:
+#   o início de cada bloco recua até cobrir essas janelas (regimes calculados uma vez no intervalo);
+# - features acumuladas (spec.cumulative: VWAP acumulado e z na janela inteira dos layouts legados) não têm
+#   aquecimento que feche a emenda: saem de uma passada sobre a série e entram prontas nos blocos;
+# - --verify compara os blocos com um cálculo de passada única e não grava se alguma emenda divergir;
+# - séries auxiliares (OI, spread) entram por as-of join (src/features/asof.py) antes de dividir;
+# - a escrita é por COPY (Layout.write -> copy_upsert), bloco a bloco.
+#
+# uso: python -m src.features.backfill --start 2025-01-01 --end 2025-04-01 --timeframes 5m,15m --verify
+
+def pin_regimes(arrays: dict, names, specs=DEFAULT_SPECS):
+    """Specs com os cortes de vol_regime fixados pelos quantis do intervalo inteiro."""
+    plan = resolve(names, specs)
+    pinned = {}
+    for s in plan:
+        if s.kernel != "vol_regime":
+            continue
+        x = compute(arrays, [s.inputs[0]], specs)[s.inputs[0]]
+        x = x[np.isfinite(x)]
+        if len(x) >= 3:
+            lo, hi = np.quantile(x, [s.params.get("q_low", 0.33), s.params.get("q_high", 0.66)])
+            pinned[s.name] = replace(s, params={**s.params, "bounds": (float(lo), float(hi))})
+    return tuple(pinned.get(s.name, s) for s in specs)
+
+
+def group_reach(arrays: dict, names, specs, starts):
+    """Para cada início de bloco, o índice mais antigo que entra numa janela de zscore_regime."""
+    starts = np.asarray(starts, dtype=np.int64)
+    reach = starts.copy()
+    zs = [s for s in resolve(names, specs) if s.kernel == "zscore_regime"]
+    if not zs:
+        return reach
+    labels = compute(arrays, sorted({s.inputs[1] for s in zs}), specs)
+    for s in zs:
+        g, n = labels[s.inputs[1]], s.params.get("n", 200)
+        for key in set(g[g != None]):   # noqa: E711 (array de objetos)
+            pos = np.flatnonzero(g == key)
+            k = np.searchsorted(pos, starts, side="left")   # membros do regime antes de cada bloco
+            back = pos[np.maximum(k - (n - 1), 0)]
+            reach = np.minimum(reach, np.where(k > 0, back, reach))
+    return reach
+
+
+def chunks(n: int, start: int, size: int, overlap: int, reach=None):
+    """Blocos (lo_calc, lo, hi): calcula em [lo_calc, hi), mantém [lo, hi)."""
+    los = list(range(start, n, size))
+    reach = los if reach is None else reach
+    return [(max(int(r) - overlap, 0), lo, min(lo + size, n)) for lo, r in zip(los, reach)]
+
+
+def _compute_chunk(job):
+    lo_calc, lo, hi, arrays, names, specs = job
+    feats = compute(arrays, names, specs)
+    k = lo - lo_calc
+    return lo, hi, {n: v[k:] for n, v in feats.items()}
+
+
+def compare(ref: dict, got: dict, rtol=1e-6):
+    """(max |diff| relativo nas floats, linhas divergentes) entre dois dicts de features."""
+    worst, bad = 0.0, 0
+    for n, a in ref.items():
+        b = got[n]
+        if a.dtype.kind == "f":
+            fa, fb = np.isfinite(a), np.isfinite(b)
+            both = fa & fb
+            d = np.abs(a[both] - b[both])
+            if len(d):
+                worst = max(worst, float(np.max(d / np.maximum(np.abs(a[both]), 1.0))))
+            # somas acumuladas (vwap) mudam o arredondamento conforme o início: tolerância relativa
+            bad += int((fa != fb).sum() + (d > rtol * np.maximum(np.abs(a[both]), 1.0)).sum())
+        else:
+            bad += int(sum(x != y for x, y in zip(a, b)))
+    return worst, bad
+
+
+def backfill_series(ts, arrays, names, start_ns, chunk: int, overlap: int, workers: int,
+                    specs=DEFAULT_SPECS, verify: bool = False, pool=None):
+    """Calcula as features de [start_ns, fim) em blocos paralelos; devolve (blocos, relatório das emendas)."""
+    n = len(ts)
+    first = int(np.searchsorted(ts, start_ns, side="left"))
+    specs = pin_regimes({f: a[first:] for f, a in arrays.items()}, names, specs)
+    whole = [s.name for s in resolve(names, specs) if s.cumulative]
+    if whole:
+        arrays = {**arrays, **compute(arrays, whole, specs)}
+    reach = group_reach(arrays, names, specs, range(first, n, chunk))
+    jobs = [(lc, lo, hi, {f: a[lc:hi] for f, a in arrays.items()}, names, specs)
+            for lc, lo, hi in chunks(n, first, chunk, overlap, reach)]
+    own = pool is None and workers > 1
+    pool = ProcessPoolExecutor(workers) if own else pool
+    try:
+        out = sorted(pool.map(_compute_chunk, jobs) if pool is not None else map(_compute_chunk, jobs),
+                     key=lambda r: r[0])
+    finally:
+        if own:
+            pool.shutdown()
+    report = []
+    if verify:
+        ref = compute(arrays, names, specs)
+        for lo, hi, feats in out:
+            worst, bad = compare({k: v[lo:hi] for k, v in ref.items()}, feats)
+            report.append({"lo": lo, "hi": hi, "ts": pd.Timestamp(int(ts[lo]), tz="UTC"),
+                           "max_rel_diff": worst, "bad_rows": bad})
+    return out, report
+
+
+def run(sinks, source, symbols, timeframes, start, end, chunk: int, overlap: int | None, workers: int,
+        dsn: str, sink_dsn: dict | None = None, verify: bool = False, dry_run: bool = False):
+    from src.features.unified import _connect
+    from src.features.sinks import record_version
+    from src.features.asof import attach_aux
+    names = sorted({f for s in sinks for f in s.features()})
+    warm = max_warmup(resolve(names))
+    # warmup das specs = valor estável; 2x deixa os recursivos (EMA50 -> z-scores) iguais à passada única
+    overlap = 2 * warm if overlap is None else overlap
+    start_dt, end_dt = (pd.Timestamp(t) for t in (start, end))
+    start_dt, end_dt = (t.tz_localize("UTC") if t.tzinfo is None else t for t in (start_dt, end_dt))
+    src_conn = _connect(dsn)
+    conns = {} if dry_run else {s.name: _connect((sink_dsn or {}).get(s.name, dsn)) for s in sinks}
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    total, ok = 0, True
+    try:
+        for s in sinks:
+            if s.name in conns:
+                with conns[s.name].cursor() as cur:
+                    record_version(cur, s)
+        for sym in symbols:
+            for tf in timeframes:
+                t0 = time.perf_counter()
+                with src_conn.cursor() as cur:
+                    idx, arrays = source.load_range(cur, sym, tf, start_dt.to_pydatetime(),
+                                                    end_dt.to_pydatetime(), pad=overlap)
+                    if len(idx) == 0:
+                        print(f"[backfill] sem candles {sym} {tf}", flush=True)
+                        continue
+                    # OI/spread/funding: uma consulta por série no intervalo inteiro
+                    arrays = attach_aux(cur, source, names, sym, tf, idx.asi8, arrays)
+                ts = idx.asi8
+                out, report = backfill_series(ts, arrays, names, start_dt.value, chunk, overlap, workers,
+                                              verify=verify, pool=pool)
+                t_calc = time.perf_counter() - t0
+                if report:
+                    bad = [r for r in report if r["bad_rows"]]
+                    worst = max(r["max_rel_diff"] for r in report)
+                    print(f"[backfill] {sym} {tf}: {len(report)} blocos, emendas max_rel_diff={worst:.2e} "
+                          f"blocos_divergentes={len(bad)}", flush=True)
+                    for r in bad[:5]:
+                        print(f"  bloco {r['ts']} ({r['lo']}:{r['hi']}) bad_rows={r['bad_rows']}", flush=True)
+                    if bad:
+                        ok = False
+                        print(f"[backfill] {sym} {tf}: não gravado (aumente --overlap)", flush=True)
+                        continue
+                n = 0
+                if not dry_run:
+                    for lo, hi, feats in out:
+                        for s in sinks:
+                            with conns[s.name].cursor() as cur:
+                                n += s.write(cur, sym, tf, idx[lo:hi], feats)
+                total += n
+                print(f"[backfill] {sym} {tf}: {sum(hi - lo for _, lo, hi in out)} barras em {len(out)} blocos "
+                      f"calc={t_calc:.2f}s total={time.perf_counter()-t0:.2f}s upsert={n}", flush=True)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        src_conn.close()
+        for c in conns.values():
+            c.close()
+    return total, ok
+
+
+def main():
+    import argparse
+    from src.features.sinks import LAYOUTS, SOURCES
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--start", required=True)
+    ap.add_argument("--end", default=None, help="exclusivo; padrão = agora")
+    ap.add_argument("--sinks", default=os.getenv("FEATURE_SINKS", "jobs"))
+    ap.add_argument("--source", default=os.getenv("FEATURE_SOURCE", "ts"), choices=sorted(SOURCES))
+    ap.add_argument("--symbols", default=os.getenv("FEATURE_SYMBOLS", "BTCUSDT,ETHUSDT"))
+    ap.add_argument("--timeframes", default=os.getenv("FEATURE_TIMEFRAMES", "1m,5m,15m"))
+    ap.add_argument("--chunk", type=int, default=20000, help="barras por bloco")
+    ap.add_argument("--overlap", type=int, default=None, help="barras de aquecimento por bloco (padrão: 2x warmup das specs)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--verify", action="store_true", help="compara as emendas com passada única antes de gravar")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    dsn = os.getenv("FEATURE_DSN", "postgresql://localhost/botfutures")
+    sinks = [LAYOUTS[n.strip()] for n in args.sinks.split(",") if n.strip()]
+    sink_dsn = {s.name: os.getenv(f"FEATURE_DSN_{s.name.upper()}") for s in sinks}
+    sink_dsn = {k: v for k, v in sink_dsn.items() if v}
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    tfs = [t.strip() for t in args.timeframes.split(",") if t.strip()]
+    end = args.end or pd.Timestamp.now(tz="UTC").isoformat()
+    total, ok = run(sinks, SOURCES[args.source], symbols, tfs, args.start, end, args.chunk, args.overlap,
+                    args.workers, dsn, sink_dsn, verify=args.verify, dry_run=args.dry_run)
+    print(f"[backfill] upsert total={total}", flush=True)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
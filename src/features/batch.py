@@ -0,0 +1,193 @@
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from src.features import kernels as K
+from src.features import jit as J
+
+# Indicadores para vários períodos de uma vez + cache por (hash da série, indicador, período).
+# - ema_matrix / sma_matrix / atr_matrix / adx_matrix devolvem uma linha por período (k x n);
+#   TR, DM e as somas acumuladas são calculados uma vez e cada período só recorta a janela;
+# - IndicatorCache (LRU) guarda cada linha; períodos repetidos entre combinações de um grid custam zero;
+# - build_features_cached produz o mesmo DataFrame que ta_v31.build_features.
+#
+# Os resultados são idênticos (bit a bit) aos de ta_v31/kernels no mesmo modo (com ou sem numba).
+#
+# uso:
+#   cache = IndicatorCache()
+#   prefetch(df, cache, ema=range(8, 56), atr=[10, 14], adx=[14, 20])
+#   feats = build_features_cached(df, 12, 26, 14, 14, 20, cache)
+
+
+def series_key(*arrays) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a, dtype=np.float64)
+        h.update(str(a.shape).encode()); h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def ema_matrix(x, spans) -> np.ndarray:
+    """ewm(span, adjust=False) para cada span; numba: uma passada; sem numba: pandas por span (= ta_v31.ema)."""
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    spans = [float(s) for s in spans]
+    if J.ewm_rows is not None:
+        return J.ewm_rows(x, np.array([2.0 / (s + 1.0) for s in spans]))
+    s = pd.Series(x)
+    return np.array([s.ewm(span=sp, adjust=False).mean().to_numpy() for sp in spans]).reshape(len(spans), len(x))
+
+
+def _cums(x):
+    ok = np.isfinite(x)
+    return (np.concatenate(([0.0], np.cumsum(np.where(ok, x, 0.0)))),
+            np.concatenate(([0.0], np.cumsum(ok.astype(np.float64)))))
+
+
+def _windows(n: int, periods):
+    idx = np.arange(1, n + 1)
+    return idx, np.maximum(idx[None, :] - np.asarray(periods)[:, None], 0)
+
+
+def sma_matrix(x, periods) -> np.ndarray:
+    """rolling(p).mean() (min_periods=p) para cada p a partir de uma única soma acumulada."""
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    cs, cc = _cums(x)
+    idx, lo = _windows(len(x), periods)
+    s = cs[idx][None, :] - cs[lo]
+    cnt = cc[idx][None, :] - cc[lo]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(cnt >= np.maximum(np.asarray(periods), 1)[:, None], s / cnt, np.nan)
+
+
+def _sma_rows(X, periods):
+    # sma por linha de X (k x n), janela periods[i] na linha i
+    ok = np.isfinite(X)
+    z = np.zeros((X.shape[0], 1))
+    cs = np.concatenate((z, np.cumsum(np.where(ok, X, 0.0), axis=1)), axis=1)
+    cc = np.concatenate((z, np.cumsum(ok.astype(np.float64), axis=1)), axis=1)
+    idx, lo = _windows(X.shape[1], periods)
+    s = cs[:, idx] - np.take_along_axis(cs, lo, axis=1)
+    cnt = cc[:, idx] - np.take_along_axis(cc, lo, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(cnt >= np.maximum(np.asarray(periods), 1)[:, None], s / cnt, np.nan)
+
+
+def atr_matrix(high, low, close, periods) -> np.ndarray:
+    """ATR simples (ta_v31.atr) para cada período."""
+    if J.window_mean is not None:
+        tr = K.true_range(high, low, close)
+        return np.array([J.window_mean(tr, int(p)) for p in periods]).reshape(len(periods), len(tr))
+    return sma_matrix(K.true_range(high, low, close), periods)
+
+
+def adx_matrix(high, low, close, periods) -> np.ndarray:
+    """ADX de ta_v31.dx_adx para cada período (TR/DM e somas acumuladas compartilhadas)."""
+    periods = [int(p) for p in periods]
+    if J.dmi_sma is not None:
+        n = len(high)
+        return np.array([K.adx(high, low, close, p, "sma") for p in periods]).reshape(len(periods), n)
+    atr = sma_matrix(K.true_range(high, low, close), periods)
+    plus, minus = K.directional_movement(high, low)
+    n = len(plus)
+    idx, lo = _windows(n, periods)
+    rows = []
+    for dm in (np.nan_to_num(plus), np.nan_to_num(minus)):
+        cs, cc = _cums(dm)
+        s = cs[idx][None, :] - cs[lo]
+        cnt = cc[idx][None, :] - cc[lo]
+        rows.append(np.where(cnt >= np.asarray(periods)[:, None], s, np.nan))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pdi = 100.0 * rows[0] / atr
+        mdi = 100.0 * rows[1] / atr
+        dx = np.abs(pdi - mdi) / (pdi + mdi) * 100.0
+    dx[~np.isfinite(dx)] = np.nan
+    return _sma_rows(dx, periods)
+
+
+MATRIX = {
+    "ema": (lambda a, ps: ema_matrix(a["close"], ps)),
+    "atr": (lambda a, ps: atr_matrix(a["high"], a["low"], a["close"], ps)),
+    "adx": (lambda a, ps: adx_matrix(a["high"], a["low"], a["close"], ps)),
+    # ta_v31.vwap (somas móveis do pandas) por janela
+    "vwap": (lambda a, ps: np.array([_vwap(a["close"], a["volume"], p) for p in ps]).reshape(len(ps), len(a["close"]))),
+}
+
+
+def _vwap(close, volume, window):
+    from src.features.ta_v31 import vwap
+    return vwap(pd.Series(close), pd.Series(volume), window).to_numpy()
+
+
+COLS = ("high", "low", "close", "volume")
+
+
+class IndicatorCache:
+    """LRU de linhas de indicador por (hash da série, indicador, período)."""
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = self.misses = 0
+        self._keys = {}   # id(df) -> (df, hash), evita re-hash do mesmo DataFrame
+
+    def key(self, df: pd.DataFrame) -> str:
+        hit = self._keys.get(id(df))
+        if hit is not None and hit[0] is df:
+            return hit[1]
+        k = series_key(*(df[c].to_numpy(dtype=np.float64) for c in COLS))
+        self._keys = {id(df): (df, k)}
+        return k
+
+    def get(self, df: pd.DataFrame, kind: str, periods) -> dict:
+        """{período: array}; os que faltam são calculados juntos numa chamada de matriz."""
+        sk = self.key(df)
+        out, miss = {}, []
+        for p in dict.fromkeys(periods):
+            v = self.data.get((sk, kind, p))
+            if v is None:
+                miss.append(p)
+            else:
+                self.data.move_to_end((sk, kind, p))
+                out[p] = v
+        self.hits += len(out); self.misses += len(miss)
+        if miss:
+            arrays = {c: df[c].to_numpy(dtype=np.float64) for c in COLS}
+            M = MATRIX[kind](arrays, miss)
+            for p, row in zip(miss, M):
+                row = row.copy(); row.flags.writeable = False
+                self.data[(sk, kind, p)] = out[p] = row
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+        return out
+
+    def stats(self) -> dict:
+        return {"entries": len(self.data), "hits": self.hits, "misses": self.misses}
+
+
+def prefetch(df: pd.DataFrame, cache: IndicatorCache, ema=(), atr=(), adx=(), vwap=()):
+    for kind, ps in (("ema", ema), ("atr", atr), ("adx", adx), ("vwap", vwap)):
+        if len(ps):
+            cache.get(df, kind, list(ps))
+
+
+def build_features_cached(df: pd.DataFrame, ema_fast: int, ema_slow: int, atr_period: int, adx_period: int,
+                          vwap_window: int, cache: IndicatorCache | None = None) -> pd.DataFrame:
+    """ta_v31.build_features com EMA/ATR/ADX/VWAP vindos do cache (mesmo conjunto de parâmetros = cópia pronta)."""
+    cache = cache if cache is not None else IndicatorCache()
+    fk = (cache.key(df), "frame", (ema_fast, ema_slow, atr_period, adx_period, vwap_window))
+    hit = cache.data.get(fk)
+    if hit is not None:
+        cache.data.move_to_end(fk); cache.hits += 1
+        return hit.copy()
+    e = cache.get(df, "ema", [ema_fast, ema_slow])
+    out = df.copy()
+    out["ema_fast"] = e[ema_fast]
+    out["ema_slow"] = e[ema_slow]
+    out["atr"] = cache.get(df, "atr", [atr_period])[atr_period]
+    out["atr_pct"] = (out["atr"] / out["close"]).clip(lower=0)
+    out["trend"] = (out["ema_fast"] > out["ema_slow"]).astype(int)
+    out["adx"] = cache.get(df, "adx", [adx_period])[adx_period]
+    out["vwap"] = cache.get(df, "vwap", [vwap_window])[vwap_window]
+    out.dropna(inplace=True)
+    cache.data[fk] = out.copy()
+    return out
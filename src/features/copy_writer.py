@@ -0,0 +1,151 @@
+import io
+import numpy as np
+import pandas as pd
+
+# Writer vetorizado de features: DataFrame -> COPY binário do Postgres -> tabela staging -> upsert.
+# NaN/inf viram NULL coluna a coluna em NumPy (sem iterrows/n2none por linha).
+#
+# Formato COPY BINARY: header fixo, depois por linha int16(n_campos) + por campo int32(len|-1) + bytes,
+# e trailer int16(-1). Tipos suportados: float8, int4, int8, bool, text, timestamptz.
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + b"\x00\x00\x00\x00" + b"\x00\x00\x00\x00"
+PGCOPY_TRAILER = b"\xff\xff"
+PG_EPOCH_US = 946684800 * 1_000_000  # 2000-01-01 UTC em µs desde 1970
+
+_FIXED = {"float8": ">f8", "int8": ">i8", "int4": ">i4", "bool": "u1", "timestamptz": ">i8"}
+
+
+def _scatter(out: np.ndarray, dst: np.ndarray, lens: np.ndarray, payload: np.ndarray):
+    # copia payload (concatenação dos bytes de cada linha) para out[dst[i]:dst[i]+lens[i]]
+    total = int(lens.sum())
+    if total == 0:
+        return
+    src = np.cumsum(lens) - lens
+    idx = np.repeat(dst - src, lens) + np.arange(total, dtype=np.int64)
+    out[idx] = payload
+
+
+def _encode_fixed(values, pgtype: str):
+    n = len(values)
+    if pgtype == "timestamptz":
+        ts = pd.DatetimeIndex(pd.to_datetime(values, utc=True)).as_unit("us")
+        valid = ~np.asarray(ts.isna())
+        raw = ts.asi8 - PG_EPOCH_US
+    elif pgtype == "bool":
+        s = pd.Series(values)
+        valid = s.notna().to_numpy()
+        raw = np.zeros(n, dtype=np.uint8)
+        raw[valid] = s[valid].astype(bool).to_numpy()
+    else:
+        arr = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+        valid = np.isfinite(arr)
+        if pgtype == "float8":
+            raw = arr
+        else:
+            raw = np.where(valid, arr, 0).astype(np.int64)
+    dt = np.dtype(_FIXED[pgtype])
+    width = dt.itemsize
+    body = np.ascontiguousarray(raw.astype(dt)).view(np.uint8).reshape(n, width)
+    lens = np.where(valid, width, 0).astype(np.int64)
+    return valid, lens, body[valid].ravel()
+
+
+def _encode_text(values):
+    s = pd.Series(values, dtype=object)
+    valid = s.notna().to_numpy()
+    # codifica cada valor distinto uma vez (símbolo/intervalo/regime têm poucas categorias)
+    codes, uniques = pd.factorize(s.where(valid, None), use_na_sentinel=True)
+    enc = [str(u).encode("utf-8") for u in uniques]
+    if not enc:
+        return valid, np.zeros(len(s), dtype=np.int64), np.zeros(0, dtype=np.uint8)
+    ulens = np.array([len(b) for b in enc], dtype=np.int64)
+    lens = np.where(valid, ulens[np.maximum(codes, 0)], 0).astype(np.int64)
+    blob = np.frombuffer(b"".join(enc), dtype=np.uint8)
+    ustart = np.cumsum(ulens) - ulens
+    picked = codes[valid]
+    plens = ulens[picked]
+    src = np.repeat(ustart[picked] - (np.cumsum(plens) - plens), plens) + np.arange(int(plens.sum()), dtype=np.int64)
+    return valid, lens, blob[src]
+
+
+def encode_copy_binary(df: pd.DataFrame, spec) -> bytes:
+    """Converte df em payload COPY BINARY; spec = [(coluna, pgtype), ...] na ordem da tabela."""
+    n = len(df)
+    if n == 0:
+        return PGCOPY_HEADER + PGCOPY_TRAILER
+    cols = []
+    row_len = np.full(n, 2, dtype=np.int64)
+    for name, pgtype in spec:
+        values = df[name] if name in df.columns else pd.Series([None] * n, index=df.index)
+        values = values.to_numpy() if pgtype != "timestamptz" else values
+        if pgtype == "text":
+            valid, lens, payload = _encode_text(values)
+        else:
+            valid, lens, payload = _encode_fixed(values, pgtype)
+        cols.append((valid, lens, payload))
+        row_len += 4 + lens
+
+    body_len = int(row_len.sum())
+    out = np.empty(len(PGCOPY_HEADER) + body_len + len(PGCOPY_TRAILER), dtype=np.uint8)
+    out[:len(PGCOPY_HEADER)] = np.frombuffer(PGCOPY_HEADER, dtype=np.uint8)
+    out[-2:] = 0xFF
+    pos = len(PGCOPY_HEADER) + np.cumsum(row_len) - row_len
+
+    # int16 com o número de campos no início de cada linha
+    nf = np.full(n, len(spec), dtype=">i2").view(np.uint8).reshape(n, 2)
+    _scatter(out, pos, np.full(n, 2, dtype=np.int64), nf.ravel())
+    pos = pos + 2
+    for valid, lens, payload in cols:
+        hdr = np.where(valid, lens, -1).astype(">i4").view(np.uint8).reshape(n, 4)
+        _scatter(out, pos, np.full(n, 4, dtype=np.int64), hdr.ravel())
+        pos = pos + 4
+        _scatter(out, pos, lens, payload)
+        pos = pos + lens
+    return out.tobytes()
+
+
+def staging_sql(table: str, spec, key, staging: str | None = None, touch: dict | None = None):
+    """SQLs (create staging, copy, upsert) para gravar via tabela temporária.
+
+    touch: colunas extras só do UPDATE, ex. {"updated_at": "now()"}.
+    """
+    stg = staging or f"_stg_{table.split('.')[-1]}"
+    cols = [c for c, _ in spec]
+    col_defs = ", ".join(f"{c} {t}" for c, t in spec)
+    upd = [f"{c}=excluded.{c}" for c in cols if c not in key]
+    upd += [f"{c}={v}" for c, v in (touch or {}).items()]
+    # staging vive na sessão (funciona em autocommit e em pool); truncate limpa sobras de lotes anteriores
+    create = f"create temp table if not exists {stg} ({col_defs}); truncate {stg}"
+    copy = f"copy {stg} ({', '.join(cols)}) from stdin (format binary)"
+    action = f"do update set {', '.join(upd)}" if upd else "do nothing"
+    upsert = (f"insert into {table} ({', '.join(cols)}) select {', '.join(cols)} from {stg} "
+              f"on conflict ({', '.join(key)}) {action}")
+    return stg, create, copy, upsert
+
+
+async def copy_upsert_asyncpg(con, table: str, df: pd.DataFrame, spec, key, touch: dict | None = None) -> int:
+    if df is None or df.empty:
+        return 0
+    payload = encode_copy_binary(df, spec)
+    stg, create, _, upsert = staging_sql(table, spec, key, touch=touch)
+    async with con.transaction():
+        await con.execute(create)
+        await con.copy_to_table(stg, source=io.BytesIO(payload), columns=[c for c, _ in spec], format="binary")
+        await con.execute(upsert)
+    return len(df)
+
+
+def copy_upsert(cur, table: str, df: pd.DataFrame, spec, key, touch: dict | None = None) -> int:
+    # cursor psycopg (v3: cur.copy) ou psycopg2 (cur.copy_expert)
+    if df is None or df.empty:
+        return 0
+    payload = encode_copy_binary(df, spec)
+    _, create, copy, upsert = staging_sql(table, spec, key, touch=touch)
+    cur.execute(create)
+    if hasattr(cur, "copy_expert"):
+        cur.copy_expert(copy, io.BytesIO(payload))
+    else:
+        with cur.copy(copy) as cp:
+            cp.write(payload)
+    cur.execute(upsert)
+    return len(df)
@@ -2,10 +2,12 @@ import asyncio
 import asyncpg
 import pandas as pd
 import numpy as np
-import pandas_ta as ta
-from datetime import timezone, timedelta
 from src.config.settings import S
 from src.utils.db import get_pool
+from src.features.copy_writer import copy_upsert_asyncpg
+from src.features import kernels as K
+from src.features.zscore import RollingGroupZ
+from src.features.quantiles import SKETCH_DDL, REGIME_QS, regime_labels, load_sketch_async, save_sketch_async
 
 def to_frame(rows, cols):
     return pd.DataFrame(rows, columns=cols)
@@ -61,7 +63,17 @@ async def load_trades(pool, symbol: str, since_ts):
     return df
 
 
-def compute_features_from_1m(df1m: pd.DataFrame, trades: pd.DataFrame):
+async def load_regimes(pool, symbol: str, interval: str, since_ts) -> pd.Series:
+    """vol_regime já gravado em `features` (ts -> rótulo) a partir de since_ts."""
+    q = "select ts, vol_regime from features where symbol=$1 and interval=$2 and ts >= $3"
+    async with pool.acquire() as con:
+        rows = await con.fetch(q, symbol, interval, since_ts)
+    if not rows:
+        return pd.Series(dtype=object)
+    return pd.Series([r["vol_regime"] for r in rows], index=pd.DatetimeIndex([r["ts"] for r in rows]), dtype=object)
+
+
+def compute_features_from_1m(df1m: pd.DataFrame, trades: pd.DataFrame, sketch=None, regimes=None):
     if df1m.empty:
         return pd.DataFrame()
     df1m = df1m.copy()
@@ -82,29 +94,13 @@ def compute_features_from_1m(df1m: pd.DataFrame, trades: pd.DataFrame):
     vwap = (tp*df1m["volume"]).cumsum() / df1m["volume"].replace(0,np.nan).cumsum()
     out["vwap_slope"] = vwap.pct_change()*10000.0
 
-    # --- Indicadores robustos a dados curtos ---
-    # ADX
-    adx_df = ta.adx(high=df1m["high"], low=df1m["low"], close=df1m["close"], length=14)
-    if adx_df is None or "ADX_14" not in adx_df:
-        out["adx14"] = pd.Series(np.nan, index=out.index)
-    else:
-        out["adx14"] = pd.to_numeric(adx_df["ADX_14"], errors="coerce").astype(float)
-
-    # ATR
-    atr_s = ta.atr(high=df1m["high"], low=df1m["low"], close=df1m["close"], length=14)
-    if atr_s is None:
-        atr_s = pd.Series(np.nan, index=out.index)
-    atr_s = pd.to_numeric(atr_s, errors="coerce").astype(float)
-    out["atr_pct"] = 100.0 * (atr_s / df1m["close"])
-
-    # Bandas de Bollinger
-    bb_df = ta.bbands(close=df1m["close"], length=20, std=2.0)
-    if bb_df is None or "BBU_20_2.0" not in bb_df or "BBL_20_2.0" not in bb_df:
-        out["bb_width"] = pd.Series(np.nan, index=out.index)
-    else:
-        bbu = pd.to_numeric(bb_df["BBU_20_2.0"], errors="coerce").astype(float)
-        bbl = pd.to_numeric(bb_df["BBL_20_2.0"], errors="coerce").astype(float)
-        out["bb_width"] = 100.0 * ((bbu - bbl) / df1m["close"])
+    # --- Indicadores (kernels NumPy, mesma semântica do pandas_ta: rma = ewm(alpha=1/n, adjust=True)) ---
+    h, l, c = (df1m[k].to_numpy() for k in ("high", "low", "close"))
+    out["adx14"] = K.adx(h, l, c, 14, method="pta")
+    out["atr_pct"] = 100.0 * K.atr(h, l, c, 14, method="pta") / c
+    # Bandas de Bollinger (20, 2, ddof=0), largura sobre o close
+    _, bbu, bbl = K.bbands(c, 20, 2.0)
+    out["bb_width"] = 100.0 * (bbu - bbl) / c
 
     # Fluxo: delta agressor 1m
     if trades is not None and not trades.empty:
@@ -116,30 +112,50 @@ def compute_features_from_1m(df1m: pd.DataFrame, trades: pd.DataFrame):
     # (Opcional) razão bid/ask – mantém como NaN por enquanto
     out["bid_ask_ratio"] = np.nan
 
-    # Regimes por quantis de ATR%
-    if out["atr_pct"].notna().sum() >= 3:
-        q_low, q_high = out["atr_pct"].quantile([0.33, 0.66])
+    # Regimes por quantis de ATR%: com sketch persistido (P², só barras novas) as fronteiras são
+    # estáveis entre execuções; sem sketch, quantis da janela carregada (comportamento antigo).
+    # `regimes` (rótulos já gravados, ts -> vol_regime): linhas já escritas mantêm o rótulo delas,
+    # só as novas recebem as fronteiras atuais
+    if sketch is not None:
+        sketch.update(out["atr_pct"].to_numpy(), pd.DatetimeIndex(out.index).asi8)
+        bounds = sketch.bounds()
+    elif out["atr_pct"].notna().sum() >= 3:
+        bounds = out["atr_pct"].quantile(list(REGIME_QS)).to_numpy()
     else:
-        q_low, q_high = np.nan, np.nan
-
-    def regime(x):
-        if pd.isna(x) or pd.isna(q_low) or pd.isna(q_high): return np.nan
-        if x <= q_low: return "low"
-        if x <= q_high: return "mid"
-        return "high"
-    out["vol_regime"] = out["atr_pct"].apply(regime)
-
-    # Z-score por regime
-    def zscore(s):
-        m = s.rolling(200, min_periods=50).mean()
-        sd = s.rolling(200, min_periods=50).std()
-        return (s - m) / sd
-    for col in ["ema20_slope","ema50_slope","vwap_slope","adx14","atr_pct","bb_width","delta_aggr_1m"]:
-        out[f"z_{col}"] = out.groupby("vol_regime")[col].transform(zscore)
+        bounds = np.full(len(REGIME_QS), np.nan)
+    labels = regime_labels(out["atr_pct"].to_numpy(), bounds)
+    if regimes is not None and len(regimes):
+        old = regimes.reindex(out.index)
+        labels = np.where(old.notna().to_numpy(), old.to_numpy(dtype=object), labels)
+    out["vol_regime"] = labels
+
+    # Z-score por regime (rolling 200, min 50), incremental: as linhas até a última já gravada semeiam
+    # as janelas de cada regime e só as seguintes são calculadas (as anteriores ficam NaN, não são regravadas)
+    zcols = ["ema20_slope","ema50_slope","vwap_slope","adx14","atr_pct","bb_width","delta_aggr_1m"]
+    X = out[zcols].to_numpy(dtype=float)
+    cut = 0
+    if regimes is not None and len(regimes):
+        known = np.flatnonzero(out.index.isin(regimes.index))
+        cut = int(known[-1]) + 1 if len(known) else 0
+    rz = RollingGroupZ(len(zcols), n=200, min_periods=50)
+    rz.seed(X[:cut], labels[:cut])
+    z = np.full(X.shape, np.nan)
+    z[cut:] = rz.update(X[cut:], labels[cut:])
+    for i, col in enumerate(zcols):
+        out[f"z_{col}"] = z[:, i]
 
     return out
 
 
+FEATURES_SPEC = [
+    ("symbol", "text"), ("interval", "text"), ("ts", "timestamptz"),
+    ("ema20_slope", "float8"), ("ema50_slope", "float8"), ("vwap_slope", "float8"),
+    ("adx14", "float8"), ("atr_pct", "float8"), ("bb_width", "float8"),
+    ("delta_aggr_1m", "float8"), ("bid_ask_ratio", "float8"), ("vol_regime", "text"),
+    ("z_ema20_slope", "float8"), ("z_ema50_slope", "float8"), ("z_vwap_slope", "float8"),
+    ("z_adx14", "float8"), ("z_atr_pct", "float8"), ("z_bb_width", "float8"), ("z_delta_aggr_1m", "float8"),
+]
+
 async def write_features(pool, symbol: str, interval: str, feat: pd.DataFrame):
     if feat is None or feat.empty:
         return
@@ -149,72 +165,39 @@ async def write_features(pool, symbol: str, interval: str, feat: pd.DataFrame):
     if feat[keep_cols].dropna(how="all").empty:
         return
 
-    cols = ["ema20_slope","ema50_slope","vwap_slope","adx14","atr_pct","bb_width",
-            "delta_aggr_1m","bid_ask_ratio","vol_regime",
-            "z_ema20_slope","z_ema50_slope","z_vwap_slope",
-            "z_adx14","z_atr_pct","z_bb_width","z_delta_aggr_1m"]
-    for c in cols:
-        if c not in feat.columns:
-            feat[c] = np.nan
-
-    def n2none(x):
-        # numérico -> float | None
-        if x is None:
-            return None
-        try:
-            xv = float(x)
-            if np.isnan(xv) or np.isinf(xv):
-                return None
-            return xv
-        except Exception:
-            return None
-
-    rows = []
-    for ts, r in feat.iterrows():
-        vr = r.get("vol_regime")
-        # vol_regime precisa ser string ou None
-        if pd.isna(vr):
-            vr = None
-        else:
-            vr = str(vr)
-
-        rows.append((
-            symbol, interval, ts.to_pydatetime().replace(tzinfo=timezone.utc),
-            n2none(r["ema20_slope"]), n2none(r["ema50_slope"]), n2none(r["vwap_slope"]),
-            n2none(r["adx14"]), n2none(r["atr_pct"]), n2none(r["bb_width"]),
-            n2none(r["delta_aggr_1m"]), n2none(r["bid_ask_ratio"]),
-            vr,
-            n2none(r["z_ema20_slope"]), n2none(r["z_ema50_slope"]), n2none(r["z_vwap_slope"]),
-            n2none(r["z_adx14"]), n2none(r["z_atr_pct"]), n2none(r["z_bb_width"]), n2none(r["z_delta_aggr_1m"])
-        ))
-
-    q = """
-    insert into features(symbol,interval,ts,ema20_slope,ema50_slope,vwap_slope,adx14,atr_pct,bb_width,
-                         delta_aggr_1m,bid_ask_ratio,vol_regime,z_ema20_slope,z_ema50_slope,z_vwap_slope,
-                         z_adx14,z_atr_pct,z_bb_width,z_delta_aggr_1m)
-    values ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10,$11,$12,$13,$14,$15,$16,$17,$18,$19)
-    on conflict (symbol,interval,ts) do update set
-      ema20_slope=excluded.ema20_slope, ema50_slope=excluded.ema50_slope, vwap_slope=excluded.vwap_slope,
-      adx14=excluded.adx14, atr_pct=excluded.atr_pct, bb_width=excluded.bb_width,
-      delta_aggr_1m=excluded.delta_aggr_1m, bid_ask_ratio=excluded.bid_ask_ratio,
-      vol_regime=excluded.vol_regime, z_ema20_slope=excluded.z_ema20_slope,
-      z_ema50_slope=excluded.z_ema50_slope, z_vwap_slope=excluded.z_vwap_slope,
-      z_adx14=excluded.z_adx14, z_atr_pct=excluded.z_atr_pct, z_bb_width=excluded.z_bb_width,
-      z_delta_aggr_1m=excluded.z_delta_aggr_1m;
-    """
+    # NaN/inf -> NULL e vol_regime -> text são tratados por coluna no encoder COPY
+    out = feat.copy()
+    out["symbol"] = symbol
+    out["interval"] = interval
+    out["ts"] = feat.index
     async with pool.acquire() as con:
-        await con.executemany(q, rows)
+        await copy_upsert_asyncpg(con, "features", out, FEATURES_SPEC, key=("symbol", "interval", "ts"))
+
 async def run_once():
     pool = await get_pool()
+    async with pool.acquire() as con:
+        await con.execute(SKETCH_DDL)
     for sym in S.symbols:
         df = await load_last_candles(pool, sym, "1m", 3000)
+        # só barras fechadas: a em formação entraria no sketch e seria gravada uma vez, incompleta
+        if not df.empty:
+            df = df[df.index + pd.Timedelta(minutes=1) <= pd.Timestamp.now(tz=df.index.tz)]
         if df.empty:
             print(f"[engine] Sem candles para {sym}")
             continue
         since = (df.index[-1] - pd.Timedelta(hours=48)).to_pydatetime()
         tr = await load_trades(pool, sym, since)
-        feat = compute_features_from_1m(df, tr)
-        await write_features(pool, sym, "1m", feat.last("48H"))
+        async with pool.acquire() as con:
+            sketch = await load_sketch_async(con, sym, "1m")
+        regimes = await load_regimes(pool, sym, "1m", df.index[0].to_pydatetime())
+        seen = sketch.last_ts
+        feat = compute_features_from_1m(df, tr, sketch, regimes)
+        # grava só as barras depois da marca d'água do sketch: as anteriores já têm regime/z gravados
+        if seen is not None:
+            feat = feat[pd.DatetimeIndex(feat.index).asi8 > seen]
+        await write_features(pool, sym, "1m", feat[feat.index >= df.index[-1] - pd.Timedelta(hours=48)])
+        async with pool.acquire() as con:
+            await save_sketch_async(con, sym, "1m", sketch)
     await pool.close()
 
 if __name__ == "__main__":
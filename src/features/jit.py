@@ -0,0 +1,164 @@
+import os
+import numpy as np
+
+# Laços recursivos / fundidos dos indicadores compilados com Numba (opcional).
+# Sem numba (ou FEATURE_JIT=0) os nomes públicos ficam None e src/features/kernels.py usa a versão NumPy.
+# As funções _py_* são o código-fonte dos laços (também servem para conferir a lógica sem numba).
+#
+# Convenções iguais às de kernels.py: float64 contíguo, NaN no aquecimento.
+
+try:
+    if os.getenv("FEATURE_JIT", "1") == "0":
+        raise ImportError("FEATURE_JIT=0")
+    from numba import njit
+    NUMBA = True
+except ImportError:
+    njit = None
+    NUMBA = False
+
+
+def _py_ewm(x, a):
+    # ewm(adjust=False); NaN mantém o último valor
+    out = np.empty_like(x)
+    b = 1.0 - a
+    y = np.nan
+    for i in range(len(x)):
+        v = x[i]
+        if v == v:
+            y = v if y != y else a * v + b * y
+        out[i] = y
+    return out
+
+
+def _py_ewm_mean(x, a, min_periods):
+    # ewm(alpha, adjust=True, ignore_na=False).mean()
+    out = np.full_like(x, np.nan)
+    b = 1.0 - a
+    num = 0.0; den = 0.0; nobs = 0; started = False
+    mp = max(min_periods, 1)
+    for i in range(len(x)):
+        v = x[i]
+        if v == v:
+            num = b * num + v; den = b * den + 1.0; nobs += 1; started = True
+        elif started:
+            num *= b; den *= b
+        if started and nobs >= mp:
+            out[i] = num / den
+    return out
+
+
+def _py_ewm_rows(x, alphas):
+    # uma linha de ewm(adjust=False) por alpha, numa única passada pelos dados
+    k = len(alphas)
+    out = np.empty((k, len(x)))
+    y = np.full(k, np.nan)
+    for i in range(len(x)):
+        v = x[i]
+        for r in range(k):
+            if v == v:
+                y[r] = v if y[r] != y[r] else alphas[r] * v + (1.0 - alphas[r]) * y[r]
+            out[r, i] = y[r]
+    return out
+
+
+def _py_rma(x, n):
+    # Wilder: semente = média das n primeiras barras a partir do primeiro valor válido
+    out = np.full_like(x, np.nan)
+    start = -1
+    for i in range(len(x)):
+        if x[i] == x[i]:
+            start = i
+            break
+    if start < 0 or start + n > len(x):
+        return out
+    s = 0.0
+    for i in range(start, start + n):
+        if x[i] != x[i]:
+            return out
+        s += x[i]
+    y = s / n
+    out[start + n - 1] = y
+    a = 1.0 / n
+    for i in range(start + n, len(x)):
+        v = x[i]
+        if v == v:
+            y = y + a * (v - y)
+        out[i] = y
+    return out
+
+
+def _py_true_range(h, l, c):
+    # max(h-l, |h-c_ant|, |l-c_ant|), ignorando NaN (np.fmax)
+    out = np.empty_like(h)
+    for i in range(len(h)):
+        tr = h[i] - l[i]
+        if i > 0:
+            pc = c[i - 1]
+            if pc == pc:
+                a = abs(h[i] - pc); b = abs(l[i] - pc)
+                if a > tr or tr != tr:
+                    tr = a
+                if b > tr or tr != tr:
+                    tr = b
+        out[i] = tr
+    return out
+
+
+def _py_window_mean(x, n):
+    # rolling(n).mean() com min_periods=n: soma explícita da janela (sem deriva de soma corrente)
+    out = np.full_like(x, np.nan)
+    for i in range(n - 1, len(x)):
+        s = 0.0; ok = True
+        for j in range(i - n + 1, i + 1):
+            v = x[j]
+            if v != v:
+                ok = False
+                break
+            s += v
+        if ok:
+            out[i] = s / n
+    return out
+
+
+def _py_dmi_sma(h, l, c, n):
+    # ta_v31.dx_adx numa passada: TR, DM+/DM-, ATR simples, somas móveis de DM, DX e ADX (média de n DX)
+    N = len(h)
+    tr = _tr(h, l, c)
+    pdm = np.zeros(N); mdm = np.zeros(N)
+    for i in range(1, N):
+        up = h[i] - h[i - 1]; dn = l[i - 1] - l[i]
+        if up > dn and up > 0:
+            pdm[i] = up
+        if dn > up and dn > 0:
+            mdm[i] = dn
+    atr = _wmean(tr, n)
+    pdi = np.full(N, np.nan); mdi = np.full(N, np.nan); dx = np.full(N, np.nan)
+    for i in range(n - 1, N):
+        a = atr[i]
+        if a != a or a == 0.0:
+            continue
+        sp = 0.0; sm = 0.0
+        for j in range(i - n + 1, i + 1):
+            sp += pdm[j]; sm += mdm[j]
+        pdi[i] = 100.0 * sp / a
+        mdi[i] = 100.0 * sm / a
+        tot = pdi[i] + mdi[i]
+        if tot != 0.0:
+            dx[i] = abs(pdi[i] - mdi[i]) / tot * 100.0
+    return atr, pdi, mdi, _wmean(dx, n)
+
+
+# laços usados dentro de outros (compilados antes quando há numba)
+_tr, _wmean = _py_true_range, _py_window_mean
+
+if NUMBA:
+    _jit = njit(cache=True, nogil=True)
+    ewm = _jit(_py_ewm)
+    ewm_rows = _jit(_py_ewm_rows)
+    ewm_mean = _jit(_py_ewm_mean)
+    rma = _jit(_py_rma)
+    true_range = _tr = _jit(_py_true_range)
+    window_mean = _wmean = _jit(_py_window_mean)
+    dmi_sma = _jit(_py_dmi_sma)
+else:
+    ewm = ewm_rows = ewm_mean = rma = true_range = window_mean = dmi_sma = None
@@ -0,0 +1,312 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from src.features import jit as J
+
+# Kernel canônico de indicadores em NumPy puro (arrays float64 contíguos, NaN no aquecimento).
+# Convenções (equivalentes ao pandas):
+#   ema      -> ewm(span, adjust=False), semente = primeiro valor válido
+#   sma/std  -> rolling(n, min_periods=n), NaN ignorado na contagem
+#   rma      -> média de Wilder (semente = SMA das n primeiras barras)
+#   atr/adx  -> method="wilder" (padrão) ou "sma" (compatível com ta_v31),
+#               "pta" (pandas_ta 0.3.14b: ewm(alpha=1/n, adjust=True)), "ta" (biblioteca ta 0.11)
+#               e "atr_sum" (adx de src/services/feature_engine.py: DM somado sobre a soma do ATR simples)
+# Com numba instalado, os laços recursivos e TR/ATR/DMI "sma" rodam compilados (src/features/jit.py).
+
+
+def _f64(x) -> np.ndarray:
+    return np.ascontiguousarray(x, dtype=np.float64)
+
+
+def shift(x, k: int = 1) -> np.ndarray:
+    x = _f64(x)
+    out = np.full_like(x, np.nan)
+    if k == 0:
+        return x.copy()
+    if k > 0:
+        out[k:] = x[:-k]
+    else:
+        out[:k] = x[-k:]
+    return out
+
+
+def diff(x, k: int = 1) -> np.ndarray:
+    x = _f64(x)
+    return x - shift(x, k)
+
+
+def pct_change(x, k: int = 1) -> np.ndarray:
+    x = _f64(x)
+    prev = shift(x, k)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return x / prev - 1.0
+
+
+def rolling_sum(x, n: int, min_periods: int | None = None) -> np.ndarray:
+    x = _f64(x)
+    mp = n if min_periods is None else min_periods
+    ok = np.isfinite(x)
+    cs = np.concatenate(([0.0], np.cumsum(np.where(ok, x, 0.0))))
+    cc = np.concatenate(([0], np.cumsum(ok)))
+    idx = np.arange(1, len(x) + 1)
+    lo = np.maximum(idx - n, 0)
+    s = cs[idx] - cs[lo]
+    cnt = cc[idx] - cc[lo]
+    return np.where(cnt >= max(mp, 1), s, np.nan)
+
+
+def sma(x, n: int, min_periods: int | None = None) -> np.ndarray:
+    x = _f64(x)
+    mp = n if min_periods is None else min_periods
+    ok = np.isfinite(x)
+    cnt = rolling_sum(ok.astype(np.float64), n, min_periods=0)
+    s = rolling_sum(x, n, min_periods=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(cnt >= max(mp, 1), s / cnt, np.nan)
+
+
+def rolling_std(x, n: int, ddof: int = 1, min_periods: int | None = None) -> np.ndarray:
+    # janela explícita (estável para preços altos, sem cumsum de quadrados)
+    x = _f64(x)
+    mp = n if min_periods is None else min_periods
+    out = np.full_like(x, np.nan)
+    if len(x) == 0:
+        return out
+    pad = np.concatenate((np.full(n - 1, np.nan), x))
+    w = sliding_window_view(pad, n)
+    cnt = np.isfinite(w).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mu = np.nansum(w, axis=1) / cnt
+        var = np.nansum((w - mu[:, None]) ** 2, axis=1) / (cnt - ddof)
+    ok = (cnt >= max(mp, ddof + 1))
+    out[ok] = np.sqrt(var[ok])
+    return out
+
+
+def ema(x, span: float) -> np.ndarray:
+    return ewm(x, 2.0 / (span + 1.0))
+
+
+def ewm(x, alpha: float) -> np.ndarray:
+    # recursão y[i] = a*x[i] + (1-a)*y[i-1]; NaN mantém o último valor
+    x = _f64(x)
+    if J.ewm is not None:
+        return J.ewm(x, float(alpha))
+    out = np.full_like(x, np.nan)
+    vals = x.tolist()
+    a = float(alpha); b = 1.0 - a
+    y = np.nan
+    for i, v in enumerate(vals):
+        if v == v:
+            y = v if y != y else a * v + b * y
+        out[i] = y
+    return out
+
+
+def ewm_mean(x, alpha: float, min_periods: int = 0) -> np.ndarray:
+    # pandas ewm(alpha, adjust=True, ignore_na=False).mean(): pesos (1-a)^k, NaN só decai os pesos
+    x = _f64(x)
+    if J.ewm_mean is not None:
+        return J.ewm_mean(x, float(alpha), int(min_periods))
+    out = np.full_like(x, np.nan)
+    b = 1.0 - float(alpha)
+    num = den = 0.0; nobs = 0; started = False
+    for i, v in enumerate(x.tolist()):
+        if v == v:
+            num = b * num + v; den = b * den + 1.0; nobs += 1; started = True
+        elif started:
+            num *= b; den *= b
+        if started and nobs >= max(min_periods, 1):
+            out[i] = num / den
+    return out
+
+
+def rma(x, n: int) -> np.ndarray:
+    # Wilder: semente = média das n primeiras barras válidas, depois y = y + (x - y)/n
+    x = _f64(x)
+    if J.rma is not None:
+        return J.rma(x, int(n))
+    out = np.full_like(x, np.nan)
+    valid = np.flatnonzero(np.isfinite(x))
+    if len(valid) < n:
+        return out
+    start = valid[0]
+    seed_end = start + n
+    if not np.isfinite(x[start:seed_end]).all():
+        return out
+    y = float(x[start:seed_end].mean())
+    out[seed_end - 1] = y
+    vals = x[seed_end:].tolist()
+    a = 1.0 / n
+    for i, v in enumerate(vals, start=seed_end):
+        if v == v:
+            y = y + a * (v - y)
+        out[i] = y
+    return out
+
+
+def true_range(high, low, close) -> np.ndarray:
+    if J.true_range is not None:
+        return J.true_range(_f64(high), _f64(low), _f64(close))
+    h = _f64(high); l = _f64(low); pc = shift(close, 1)
+    tr = h - l
+    with np.errstate(invalid="ignore"):
+        tr = np.fmax(tr, np.abs(h - pc))
+        tr = np.fmax(tr, np.abs(l - pc))
+    return tr
+
+
+def atr(high, low, close, n: int = 14, method: str = "wilder") -> np.ndarray:
+    tr = true_range(high, low, close)
+    if method == "sma":
+        return J.window_mean(tr, int(n)) if J.window_mean is not None else sma(tr, n)
+    if method == "pta":
+        tr[0] = np.nan
+        return ewm_mean(tr, 1.0 / n, min_periods=n)
+    if method == "ta":
+        return _ta_atr(tr, n)
+    return rma(tr, n)
+
+
+def _ta_atr(tr, n):
+    # ta.volatility.AverageTrueRange: zeros no aquecimento, semente = média de TR[0:n]
+    out = np.zeros(len(tr))
+    if len(tr) < n:
+        return out
+    y = float(np.mean(tr[:n]))
+    out[n - 1] = y
+    for i, v in enumerate(tr[n:].tolist(), start=n):
+        y = (y * (n - 1) + v) / n
+        out[i] = y
+    return out
+
+
+def _ta_smooth(x, n, m):
+    # somas de Wilder da ta: s[0] = soma das n primeiras válidas, s[i] = s - s/n + x[n+i]; último fica 0
+    out = np.zeros(m)
+    if m == 0:
+        return out
+    out[0] = x[np.isfinite(x)][:n].sum()
+    for i in range(1, m - 1):
+        out[i] = out[i - 1] - out[i - 1] / n + x[n + i]
+    return out
+
+
+def _ta_adx(high, low, close, n):
+    # ta.trend.ADXIndicator(...).adx(), incluindo as particularidades de índice da biblioteca
+    h = _f64(high); l = _f64(low); pc = shift(close, 1)
+    N = len(h); m = N - (n - 1)
+    if m <= n:
+        return np.zeros(N)
+    tr = np.amax([h, pc], axis=0) - np.amin([l, pc], axis=0)
+    up = h - shift(h, 1); dn = shift(l, 1) - l
+    with np.errstate(invalid="ignore"):
+        pos = np.abs(((up > dn) & (up > 0)) * up)
+        neg = np.abs(((dn > up) & (dn > 0)) * dn)
+    trs = _ta_smooth(tr, n, m); dip = _ta_smooth(pos, n, m); din = _ta_smooth(neg, n, m)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pdi = np.where(trs != 0, 100.0 * dip / trs, 0.0)
+        mdi = np.where(trs != 0, 100.0 * din / trs, 0.0)
+        di = np.where(pdi + mdi != 0, 100.0 * np.abs((pdi - mdi) / (pdi + mdi)), 0.0)
+    a = np.zeros(m)
+    a[n] = di[:n].mean()
+    for i in range(n + 1, m):
+        a[i] = (a[i - 1] * (n - 1) + di[i - 1]) / n
+    return np.concatenate((np.zeros(n - 1), a))
+
+
+def directional_movement(high, low):
+    h = _f64(high); l = _f64(low)
+    up = diff(h); dn = -diff(l)
+    with np.errstate(invalid="ignore"):
+        plus = np.where((up > dn) & (up > 0), up, 0.0)
+        minus = np.where((dn > up) & (dn > 0), dn, 0.0)
+    plus[0] = np.nan; minus[0] = np.nan
+    return plus, minus
+
+
+def dmi(high, low, close, n: int = 14, method: str = "wilder"):
+    """Retorna (+DI, -DI, ADX)."""
+    if method == "sma" and J.dmi_sma is not None:
+        return J.dmi_sma(_f64(high), _f64(low), _f64(close), int(n))[1:]
+    plus, minus = directional_movement(high, low)
+    tr = true_range(high, low, close)
+    if method == "sma":
+        # compatível com ta_v31.dx_adx: somas móveis de DM sobre ATR simples
+        a = sma(tr, n)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pdi = 100.0 * rolling_sum(np.nan_to_num(plus), n) / a
+            mdi = 100.0 * rolling_sum(np.nan_to_num(minus), n) / a
+            dx = np.abs(pdi - mdi) / (pdi + mdi) * 100.0
+        dx[~np.isfinite(dx)] = np.nan
+        return pdi, mdi, sma(dx, n)
+    if method == "atr_sum":
+        # services/feature_engine.add_indicators: somas móveis de DM sobre a soma móvel do ATR simples
+        a = sma(tr, n)
+        a[a == 0] = np.nan
+        sa = rolling_sum(a, n)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pdi = 100.0 * rolling_sum(np.nan_to_num(plus), n) / sa
+            mdi = 100.0 * rolling_sum(np.nan_to_num(minus), n) / sa
+            dx = 100.0 * np.abs(pdi - mdi) / (pdi + mdi)
+        dx[~np.isfinite(dx)] = np.nan
+        return pdi, mdi, sma(dx, n)
+    if method == "pta":
+        # pandas_ta.adx: DM (primeira barra NaN) e DX suavizados por rma = ewm(alpha=1/n, adjust=True)
+        plus[0] = minus[0] = np.nan
+        a = atr(high, low, close, n, "pta")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pdi = 100.0 / a * ewm_mean(plus, 1.0 / n, n)
+            mdi = 100.0 / a * ewm_mean(minus, 1.0 / n, n)
+            dx = 100.0 * np.abs(pdi - mdi) / (pdi + mdi)
+        dx[~np.isfinite(dx)] = np.nan
+        return pdi, mdi, ewm_mean(dx, 1.0 / n, n)
+    tr[0] = np.nan
+    str_ = rma(tr, n); sp = rma(plus, n); sm = rma(minus, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pdi = 100.0 * sp / str_
+        mdi = 100.0 * sm / str_
+        dx = 100.0 * np.abs(pdi - mdi) / (pdi + mdi)
+    dx[~np.isfinite(dx) & np.isfinite(pdi)] = 0.0
+    return pdi, mdi, rma(dx, n)
+
+
+def adx(high, low, close, n: int = 14, method: str = "wilder") -> np.ndarray:
+    if method == "ta":
+        return _ta_adx(high, low, close, n)
+    return dmi(high, low, close, n, method)[2]
+
+
+def bbands(close, n: int = 20, k: float = 2.0, ddof: int = 0):
+    """Retorna (média, banda superior, banda inferior)."""
+    mid = sma(close, n)
+    sd = rolling_std(close, n, ddof=ddof)
+    return mid, mid + k * sd, mid - k * sd
+
+
+def bb_width(close, n: int = 20, k: float = 2.0, ddof: int = 0, over: str = "mid") -> np.ndarray:
+    # over="close": largura sobre o close (src/features/engine.py) em vez da média
+    mid, up, lo = bbands(close, n, k, ddof)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (up - lo) / (mid if over == "mid" else _f64(close))
+
+
+def typical_price(high, low, close) -> np.ndarray:
+    return (_f64(high) + _f64(low) + _f64(close)) / 3.0
+
+
+def vwap(price, volume, n: int | None = None, min_periods: int | None = None) -> np.ndarray:
+    # n=None -> VWAP acumulado na janela carregada; n -> VWAP móvel
+    p = _f64(price); v = _f64(volume)
+    if n is None:
+        pv = np.cumsum(np.nan_to_num(p * v)); vv = np.cumsum(np.nan_to_num(v))
+    else:
+        pv = rolling_sum(p * v, n, min_periods); vv = rolling_sum(v, n, min_periods)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(vv > 0, pv / vv, np.nan)
+
+
+def logret_std(close, n: int) -> np.ndarray:
+    c = _f64(close)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lr = np.log(c / shift(c, 1))
+    return rolling_std(lr, n)
@@ -0,0 +1,224 @@
+import os, time
+import numpy as np
+import pandas as pd
+from src.features.spec import DEFAULT_SPECS, resolve, max_warmup
+from src.features.unified import compute
+
+# Features multi-timeframe a partir de um único stream de 1m.
+# - os candles de 1m são reamostrados (buckets alinhados à época UTC, como na Binance) para todos os
+#   timeframes de uma vez; só buckets fechados até o minuto corrente entram no cálculo (o 1m em formação
+#   que os coletores gravam, e as barras maiores que ele fecharia, ficam de fora até fechar);
+# - cada timeframe guarda seu último cálculo e só é recalculado quando fecha uma barra nova, sobre as
+#   últimas `bars` + aquecimento barras dele (como unified.run_once), não sobre todo o buffer de 1m;
+# - aligned() leva features dos timeframes maiores para as linhas do menor sem look-ahead:
+#   uma barra de 1h só aparece nas linhas de 5m que fecham em/depois do fechamento dela.
+#
+# uso: FEATURE_SINKS=jobs python -m src.features.multi_tf --once   (carrega só 1m da fonte)
+
+MINUTE_NS = 60_000_000_000
+FIELDS = ("open", "high", "low", "close", "volume")
+
+
+def tf_minutes(tf: str) -> int:
+    unit = {"m": 1, "h": 60, "d": 1440, "w": 10080}[tf[-1]]
+    return int(tf[:-1]) * unit
+
+
+def resample(ts_ns: np.ndarray, candles: dict, minutes: int, complete_until=None):
+    """OHLCV de 1m -> barras de `minutes`; devolve (open_ts, arrays) só com buckets fechados."""
+    if len(ts_ns) == 0:
+        return ts_ns, {f: np.empty(0) for f in FIELDS}
+    width = minutes * MINUTE_NS
+    bucket = ts_ns // width
+    starts = np.r_[0, np.flatnonzero(np.diff(bucket)) + 1]
+    ends = np.r_[starts[1:], len(ts_ns)] - 1
+    out = {
+        "open": candles["open"][starts],
+        "high": np.maximum.reduceat(candles["high"], starts),
+        "low": np.minimum.reduceat(candles["low"], starts),
+        "close": candles["close"][ends],
+        "volume": np.add.reduceat(candles["volume"], starts),
+    }
+    open_ts = bucket[starts] * width
+    # fechado = fim do bucket <= fechamento do último 1m conhecido
+    last_close = (ts_ns[-1] + MINUTE_NS) if complete_until is None else complete_until
+    done = open_ts + width <= last_close
+    return open_ts[done], {f: v[done] for f, v in out.items()}
+
+
+class MultiTFBuilder:
+    def __init__(self, timeframes=("1m", "5m", "15m", "1h"), names=None, specs=DEFAULT_SPECS, bars: int = 500):
+        self.tfs = sorted(timeframes, key=tf_minutes)
+        self.specs = specs
+        self.names = list(names) if names is not None else [s.name for s in specs]
+        self.warm = max_warmup(resolve(self.names, specs))
+        self.bars = bars
+        # 1m suficientes para `bars` barras + aquecimento no maior timeframe
+        self.keep = (bars + self.warm + 1) * tf_minutes(self.tfs[-1])
+        self.ts = np.empty(0, dtype=np.int64)
+        self.candles = {f: np.empty(0) for f in FIELDS}
+        self.state = {}   # tf -> (open_ts, feats) do último cálculo
+        self.aux = None   # opcional: (tf, open_ts) -> {série auxiliar: array} (src/features/asof.py)
+
+    def update(self, ts_ns, candles: dict, now_ns: int | None = None) -> dict:
+        """Acrescenta 1m (ts crescente; barra igual à última é sobrescrita) e recalcula os
+        timeframes que fecharam barra nova até `now_ns` (padrão: relógio). Devolve {tf: (open_ts novos, feats novas)}."""
+        ts_ns = np.asarray(ts_ns, dtype=np.int64)
+        # fechado = termina até o início do minuto corrente
+        until = (time.time_ns() if now_ns is None else int(now_ns)) // MINUTE_NS * MINUTE_NS
+        if len(self.ts):
+            keep_old = self.ts < ts_ns[0] if len(ts_ns) else np.ones(len(self.ts), dtype=bool)
+            self.ts = np.r_[self.ts[keep_old], ts_ns]
+            self.candles = {f: np.r_[self.candles[f][keep_old], np.asarray(candles[f], dtype=np.float64)]
+                            for f in FIELDS}
+        else:
+            self.ts = ts_ns.copy()
+            self.candles = {f: np.asarray(candles[f], dtype=np.float64).copy() for f in FIELDS}
+        # começa num limite do maior timeframe: nenhum bucket sai truncado no início
+        w = tf_minutes(self.tfs[-1]) * MINUTE_NS
+        lo = max(len(self.ts) - self.keep, 0)
+        if len(self.ts):
+            a = int(np.searchsorted(self.ts, -(-self.ts[lo] // w) * w, side="left"))
+            lo = a if a < len(self.ts) else lo
+        if lo:
+            self.ts = self.ts[lo:]
+            self.candles = {f: v[lo:] for f, v in self.candles.items()}
+
+        fresh = {}
+        for tf in self.tfs:
+            width = tf_minutes(tf) * MINUTE_NS
+            a = 0
+            if len(self.ts):
+                first = (self.ts[-1] // width - (self.bars + self.warm)) * width
+                a = int(np.searchsorted(self.ts, first, side="left"))
+            ts, bars = resample(self.ts[a:], {f: v[a:] for f, v in self.candles.items()}, tf_minutes(tf), until)
+            prev = self.state.get(tf)
+            last = prev[0][-1] if prev is not None and len(prev[0]) else None
+            if len(ts) == 0 or (last is not None and ts[-1] <= last):
+                continue
+            if self.aux is not None:
+                bars.update(self.aux(tf, ts))
+            feats = compute(bars, self.names, self.specs)
+            self.state[tf] = (ts, feats)
+            k = 0 if last is None else int(np.searchsorted(ts, last, side="right"))
+            fresh[tf] = (ts[k:], {n: v[k:] for n, v in feats.items()})
+        return fresh
+
+    def series(self, tf: str):
+        return self.state.get(tf, (np.empty(0, dtype=np.int64), {}))
+
+    def aligned(self, base_tf: str, context=None, names=None) -> pd.DataFrame:
+        """Linhas do `base_tf` com colunas `<feature>_<tf>` dos timeframes maiores (as-of do fechamento)."""
+        ts, feats = self.series(base_tf)
+        names = list(names) if names is not None else self.names
+        df = pd.DataFrame({n: feats[n] for n in names if n in feats}, index=pd.to_datetime(ts, utc=True))
+        df.index.name = "open_time"
+        base_close = ts + tf_minutes(base_tf) * MINUTE_NS
+        for tf in (context if context is not None else [t for t in self.tfs if tf_minutes(t) > tf_minutes(base_tf)]):
+            hts, hf = self.series(tf)
+            if len(hts) == 0:
+                continue
+            h_close = hts + tf_minutes(tf) * MINUTE_NS
+            j = np.searchsorted(h_close, base_close, side="right") - 1
+            ok = j >= 0
+            for n in names:
+                if n not in hf:
+                    continue
+                v = hf[n]
+                col = np.full(len(ts), np.nan) if v.dtype.kind == "f" else np.full(len(ts), None, dtype=object)
+                col[ok] = v[j[ok]]
+                df[f"{n}_{tf}"] = col
+        return df
+
+
+def build_frames(df_1m: pd.DataFrame, timeframes=("1m", "5m", "15m", "1h"), names=None, time_col="open_time"):
+    """Atalho em lote: um DataFrame de 1m -> {tf: DataFrame alinhado com contexto dos maiores}."""
+    b = MultiTFBuilder(timeframes, names, bars=len(df_1m))
+    ts = pd.DatetimeIndex(pd.to_datetime(df_1m[time_col], utc=True)).asi8
+    b.update(ts, {f: pd.to_numeric(df_1m[f], errors="coerce").to_numpy(dtype=np.float64) for f in FIELDS})
+    return {tf: b.aligned(tf) for tf in b.tfs}
+
+
+# ---------- runner: uma leitura de 1m por símbolo, grava todos os timeframes nos sinks ----------
+
+def run_once(sinks, source, symbols, timeframes, lookback: int, dsn: str, sink_dsn: dict | None = None,
+             builders: dict | None = None):
+    from src.features.unified import _connect
+    from src.features.sinks import record_version
+    from src.features.asof import AsofCache, attach_aux
+    names = sorted({f for s in sinks for f in s.features()})
+    builders = builders if builders is not None else {}
+    aux_cache = builders.setdefault("__aux__", AsofCache())
+    src_conn = _connect(dsn)
+    conns = {s.name: _connect((sink_dsn or {}).get(s.name, dsn)) for s in sinks}
+    total = 0
+    try:
+        for s in sinks:
+            with conns[s.name].cursor() as cur:
+                record_version(cur, s)
+        for sym in symbols:
+            t0 = time.perf_counter()
+            b = builders.get(sym)
+            if b is None:
+                b = builders[sym] = MultiTFBuilder(timeframes, names, bars=lookback)
+                limit = b.keep
+            else:
+                limit = tf_minutes(b.tfs[-1]) + 5   # só o fim do stream após a primeira carga
+            with src_conn.cursor() as cur:
+                idx, arrays = source.load(cur, sym, "1m", limit)
+            if len(idx) == 0:
+                print(f"[mtf] sem candles 1m {sym}", flush=True)
+                continue
+            with src_conn.cursor() as aux_cur:
+                b.aux = lambda tf, ts: attach_aux(aux_cur, source, names, sym, tf, ts, {}, aux_cache)
+                fresh = b.update(idx.asi8, arrays)
+            b.aux = None
+            for tf, (ts, feats) in fresh.items():
+                # primeira carga: só as últimas `lookback` barras, como em unified.run_once
+                keep = slice(min(b.warm, max(len(ts) - lookback, 0)), None)
+                for s in sinks:
+                    with conns[s.name].cursor() as cur:
+                        total += s.write(cur, sym, tf, pd.to_datetime(ts[keep], utc=True),
+                                         {k: v[keep] for k, v in feats.items()})
+            print(f"[mtf] {sym}: {len(idx)} barras 1m -> " +
+                  ", ".join(f"{tf}+{len(v[0])}" for tf, v in fresh.items()) +
+                  f" em {(time.perf_counter()-t0)*1000:.1f} ms", flush=True)
+    finally:
+        src_conn.close()
+        for c in conns.values():
+            c.close()
+    return total
+
+
+def main():
+    import argparse
+    from src.features.sinks import LAYOUTS, SOURCES
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--once", action="store_true")
+    ap.add_argument("--sinks", default=os.getenv("FEATURE_SINKS", "jobs"))
+    ap.add_argument("--source", default=os.getenv("FEATURE_SOURCE", "ts"), choices=sorted(SOURCES))
+    ap.add_argument("--lookback", type=int, default=int(os.getenv("FEATURE_LOOKBACK", "500")))
+    ap.add_argument("--poll", type=int, default=int(os.getenv("FEATURE_POLL_SECONDS", "30")))
+    args = ap.parse_args()
+
+    dsn = os.getenv("FEATURE_DSN", "postgresql://localhost/botfutures")
+    sinks = [LAYOUTS[n.strip()] for n in args.sinks.split(",") if n.strip()]
+    sink_dsn = {s.name: os.getenv(f"FEATURE_DSN_{s.name.upper()}") for s in sinks}
+    sink_dsn = {k: v for k, v in sink_dsn.items() if v}
+    symbols = [s.strip() for s in os.getenv("FEATURE_SYMBOLS", "BTCUSDT,ETHUSDT").split(",") if s.strip()]
+    tfs = [t.strip() for t in os.getenv("FEATURE_TIMEFRAMES", "1m,5m,15m,1h").split(",") if t.strip()]
+    builders = {}
+    while True:
+        try:
+            n = run_once(sinks, SOURCES[args.source], symbols, tfs, args.lookback, dsn, sink_dsn, builders)
+            print(f"[mtf] upsert total={n}", flush=True)
+        except Exception as e:
+            print(f"[mtf] LOOP_ERROR {type(e).__name__}: {e}", flush=True)
+            builders.clear()
+        if args.once:
+            break
+        time.sleep(args.poll)
+
+
+if __name__ == "__main__":
+    main()
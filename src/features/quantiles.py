@@ -0,0 +1,168 @@
+import json
+import numpy as np
+
+# Quantis em streaming (P², Jain & Chlamtac 1985) para os regimes de volatilidade.
+# Um estimador por quantil, estado O(1) (5 marcadores), atualizado só com as barras novas
+# (marca d'água last_ts) e persistido em feature_quantile_sketch por símbolo/intervalo.
+# A classificação é vetorizada: np.searchsorted sobre as fronteiras.
+
+REGIME_LABELS = ("low", "mid", "high")
+REGIME_QS = (0.33, 0.66)
+
+SKETCH_DDL = """
+create table if not exists feature_quantile_sketch (
+  symbol text not null,
+  interval text not null,
+  name text not null,
+  state jsonb not null,
+  updated_at timestamptz not null default now(),
+  primary key (symbol, interval, name)
+)
+"""
+
+
+class P2Quantile:
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self.q = []                       # alturas dos marcadores (ou amostras iniciais, até 5)
+        self.n = [0, 1, 2, 3, 4]          # posições reais
+        self.np_ = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]   # posições desejadas
+        self.dn = (0.0, p / 2, p, (1 + p) / 2, 1.0)
+
+    def update(self, x: float):
+        self.count += 1
+        q, n = self.q, self.n
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+        if x < q[0]:
+            q[0] = x; k = 0
+        elif x >= q[4]:
+            q[4] = x; k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np_[i] += self.dn[i]
+        for i in (1, 2, 3):
+            d = self.np_[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self) -> float:
+        if self.count == 0:
+            return np.nan
+        if self.count < 5:
+            return float(np.quantile(self.q, self.p))   # mesmo critério (linear) do pandas
+        return float(self.q[2])
+
+    def to_dict(self):
+        return {"p": self.p, "count": self.count, "q": list(self.q), "n": list(self.n), "np": list(self.np_)}
+
+    @classmethod
+    def from_dict(cls, d):
+        e = cls(d["p"])
+        e.count, e.q, e.n, e.np_ = d["count"], list(d["q"]), list(d["n"]), list(d["np"])
+        return e
+
+
+class QuantileSketch:
+    """Conjunto de estimadores P² para os quantis `qs`, com marca d'água em ns."""
+
+    def __init__(self, qs=REGIME_QS, min_count: int = 3):
+        self.qs = tuple(qs)
+        self.min_count = min_count
+        self.est = [P2Quantile(p) for p in self.qs]
+        self.last_ts = None
+
+    @property
+    def count(self):
+        return self.est[0].count
+
+    def update(self, values, ts=None) -> int:
+        # ingere só valores finitos com ts > last_ts; devolve quantos entraram
+        x = np.asarray(values, dtype=np.float64)
+        keep = np.isfinite(x)
+        if ts is not None:
+            ts = np.asarray(ts, dtype=np.int64)
+            if self.last_ts is not None:
+                keep &= ts > self.last_ts
+            if len(ts):
+                self.last_ts = int(max(ts[-1], self.last_ts if self.last_ts is not None else ts[-1]))
+        for v in x[keep].tolist():
+            for e in self.est:
+                e.update(v)
+        return int(keep.sum())
+
+    def bounds(self) -> np.ndarray:
+        if self.count < self.min_count:
+            return np.full(len(self.qs), np.nan)
+        return np.array([e.value() for e in self.est])
+
+    def classify(self, x, labels=REGIME_LABELS):
+        return regime_labels(x, self.bounds(), labels)
+
+    def to_json(self) -> str:
+        return json.dumps({"qs": self.qs, "min_count": self.min_count, "last_ts": self.last_ts,
+                           "est": [e.to_dict() for e in self.est]})
+
+    @classmethod
+    def from_json(cls, s):
+        d = json.loads(s) if isinstance(s, (str, bytes)) else s
+        sk = cls(d["qs"], d.get("min_count", 3))
+        sk.est = [P2Quantile.from_dict(e) for e in d["est"]]
+        sk.last_ts = d.get("last_ts")
+        return sk
+
+
+def regime_labels(x, bounds, labels=REGIME_LABELS):
+    # x <= b0 -> labels[0]; b0 < x <= b1 -> labels[1]; ... (mesmo corte do apply(regime) legado)
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), None, dtype=object)
+    bounds = np.asarray(bounds, dtype=np.float64)
+    if len(x) == 0 or not np.isfinite(bounds).all():
+        return out
+    ok = np.isfinite(x)
+    out[ok] = np.asarray(labels, dtype=object)[np.searchsorted(bounds, x[ok], side="left")]
+    return out
+
+
+# ---------- persistência ----------
+
+def load_sketch(cur, symbol: str, interval: str, name: str = "atr_pct", qs=REGIME_QS) -> QuantileSketch:
+    cur.execute("select state from feature_quantile_sketch where symbol=%s and interval=%s and name=%s",
+                (symbol, interval, name))
+    row = cur.fetchone()
+    return QuantileSketch.from_json(row[0]) if row else QuantileSketch(qs)
+
+
+def save_sketch(cur, symbol: str, interval: str, sketch: QuantileSketch, name: str = "atr_pct"):
+    cur.execute("""
+        insert into feature_quantile_sketch(symbol, interval, name, state) values (%s, %s, %s, %s::jsonb)
+        on conflict (symbol, interval, name) do update set state=excluded.state, updated_at=now()
+    """, (symbol, interval, name, sketch.to_json()))
+
+
+async def load_sketch_async(con, symbol: str, interval: str, name: str = "atr_pct", qs=REGIME_QS) -> QuantileSketch:
+    state = await con.fetchval("select state::text from feature_quantile_sketch "
+                               "where symbol=$1 and interval=$2 and name=$3", symbol, interval, name)
+    return QuantileSketch.from_json(state) if state else QuantileSketch(qs)
+
+
+async def save_sketch_async(con, symbol: str, interval: str, sketch: QuantileSketch, name: str = "atr_pct"):
+    await con.execute("""
+        insert into feature_quantile_sketch(symbol, interval, name, state) values ($1, $2, $3, $4::jsonb)
+        on conflict (symbol, interval, name) do update set state=excluded.state, updated_at=now()
+    """, symbol, interval, name, sketch.to_json())
@@ -0,0 +1,291 @@
+import os, queue, time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from src.features.spec import AUX_INPUTS, CANONICAL_SPECS, resolve, max_warmup
+from src.features.unified import compute, _connect
+
+# Scheduler multiprocesso do feature engine unificado.
+# - pares (símbolo, timeframe) são fatiados em shards fixos, um processo persistente por shard;
+# - o processo pai carrega candles e escreve em buffers de memória compartilhada (um por par),
+#   que os workers leem sem cópia;
+# - cada shard guarda estado incremental por par (último ts gravado) e só grava barras novas;
+# - cada ciclo devolve latência de cálculo/gravação por shard; erro num par (cálculo ou sink) vai para a
+#   coluna `error` das estatísticas e o par é refeito no próximo ciclo, sem derrubar o worker;
+# - worker que morre (ou não responde até `timeout`) faz cycle() levantar erro em vez de esperar para sempre.
+#
+# uso: FEATURE_SINKS=jobs FEATURE_DSN=... python -m src.features.scheduler --workers 4
+#      python -m src.features.scheduler --workers 4 --synthetic 20 --cycles 3   (sem banco)
+
+FIELDS = ("open", "high", "low", "close", "volume") + AUX_INPUTS   # auxiliares ausentes = NaN
+
+
+class SharedCandles:
+    """Buffer fixo em shared memory: header int64[2] (n, seq) + ts int64[cap] + float64[len(FIELDS), cap]."""
+
+    def __init__(self, capacity: int, name: str | None = None):
+        size = 16 + 8 * capacity + 8 * len(FIELDS) * capacity
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.capacity = capacity
+        buf = self.shm.buf
+        self.header = np.ndarray((2,), dtype=np.int64, buffer=buf, offset=0)
+        self.ts = np.ndarray((capacity,), dtype=np.int64, buffer=buf, offset=16)
+        self.data = np.ndarray((len(FIELDS), capacity), dtype=np.float64, buffer=buf, offset=16 + 8 * capacity)
+        if self.owner:
+            self.header[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, ts_ns: np.ndarray, arrays: dict):
+        n = min(len(ts_ns), self.capacity)
+        self.ts[:n] = ts_ns[-n:]
+        for i, f in enumerate(FIELDS):
+            self.data[i, :n] = arrays[f][-n:] if f in arrays else np.nan
+        self.header[0] = n
+        self.header[1] += 1
+
+    def read(self):
+        n = int(self.header[0])
+        return self.ts[:n], {f: self.data[i, :n] for i, f in enumerate(FIELDS)}, int(self.header[1])
+
+    def close(self):
+        # solta as views antes de fechar o mmap
+        del self.header, self.ts, self.data
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def plan_shards(pairs, workers: int, cost: dict | None = None):
+    # guloso: maior custo primeiro para o shard menos carregado (custo = barras ou latência medida)
+    cost = cost or {}
+    shards = [[] for _ in range(max(1, workers))]
+    load = [0.0] * len(shards)
+    for p in sorted(pairs, key=lambda p: -cost.get(p, 1.0)):
+        i = int(np.argmin(load))
+        shards[i].append(p)
+        load[i] += cost.get(p, 1.0)
+    return [s for s in shards if s]
+
+
+def _worker(shard_id, pairs, shm_names, capacity, sink_names, dsn, sink_dsn, lookback, inq, outq):
+    from src.features.sinks import LAYOUTS, record_version
+    bufs = {p: SharedCandles(capacity, name=shm_names[p]) for p in pairs}
+    sinks = [LAYOUTS[n] for n in sink_names]
+    # sem sinks (--synthetic): só as specs canônicas
+    names = sorted({f for s in sinks for f in s.features()}) if sinks else [s.name for s in CANONICAL_SPECS]
+    warm = max_warmup(resolve(names))
+    conns = {s.name: _connect(sink_dsn.get(s.name, dsn)) for s in sinks}
+    for s in sinks:
+        with conns[s.name].cursor() as cur:
+            record_version(cur, s)
+    state = {}  # par -> (seq visto, último ts gravado em ns)
+    try:
+        while True:
+            msg = inq.get()
+            if msg is None:
+                break
+            stats = []
+            for p in pairs:
+                ts, arrays, seq = bufs[p].read()
+                last_seq, last_ts = state.get(p, (-1, None))
+                if seq == last_seq or len(ts) == 0 or (last_ts is not None and ts[-1] <= last_ts):
+                    stats.append({"shard": shard_id, "pair": p, "compute_ms": 0.0, "write_ms": 0.0, "rows": 0})
+                    state[p] = (seq, last_ts)
+                    continue
+                t0 = t1 = time.perf_counter()
+                try:
+                    feats = compute(arrays, names)
+                    t1 = time.perf_counter()
+                    # incremental: só barras após o último ts gravado por este shard (e fora do aquecimento)
+                    start = min(warm, max(len(ts) - lookback, 0))
+                    if last_ts is not None:
+                        start = max(start, int(np.searchsorted(ts, last_ts, side="right")))
+                    rows = 0
+                    if sinks and start < len(ts):
+                        idx = pd.to_datetime(ts[start:], utc=True)
+                        sub = {k: v[start:] for k, v in feats.items()}
+                        for s in sinks:
+                            with conns[s.name].cursor() as cur:
+                                rows += s.write(cur, p[0], p[1], idx, sub)
+                    else:
+                        rows = max(len(ts) - start, 0)
+                except Exception as e:
+                    # estado não avança: o par é refeito no próximo ciclo
+                    t2 = time.perf_counter()
+                    t1 = t1 if t1 > t0 else t2   # falhou no cálculo: tempo todo vai para compute_ms
+                    stats.append({"shard": shard_id, "pair": p, "compute_ms": (t1 - t0) * 1000,
+                                  "write_ms": (t2 - t1) * 1000, "rows": 0, "error": f"{type(e).__name__}: {e}"})
+                    continue
+                t2 = time.perf_counter()
+                state[p] = (seq, int(ts[-1]))
+                stats.append({"shard": shard_id, "pair": p, "compute_ms": (t1 - t0) * 1000,
+                              "write_ms": (t2 - t1) * 1000, "rows": rows})
+            outq.put((msg, shard_id, stats))
+    finally:
+        for c in conns.values():
+            c.close()
+        for b in bufs.values():
+            b.close()
+
+
+class FeatureScheduler:
+    def __init__(self, pairs, workers: int, lookback: int, sink_names=(), dsn: str = "", sink_dsn=None,
+                 timeout: float | None = None):
+        self.pairs = list(pairs)
+        self.lookback = lookback
+        self.timeout = timeout   # segundos por ciclo; None = espera enquanto os workers estiverem vivos
+        self.seq = 0
+        features = sorted({f for n in sink_names for f in _layout(n).features()})
+        self.capacity = lookback + max_warmup(resolve(features) if features else CANONICAL_SPECS)
+        self.bufs = {p: SharedCandles(self.capacity) for p in self.pairs}
+        self.shards = plan_shards(self.pairs, workers)
+        ctx = mp.get_context("spawn")
+        self.outq = ctx.Queue()
+        self.procs, self.inqs = [], []
+        for i, shard in enumerate(self.shards):
+            q = ctx.Queue()
+            pr = ctx.Process(target=_worker, daemon=True,
+                             args=(i, shard, {p: self.bufs[p].name for p in shard}, self.capacity,
+                                   list(sink_names), dsn, dict(sink_dsn or {}), lookback, q, self.outq))
+            pr.start()
+            self.procs.append(pr); self.inqs.append(q)
+
+    def publish(self, pair, ts_ns: np.ndarray, arrays: dict):
+        self.bufs[pair].write(ts_ns, arrays)
+
+    def cycle(self) -> pd.DataFrame:
+        self.seq += 1
+        for q in self.inqs:
+            q.put(self.seq)
+        stats, done = [], set()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while len(done) < len(self.inqs):
+            try:
+                seq, shard, rows = self.outq.get(timeout=1.0)
+            except queue.Empty:
+                dead = [i for i, pr in enumerate(self.procs) if i not in done and not pr.is_alive()]
+                if dead:
+                    raise RuntimeError(f"workers dos shards {dead} morreram "
+                                       f"(exitcode {[self.procs[i].exitcode for i in dead]})")
+                if deadline is not None and time.monotonic() > deadline:
+                    late = [i for i in range(len(self.inqs)) if i not in done]
+                    raise TimeoutError(f"shards {late} sem resposta em {self.timeout:.0f} s")
+                continue
+            if seq != self.seq:   # resposta atrasada de um ciclo que já estourou
+                continue
+            done.add(shard)
+            stats.extend(rows)
+        return pd.DataFrame(stats)
+
+    def close(self):
+        for q in self.inqs:
+            q.put(None)
+        for pr in self.procs:
+            pr.join(timeout=10)
+        for b in self.bufs.values():
+            b.close()
+
+
+def _layout(name):
+    from src.features.sinks import LAYOUTS
+    return LAYOUTS[name]
+
+
+def shard_report(stats: pd.DataFrame) -> pd.DataFrame:
+    if stats.empty:
+        return stats
+    g = stats.groupby("shard")
+    return pd.DataFrame({
+        "pairs": g.size(),
+        "compute_ms": g["compute_ms"].sum().round(1),
+        "write_ms": g["write_ms"].sum().round(1),
+        "max_pair_ms": (stats["compute_ms"] + stats["write_ms"]).groupby(stats["shard"]).max().round(1),
+        "rows": g["rows"].sum(),
+        "errors": stats["error"].notna().groupby(stats["shard"]).sum() if "error" in stats else 0,
+    })
+
+
+def _synthetic(n: int, seed: int):
+    rng = np.random.default_rng(seed)
+    c = 100 + np.cumsum(rng.normal(0, 0.1, n))
+    h = c + rng.random(n) * 0.2; l = c - rng.random(n) * 0.2
+    ts = (pd.Timestamp("2025-01-01", tz="UTC").value + np.arange(n, dtype=np.int64) * 60_000_000_000)
+    return ts, {"open": c, "high": h, "low": l, "close": c, "volume": rng.gamma(2.0, 10.0, n)}
+
+
+def main():
+    import argparse
+    from src.features.sinks import SOURCES, LAYOUTS
+    from src.features.asof import AsofCache, attach_aux
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=int(os.getenv("FEATURE_WORKERS", str(os.cpu_count() or 2))))
+    ap.add_argument("--sinks", default=os.getenv("FEATURE_SINKS", "jobs"))
+    ap.add_argument("--source", default=os.getenv("FEATURE_SOURCE", "ts"), choices=sorted(SOURCES))
+    ap.add_argument("--lookback", type=int, default=int(os.getenv("FEATURE_LOOKBACK", "500")))
+    ap.add_argument("--poll", type=int, default=int(os.getenv("FEATURE_POLL_SECONDS", "30")))
+    ap.add_argument("--cycles", type=int, default=0, help="0 = loop infinito")
+    ap.add_argument("--timeout", type=float, default=float(os.getenv("FEATURE_CYCLE_TIMEOUT", "0")) or None,
+                    help="segundos por ciclo antes de desistir dos shards (padrão: sem limite)")
+    ap.add_argument("--synthetic", type=int, default=0, help="N símbolos sintéticos, sem banco")
+    args = ap.parse_args()
+
+    tfs = [t.strip() for t in os.getenv("FEATURE_TIMEFRAMES", "1m,5m,15m").split(",") if t.strip()]
+    if args.synthetic:
+        symbols = [f"SYN{i}USDT" for i in range(args.synthetic)]
+        sink_names, dsn = [], ""
+    else:
+        symbols = [s.strip() for s in os.getenv("FEATURE_SYMBOLS", "BTCUSDT,ETHUSDT").split(",") if s.strip()]
+        sink_names = [n.strip() for n in args.sinks.split(",") if n.strip()]
+        dsn = os.getenv("FEATURE_DSN", "postgresql://localhost/botfutures")
+    sink_dsn = {n: os.getenv(f"FEATURE_DSN_{n.upper()}") for n in sink_names}
+    pairs = [(s, tf) for s in symbols for tf in tfs]
+    sched = FeatureScheduler(pairs, args.workers, args.lookback, sink_names, dsn,
+                             {k: v for k, v in sink_dsn.items() if v}, timeout=args.timeout)
+    print(f"[scheduler] {len(pairs)} pares em {len(sched.shards)} shards, buffer={sched.capacity} barras", flush=True)
+    src_conn = None if args.synthetic else _connect(dsn)
+    names = sorted({f for n in sink_names for f in LAYOUTS[n].features()})
+    aux_cache = AsofCache()
+    cycle = 0
+    try:
+        while True:
+            t0 = time.perf_counter()
+            for i, p in enumerate(pairs):
+                if args.synthetic:
+                    ts, arrays = _synthetic(sched.capacity + cycle, seed=i)
+                else:
+                    with src_conn.cursor() as cur:
+                        idx, arrays = SOURCES[args.source].load(cur, p[0], p[1], sched.capacity)
+                        if len(idx) == 0:
+                            continue
+                        ts = idx.asi8
+                        arrays = attach_aux(cur, SOURCES[args.source], names, p[0], p[1], ts, arrays, aux_cache)
+                sched.publish(p, ts, arrays)
+            t_load = time.perf_counter() - t0
+            stats = sched.cycle()
+            wall = time.perf_counter() - t0
+            print(f"[scheduler] ciclo {cycle}: load={t_load*1000:.0f} ms total={wall*1000:.0f} ms", flush=True)
+            print(shard_report(stats).to_string(), flush=True)
+            if "error" in stats:
+                for r in stats[stats["error"].notna()].itertuples():
+                    print(f"[scheduler] ERRO {r.pair[0]} {r.pair[1]}: {r.error}", flush=True)
+            cycle += 1
+            if args.cycles and cycle >= args.cycles:
+                break
+            time.sleep(0 if args.synthetic else args.poll)
+    finally:
+        sched.close()
+        if src_conn is not None:
+            src_conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import json, os, time
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+import pandas as pd
+
+# Ring buffers de features em shared memory, um por (símbolo, timeframe, versão das specs).
+# Um processo escreve (publicador / feature engine); shadow, executor e painel mapeiam por nome
+# e leem as últimas N barras sem copiar.
+#
+# Layout fixo: header de 4096 bytes (seq, n, capacity, versão, dtype em JSON) + 2*capacity
+# registros de um dtype estruturado (ts int64 ns + uma coluna por feature). Cada linha é gravada
+# duas vezes (pos e pos+capacity), então as últimas k linhas são sempre uma fatia contígua.
+#
+# Seqlock: o escritor incrementa seq antes (ímpar = escrevendo) e depois (par) de cada lote;
+# o leitor copia/usa a fatia e confere se seq não mudou.
+#
+# publicador: python -m src.features.shm_ring --symbol BTCUSDT --timeframe 5m   (config/settings_v31.yml)
+
+HEADER_BYTES = 4096
+HEADER = np.dtype([("seq", "<u8"), ("n", "<i8"), ("capacity", "<i8"), ("version", "S16"), ("dtype", "S3072")])
+TEXT = "S16"
+
+
+def ring_name(symbol: str, tf: str, version: str) -> str:
+    return f"bf_{symbol}_{tf}_{version}".lower()
+
+
+def record_dtype(columns: dict) -> np.dtype:
+    # columns: nome -> dtype numpy (float -> f8, datetime -> i8 ns, resto -> texto curto)
+    fields = [("ts", "<i8")]
+    for c, dt in columns.items():
+        dt = np.dtype(dt)
+        fields.append((c, "<f8" if dt.kind in "fiub" else "<i8" if dt.kind == "M" else TEXT))
+    return np.dtype(fields)
+
+
+def _untrack(shm):
+    # leitores não são donos do segmento: evita o resource_tracker remover o shm ao sair
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+class ShmFeatureRing:
+    def __init__(self, shm, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((), dtype=HEADER, buffer=shm.buf, offset=0)
+        self.dtype = np.dtype([tuple(f) for f in json.loads(self.header["dtype"].item().decode())])
+        self.capacity = int(self.header["capacity"])
+        self.version = self.header["version"].item().decode()
+        self.data = np.ndarray((2 * self.capacity,), dtype=self.dtype, buffer=shm.buf, offset=HEADER_BYTES)
+        if not owner:
+            self.data.flags.writeable = False
+
+    @classmethod
+    def create(cls, symbol: str, tf: str, version: str, dtype: np.dtype, capacity: int = 2000):
+        name = ring_name(symbol, tf, version)
+        size = HEADER_BYTES + 2 * capacity * dtype.itemsize
+        try:
+            old = shared_memory.SharedMemory(name=name)
+            old.close(); old.unlink()   # sobra de um publicador anterior
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        h = np.ndarray((), dtype=HEADER, buffer=shm.buf, offset=0)
+        h["seq"] = 0; h["n"] = 0; h["capacity"] = capacity
+        h["version"] = version.encode()
+        h["dtype"] = json.dumps([list(f) for f in dtype.descr]).encode()
+        del h
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, symbol: str, tf: str, version: str):
+        shm = shared_memory.SharedMemory(name=ring_name(symbol, tf, version))
+        _untrack(shm)
+        ring = cls(shm, owner=False)
+        if ring.version != version:
+            ring.close()
+            raise ValueError(f"ring {shm.name} com versão {ring.version}, esperada {version}")
+        return ring
+
+    # ---------- escrita (só o dono) ----------
+
+    @property
+    def last_ts(self):
+        n = int(self.header["n"])
+        return int(self.data[(n - 1) % self.capacity]["ts"]) if n else None
+
+    def write(self, ts_ns, columns: dict) -> int:
+        """Acrescenta barras (ts crescente); ts igual ao último sobrescreve a barra em formação."""
+        ts_ns = np.asarray(ts_ns, dtype=np.int64)
+        last = self.last_ts
+        k = 0 if last is None else int(np.searchsorted(ts_ns, last, side="left"))
+        ts_ns = ts_ns[k:][-self.capacity:]
+        m = len(ts_ns)
+        if m == 0:
+            return 0
+        rows = np.zeros(m, dtype=self.dtype)
+        rows["ts"] = ts_ns
+        for c in self.dtype.names[1:]:
+            v = np.asarray(columns[c])[k:][-m:]
+            if self.dtype[c].kind == "S":
+                rows[c] = [b"" if x is None or x != x else str(x).encode() for x in v]
+            elif v.dtype.kind == "M":
+                rows[c] = v.astype("datetime64[ns]").astype(np.int64)
+            else:
+                rows[c] = v
+        h = self.header
+        h["seq"] = int(h["seq"]) + 1                    # ímpar: escrita em andamento
+        n = int(h["n"]) - (1 if last is not None and ts_ns[0] == last else 0)
+        pos = (n + np.arange(m)) % self.capacity
+        self.data[pos] = rows
+        self.data[pos + self.capacity] = rows
+        h["n"] = n + m
+        h["seq"] = int(h["seq"]) + 1                    # par: consistente
+        return m
+
+    # ---------- leitura ----------
+
+    def view(self, k: int):
+        """Fatia sem cópia com as últimas k barras + seq lido; confira com stable(seq) após usar."""
+        while True:
+            seq = int(self.header["seq"])
+            if not seq & 1:
+                break
+            time.sleep(0)
+        n = int(self.header["n"])
+        k = min(k, n, self.capacity)
+        end = n % self.capacity + self.capacity
+        return self.data[end - k:end], seq
+
+    def stable(self, seq: int) -> bool:
+        return int(self.header["seq"]) == seq
+
+    def snapshot(self, k: int, retries: int = 1000) -> np.ndarray:
+        for _ in range(retries):
+            v, seq = self.view(k)
+            out = v.copy()
+            if self.stable(seq):
+                return out
+        raise TimeoutError(f"ring {self.shm.name}: escritor não liberou o seqlock")
+
+    def frame(self, k: int, time_col: str = "open_time", datetime_cols=("close_time",)) -> pd.DataFrame:
+        rows = self.snapshot(k)
+        df = pd.DataFrame({time_col: pd.to_datetime(rows["ts"], utc=True)})
+        for c in self.dtype.names[1:]:
+            if self.dtype[c].kind == "S":
+                df[c] = [x.decode() or None for x in rows[c]]
+            elif c in datetime_cols:
+                df[c] = pd.to_datetime(rows[c], utc=True)
+            else:
+                df[c] = rows[c]
+        return df
+
+    def close(self):
+        del self.header, self.data
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def attach_or_none(symbol: str, tf: str, version: str):
+    try:
+        return ShmFeatureRing.attach(symbol, tf, version)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def attach_fresh(symbol: str, tf: str, version: str, last_open, log=print):
+    """Ring do publicador só se já tiver a barra `last_open` (open_time do último candle buscado);
+    publicador parado ou atrasado -> None (o chamador calcula localmente)."""
+    ring = attach_or_none(symbol, tf, version)
+    if ring is None:
+        return None
+    want = pd.Timestamp(last_open).value
+    have = ring.last_ts
+    if have is None or have < want:
+        ring.close()
+        if log is not None:
+            got = "vazio" if have is None else pd.Timestamp(have, tz="UTC").isoformat()
+            log(f"[shm] ring {symbol} {tf} atrasado ({got} < {pd.Timestamp(want, tz='UTC').isoformat()}): cálculo local")
+        return None
+    return ring
+
+
+def list_rings(symbol: str, tf: str, shm_dir: str = "/dev/shm"):
+    # versões publicadas para a série (Linux: segmentos POSIX ficam em /dev/shm)
+    prefix = ring_name(symbol, tf, "")
+    try:
+        return sorted(f[len(prefix):] for f in os.listdir(shm_dir) if f.startswith(prefix))
+    except FileNotFoundError:
+        return []
+
+
+def main():
+    import argparse, yaml
+    from src.features.spec import strategy_specs
+    from src.features.store import FeatureStore
+    from src.scripts.run_shadow_v33 import fetch_klines
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--symbol", default=None)
+    ap.add_argument("--timeframe", default=None)
+    ap.add_argument("--capacity", type=int, default=int(os.getenv("FEATURE_SHM_CAPACITY", "2000")))
+    args = ap.parse_args()
+
+    cfg = yaml.safe_load(open("config/settings_v31.yml"))
+    rt = cfg.get("runtime", {}); inds = cfg["indicators"]
+    sym = (args.symbol or rt.get("symbol", "BTCUSDT")).upper()
+    tf = (args.timeframe or rt.get("timeframe", "5m")).lower()
+    poll = int(rt.get("poll_interval_sec", 10))
+    testnet = bool(cfg.get("binance", {}).get("testnet", True))
+    store = FeatureStore(strategy_specs(inds["ema_fast"], inds["ema_slow"], inds["atr_period"],
+                                        inds["adx_period"], inds.get("vwap_window", 20)),
+                         capacity=args.capacity, publish=True)
+    print(f"[shm] publicando {ring_name(sym, tf, store.version)} capacity={args.capacity}", flush=True)
+    try:
+        limit = min(args.capacity, 1500)
+        while True:
+            try:
+                n = store.refresh_from_candles(sym, tf, fetch_klines(sym, tf, limit, testnet))
+                print(f"[shm] {sym} {tf}: +{n} barras", flush=True)
+                limit = 200
+            except Exception as e:
+                print("[shm][erro]", repr(e), flush=True)
+            time.sleep(poll)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from src.features.copy_writer import copy_upsert
+from src.features.spec import DEFAULT_SPECS, resolve, spec_hash
+
+# Layouts das tabelas `features` existentes, mapeando colunas -> features (src/features/spec.py): canônicas
+# quando a coluna legada tem a mesma definição, senão a variante feature@layout com a semântica do engine antigo.
+# Cada coluna = (coluna_da_tabela, feature, pgtype, escala). Colunas não mapeadas não são tocadas no upsert.
+
+@dataclass(frozen=True)
+class Layout:
+    name: str
+    table: str
+    time_col: str
+    tf_col: str
+    columns: tuple
+    touch: tuple = ()   # (coluna, expressão) aplicadas só no UPDATE, ex. updated_at=now()
+
+    @property
+    def key(self):
+        return ("symbol", self.tf_col, self.time_col)
+
+    @property
+    def spec(self):
+        return [("symbol", "text"), (self.tf_col, "text"), (self.time_col, "timestamptz")] + \
+               [(col, pgtype) for col, _, pgtype, _ in self.columns]
+
+    def features(self):
+        return [f for _, f, _, _ in self.columns]
+
+    def frame(self, symbol: str, tf: str, ts, feats: dict) -> pd.DataFrame:
+        data = {"symbol": symbol, self.tf_col: tf, self.time_col: ts}
+        for col, f, pgtype, scale in self.columns:
+            v = feats[f]
+            data[col] = v * scale if (pgtype == "float8" and scale != 1.0) else v
+        return pd.DataFrame(data)
+
+    def write(self, cur, symbol: str, tf: str, ts, feats: dict) -> int:
+        return copy_upsert(cur, self.table, self.frame(symbol, tf, ts, feats), self.spec, self.key,
+                           touch=dict(self.touch) or None)
+
+    def version(self, specs=DEFAULT_SPECS) -> str:
+        return spec_hash(resolve(self.features(), specs))
+
+    def read(self, cur, symbol: str, tf: str, since=None, limit: int = 5000):
+        """Barras gravadas após `since` (ns), em ordem; colunas voltam para a unidade canônica."""
+        cols = ", ".join(f"{c}::float8" if t == "float8" else c for c, _, t, _ in self.columns)
+        where = f"symbol=%s and {self.tf_col}=%s" + (f" and {self.time_col} > %s" if since is not None else "")
+        args = (symbol, tf) + ((pd.Timestamp(since, tz="UTC").to_pydatetime(),) if since is not None else ())
+        cur.execute(f"select {self.time_col}, {cols} from {self.table} where {where} "
+                    f"order by {self.time_col} desc limit %s", args + (limit,))
+        rows = cur.fetchall()
+        rows.reverse()
+        ts = pd.DatetimeIndex(pd.to_datetime([r[0] for r in rows], utc=True)).asi8
+        feats = {}
+        for j, (col, f, pgtype, scale) in enumerate(self.columns, start=1):
+            v = [r[j] for r in rows]
+            if pgtype == "float8":
+                a = np.array([np.nan if x is None else x for x in v], dtype=np.float64)
+                feats[f] = a / scale if scale != 1.0 else a
+            else:
+                feats[f] = np.array(v, dtype=object)
+        return ts, feats
+
+
+def _c(col, feature=None, pgtype="float8", scale=1.0):
+    return (col, feature or col, pgtype, scale)
+
+
+LAYOUTS = {
+    # src/sql/schema.sql (engine asyncpg em src/features/engine.py)
+    "md": Layout("md", "features", "ts", "interval", (
+        _c("ema20_slope"), _c("ema50_slope"), _c("vwap_slope", "vwap_slope@md"), _c("adx14", "adx14@md"),
+        _c("atr_pct", "atr_pct@md"), _c("bb_width", "bb_width@md"),
+        _c("vol_regime", "vol_regime@md", pgtype="text"),
+        _c("z_ema20_slope", "z_ema20_slope@md"), _c("z_ema50_slope", "z_ema50_slope@md"),
+        _c("z_vwap_slope", "z_vwap_slope@md"), _c("z_adx14", "z_adx14@md"), _c("z_atr_pct", "z_atr_pct@md"),
+        _c("z_bb_width", "z_bb_width@md"),
+    )),
+    # datahub/sql/001_schema.sql (datahub/src/features/engine.py): atrp e bb_width em fração
+    "datahub": Layout("datahub", "features", "open_time", "interval", (
+        _c("ema_slope_20", "ema20_diff1"), _c("vwap_slope", "vwap_diff1@datahub"), _c("adx_14", "adx14@datahub"),
+        _c("atrp_14", "atr_pct@datahub", scale=0.01), _c("bb_width_20", "bb_width", scale=0.01),
+        _c("vol_regime", "vol_regime@datahub", pgtype="text"),
+        _c("z_ema_slope_20", "z_ema20_diff1@datahub"), _c("z_vwap_slope", "z_vwap_diff1@datahub"),
+        _c("z_adx_14", "z_adx14@datahub"), _c("z_atrp_14", "z_atr_pct@datahub"),
+        _c("z_bb_width_20", "z_bb_width@datahub"),
+    )),
+    # src/feature_engine/feature_engine_v1.py
+    "fe_v1": Layout("fe_v1", "features", "ts", "timeframe", (
+        _c("ema20_slope", "ema20_slope3"), _c("ema50_slope", "ema50_slope3"), _c("vwap_slope", "vwap_slope3@fe_v1"),
+        _c("adx14", "adx14@fe_v1"), _c("atrp14", "atr_pct@fe_v1"), _c("bb_width"),
+        _c("z_ema20_slope", "z_ema20_slope3@fe_v1"), _c("z_ema50_slope", "z_ema50_slope3@fe_v1"),
+        _c("z_vwap_slope", "z_vwap_slope3@fe_v1"), _c("z_adx14", "z_adx14@fe_v1"),
+        _c("z_atrp14", "z_atr_pct@fe_v1"), _c("z_bb_width", "z_bb_width@fe_v1"),
+        _c("oi_5m"), _c("spread_pct"), _c("z_oi_5m"), _c("z_spread_pct"),
+    )),
+    # src/jobs/feature_engine_v1.py
+    "jobs": Layout("jobs", "public.features", "ts", "timeframe", (
+        _c("ema_slope_20", "ema20_diff20"), _c("vwap_slope_20", "vwap_diff20@jobs"), _c("adx_14", "adx14@jobs"),
+        _c("atr_14", "atr14@jobs"), _c("std_20", "std20@jobs"), _c("regime", "sign_regime", "text"),
+    )),
+    # src/services/feature_engine.py
+    "services": Layout("services", "features", "ts", "timeframe", (
+        _c("ema_fast", "ema20"), _c("ema_slow", "ema50"), _c("vwap", "vwap@services"), _c("adx", "adx14@services"),
+        _c("atr", "atr14@services"), _c("vol_logret", "vol_logret20"), _c("slope_ema_fast", "ema20_roc10"),
+        _c("slope_vwap", "vwap_roc10@services"), _c("regime", "trend_regime@services", "text"),
+    ), touch=(("updated_at", "now()"),)),
+}
+
+
+# versão (spec_hash) com que cada sink foi gravado pela última vez; lida pelo feature store
+VERSION_DDL = """
+create table if not exists feature_spec_version (
+  sink text primary key,
+  spec_hash text not null,
+  updated_at timestamptz not null default now()
+)
+"""
+
+
+def record_version(cur, layout: Layout):
+    cur.execute(VERSION_DDL)
+    cur.execute("insert into feature_spec_version(sink, spec_hash) values (%s, %s) "
+                "on conflict (sink) do update set spec_hash=excluded.spec_hash, updated_at=now()",
+                (layout.name, layout.version()))
+
+
+def read_version(cur, sink: str):
+    cur.execute("select to_regclass('feature_spec_version') is not null")
+    if not cur.fetchone()[0]:
+        return None
+    cur.execute("select spec_hash from feature_spec_version where sink=%s", (sink,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+@dataclass(frozen=True)
+class CandleSource:
+    table: str
+    time_col: str
+    tf_col: str
+    aux: str = "ts"   # família das séries auxiliares (src/features/asof.py)
+
+    def query(self) -> str:
+        return (f"select {self.time_col}, open::float8, high::float8, low::float8, close::float8, volume::float8 "
+                f"from {self.table} where symbol=%s and {self.tf_col}=%s "
+                f"order by {self.time_col} desc limit %s")
+
+    def load(self, cur, symbol: str, tf: str, limit: int):
+        cur.execute(self.query(), (symbol, tf, limit))
+        rows = cur.fetchall()
+        rows.reverse()
+        return self._arrays(rows)
+
+    def load_range(self, cur, symbol: str, tf: str, start, end, pad: int = 0):
+        """Candles em [start, end) + `pad` barras anteriores a start (aquecimento)."""
+        cols = f"{self.time_col}, open::float8, high::float8, low::float8, close::float8, volume::float8"
+        where = f"symbol=%s and {self.tf_col}=%s"
+        cur.execute(f"(select {cols} from {self.table} where {where} and {self.time_col} < %s "
+                    f"order by {self.time_col} desc limit %s) union all "
+                    f"(select {cols} from {self.table} where {where} and {self.time_col} >= %s "
+                    f"and {self.time_col} < %s) order by 1",
+                    (symbol, tf, start, pad, symbol, tf, start, end))
+        return self._arrays(cur.fetchall())
+
+    @staticmethod
+    def _arrays(rows):
+        if not rows:
+            return pd.DatetimeIndex([], tz="UTC"), {}
+        ts, o, h, l, c, v = zip(*rows)
+        arrays = {k: np.array(a, dtype=np.float64) for k, a in
+                  zip(("open", "high", "low", "close", "volume"), (o, h, l, c, v))}
+        return pd.DatetimeIndex(pd.to_datetime(list(ts), utc=True)), arrays
+
+
+SOURCES = {
+    "md": CandleSource("md_candles", "open_time", "interval", aux="md"),
+    "datahub": CandleSource("candles", "open_time", "interval", aux="datahub"),
+    "ts": CandleSource("candles", "ts", "timeframe", aux="ts"),
+}
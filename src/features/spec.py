@@ -0,0 +1,178 @@
+import hashlib, json
+from dataclasses import dataclass, field, replace
+
+# Spec declarativa de features: cada feature = kernel + entradas + parâmetros + aquecimento.
+# Entradas podem ser colunas de candles (open/high/low/close/volume) ou outras features já declaradas,
+# então cada indicador base (EMA, ATR, ADX, BB, VWAP) é calculado uma vez e reaproveitado pelos derivados.
+#
+# warmup = barras necessárias antes do valor ficar estável (janelas: n; recursivos: ~4-5x o período).
+# cumulative = depende da janela carregada inteira (VWAP acumulado, z por regime sem janela), sem aquecimento
+# que torne o valor estável.
+#
+# As colunas legadas das tabelas `features` (src/features/sinks.py) têm semânticas próprias de cada engine
+# antigo (VWAP acumulado, ADX da ta/pandas_ta, z sem regime...): cada uma vira uma variante das specs
+# canônicas, nomeada feature@layout (variant()), e só as features idênticas às canônicas são compartilhadas.
+
+CANDLE_INPUTS = ("open", "high", "low", "close", "volume")
+# séries auxiliares alinhadas às barras por as-of join (src/features/asof.py); ausentes = NaN
+AUX_INPUTS = ("oi_5m", "spread_pct", "funding_rate")
+
+@dataclass(frozen=True)
+class FeatureSpec:
+    name: str
+    kernel: str
+    inputs: tuple = ("close",)
+    params: dict = field(default_factory=dict)
+    warmup: int = 0
+    cumulative: bool = False
+
+    def as_dict(self):
+        d = {"name": self.name, "kernel": self.kernel, "inputs": list(self.inputs),
+             "params": self.params, "warmup": self.warmup}
+        return {**d, "cumulative": True} if self.cumulative else d
+
+
+def F(name, kernel, inputs=("close",), warmup=0, cumulative=False, **params):
+    return FeatureSpec(name, kernel, tuple(inputs), params, warmup, cumulative)
+
+
+HLC = ("high", "low", "close")
+
+CANONICAL_SPECS = (
+    # indicadores base (calculados uma vez)
+    F("ema20", "ema", warmup=80, span=20),
+    F("ema50", "ema", warmup=200, span=50),
+    F("vwap", "vwap", ("high", "low", "close", "volume"), warmup=20, n=20),
+    F("atr14", "atr", HLC, warmup=70, n=14, method="wilder"),
+    F("adx14", "adx", HLC, warmup=100, n=14, method="wilder"),
+    F("bb_width", "bb_width", warmup=20, n=20, k=2.0, scale=100.0),
+    F("std20", "std", warmup=20, n=20),
+    F("vol_logret20", "logret_std", warmup=21, n=20),
+    # normalizados
+    F("atr_pct", "ratio", ("atr14", "close"), warmup=70, scale=100.0),
+    F("ema20_slope", "roc", ("ema20",), warmup=81, k=1, scale=1e4),
+    F("ema50_slope", "roc", ("ema50",), warmup=201, k=1, scale=1e4),
+    F("vwap_slope", "roc", ("vwap",), warmup=21, k=1, scale=1e4),
+    # derivados em unidades de preço (layouts legados)
+    F("ema20_diff1", "slope", ("ema20",), warmup=81, k=1),
+    F("ema20_slope3", "slope", ("ema20",), warmup=83, k=3),
+    F("ema50_slope3", "slope", ("ema50",), warmup=203, k=3),
+    F("ema20_diff20", "slope", ("ema20",), warmup=100, k=20, per_bar=False),
+    F("vwap_diff1", "slope", ("vwap",), warmup=21, k=1),
+    F("vwap_slope3", "slope", ("vwap",), warmup=23, k=3),
+    F("vwap_diff20", "slope", ("vwap",), warmup=40, k=20, per_bar=False),
+    F("ema20_roc10", "roc", ("ema20",), warmup=90, k=10),
+    F("vwap_roc10", "roc", ("vwap",), warmup=30, k=10),
+    # regimes
+    F("vol_regime", "vol_regime", ("atr_pct",), warmup=70, q_low=0.33, q_high=0.66),
+    F("trend_regime", "trend_label", ("adx14", "ema20_roc10"), warmup=100, adx_min=20.0, slope_min=0.0),
+    F("sign_regime", "sign_label", ("ema20_diff20",), warmup=100),
+    # z-score por regime de volatilidade (janela móvel dentro de cada regime)
+    *[F(f"z_{c}", "zscore_regime", (c, "vol_regime"), warmup=200, n=200, min_periods=50)
+      for c in ("ema20_slope", "ema50_slope", "vwap_slope", "adx14", "atr_pct", "bb_width")],
+    # auxiliares (OI, spread perp/spot): z-score em janela móvel como no feature_engine_v1
+    *[F(f"z_{c}", "zroll", (c,), warmup=500, n=500, min_periods=50) for c in ("oi_5m", "spread_pct")],
+)
+
+
+def variant(tag: str, overrides, specs=CANONICAL_SPECS) -> tuple:
+    """Specs de `overrides` (mesmo nome = outra definição; nome novo = acréscimo) mais todas as que dependem
+    delas, renomeadas para nome@tag; as demais continuam as canônicas (não repetidas aqui)."""
+    over = {s.name: s for s in overrides}
+    tainted, out = set(), []
+    for s in list(specs) + [o for o in overrides if o.name not in {x.name for x in specs}]:
+        s = over.get(s.name, s)
+        if s.name in over or any(i in tainted for i in s.inputs):
+            tainted.add(s.name)
+            out.append(replace(s, name=f"{s.name}@{tag}",
+                               inputs=tuple(f"{i}@{tag}" if i in tainted else i for i in s.inputs)))
+    return tuple(out)
+
+
+# semânticas dos engines legados, por layout (src/features/sinks.py)
+LEGACY_SPECS = {
+    # src/features/engine.py: VWAP acumulado (preço típico), ATR/ADX do pandas_ta, BB sobre o close
+    "md": (
+        F("vwap", "vwap", ("high", "low", "close", "volume"), cumulative=True),
+        F("atr14", "atr", HLC, warmup=70, n=14, method="pta"),
+        F("adx14", "adx", HLC, warmup=100, n=14, method="pta"),
+        F("bb_width", "bb_width", warmup=20, n=20, k=2.0, scale=100.0, over="close"),
+    ),
+    # datahub/src/features/engine.py: VWAP acumulado do close, ATR/ADX da ta, z na janela inteira do regime
+    "datahub": (
+        F("vwap", "pvwap", ("close", "volume"), cumulative=True),
+        F("atr14", "atr", HLC, warmup=70, n=14, method="ta"),
+        F("adx14", "adx", HLC, warmup=100, n=14, method="ta"),
+        *[F(f"z_{c}", "zscore_group", (c, "vol_regime"), cumulative=True)
+          for c in ("ema20_diff1", "vwap_diff1", "adx14", "atr_pct", "bb_width")],
+    ),
+    # src/feature_engine/feature_engine_v1.py: VWAP acumulado, ATR/ADX da ta, z móvel de 500 sem regime
+    "fe_v1": (
+        F("vwap", "vwap", ("high", "low", "close", "volume"), cumulative=True),
+        F("atr14", "atr", HLC, warmup=70, n=14, method="ta"),
+        F("adx14", "adx", HLC, warmup=100, n=14, method="ta"),
+        *[F(f"z_{c}", "zroll", (c,), warmup=500, n=500, min_periods=50)
+          for c in ("ema20_slope3", "ema50_slope3", "vwap_slope3", "adx14", "atr_pct", "bb_width")],
+    ),
+    # src/jobs/feature_engine_v1.py: janelas com min_periods=1, "adx" = média de |retorno| * 100,
+    # "atr" = média de high - low
+    "jobs": (
+        F("vwap", "pvwap", ("close", "volume"), warmup=20, n=20, min_periods=1),
+        F("atr14", "range_mean", ("high", "low"), warmup=14, n=14, min_periods=1),
+        F("adx14", "absret_mean", warmup=15, n=14, min_periods=1, scale=100.0),
+        F("std20", "std", warmup=20, n=20, min_periods=1),
+    ),
+    # src/services/feature_engine.py: VWAP móvel do close com bfill, ATR simples, ADX sobre a soma do ATR
+    "services": (
+        F("vwap", "pvwap", ("close", "volume"), warmup=20, n=20, bfill=True),
+        F("atr14", "atr", HLC, warmup=14, n=14, method="sma"),
+        F("adx14", "adx", HLC, warmup=41, n=14, method="atr_sum"),
+    ),
+}
+
+DEFAULT_SPECS = CANONICAL_SPECS + tuple(s for tag, ov in LEGACY_SPECS.items() for s in variant(tag, ov))
+
+
+def strategy_specs(ema_fast: int, ema_slow: int, atr_period: int, adx_period: int, vwap_window: int = 20):
+    """Specs equivalentes a ta_v31.build_features (colunas consumidas pelas estratégias v31/v33)."""
+    return (
+        F("ema_fast", "ema", span=ema_fast),
+        F("ema_slow", "ema", span=ema_slow),
+        F("atr", "atr", HLC, warmup=atr_period, n=atr_period, method="sma"),
+        F("atr_pct", "ratio", ("atr", "close"), warmup=atr_period),
+        F("trend", "gt", ("ema_fast", "ema_slow")),
+        F("adx", "adx", HLC, warmup=2 * adx_period, n=adx_period, method="sma"),
+        F("vwap", "pvwap", ("close", "volume"), warmup=vwap_window, n=vwap_window),
+    )
+
+
+def spec_hash(specs=DEFAULT_SPECS) -> str:
+    raw = json.dumps([s.as_dict() for s in specs], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def resolve(names, specs=DEFAULT_SPECS):
+    """Specs necessárias (com dependências) para produzir `names`, em ordem de cálculo."""
+    by_name = {s.name: s for s in specs}
+    need, order = set(), []
+    def visit(n):
+        if n in need or n in CANDLE_INPUTS or n in AUX_INPUTS:
+            return
+        if n not in by_name:
+            raise KeyError(f"feature desconhecida: {n}")
+        for dep in by_name[n].inputs:
+            visit(dep)
+        need.add(n); order.append(by_name[n])
+    for n in names:
+        visit(n)
+    return order
+
+
+def aux_needed(names, specs=DEFAULT_SPECS) -> list:
+    """Séries auxiliares lidas por `names` (diretamente ou como entrada de alguma spec)."""
+    used = set(names) | {i for s in resolve(names, specs) for i in s.inputs}
+    return [a for a in AUX_INPUTS if a in used]
+
+
+def max_warmup(specs=DEFAULT_SPECS) -> int:
+    return max((s.warmup for s in specs), default=0)
@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+from src.features.spec import DEFAULT_SPECS, resolve, spec_hash
+from src.features.unified import compute, candles_to_arrays
+from src.features.sinks import read_version
+
+# Feature store: leitura de features por série (símbolo, timeframe) sem recalcular a partir de klines
+# em cada consumidor (executor, shadow, backtests).
+# - um ring buffer em memória por série (ts + colunas), capacidade fixa;
+# - alimentado pelo engine (candles -> compute, só barras novas) ou pela tabela `features` de um sink;
+# - versionado pelo spec_hash das specs resolvidas: cada série guarda a versão com que as linhas foram
+#   calculadas (a do store, ou a registrada pelo writer da tabela em feature_spec_version); leitores passam
+#   a versão esperada (padrão: a do store) e recebem VersionMismatch se as linhas vieram de outra.
+#
+# uso:
+#   store = FeatureStore(strategy_specs(**inds))
+#   store.refresh_from_candles("BTCUSDT", "5m", raw)          # raw com open_time + OHLCV
+#   store.range("BTCUSDT", "5m", start=t0, version=v)          # DataFrame
+#   store.latest("BTCUSDT", "5m", version=v)                  # dict da última barra
+
+CANDLE_COLS = ("open", "high", "low", "close", "volume")
+
+
+class VersionMismatch(RuntimeError):
+    pass
+
+
+class SeriesRing:
+    """Ring buffer de uma série: ts int64 (ns, crescente) + colunas float64/object/datetime64."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.cols = {}
+        self.n = 0   # total de linhas já gravadas (posição lógica)
+        self.version = None   # spec_hash das linhas guardadas
+
+    def __len__(self):
+        return min(self.n, self.capacity)
+
+    @property
+    def last_ts(self):
+        return int(self.ts[(self.n - 1) % self.capacity]) if self.n else None
+
+    def _order(self):
+        # índices físicos em ordem cronológica
+        if self.n <= self.capacity:
+            return np.arange(self.n)
+        return (np.arange(self.capacity) + self.n) % self.capacity
+
+    def append(self, ts_ns, data: dict, version=None) -> int:
+        ts_ns = np.asarray(ts_ns, dtype=np.int64)
+        if len(ts_ns) == 0:
+            return 0
+        if version != self.version:
+            # linhas de outra versão não se misturam: descarta as antigas
+            self.ts[:] = 0; self.cols = {}; self.n = 0
+            self.version = version
+        last = self.last_ts
+        if last is not None:
+            # barra igual à última (candle em formação) é sobrescrita; anteriores são ignoradas
+            if ts_ns[0] <= last:
+                k = int(np.searchsorted(ts_ns, last, side="left"))
+                if k < len(ts_ns) and ts_ns[k] == last:
+                    self.n -= 1
+                else:
+                    k = int(np.searchsorted(ts_ns, last, side="right"))
+                ts_ns = ts_ns[k:]
+                data = {c: v[k:] for c, v in data.items()}
+        m = len(ts_ns)
+        if m == 0:
+            return 0
+        if m > self.capacity:
+            ts_ns = ts_ns[-self.capacity:]
+            data = {c: v[-self.capacity:] for c, v in data.items()}
+            self.n += m - self.capacity
+            m = self.capacity
+        for c, v in data.items():
+            if c not in self.cols:
+                self.cols[c] = np.full(self.capacity, np.nan if v.dtype.kind == "f" else None,
+                                       dtype=v.dtype if v.dtype.kind in "fM" else object)
+        pos = (self.n + np.arange(m)) % self.capacity
+        self.ts[pos] = ts_ns
+        for c, v in data.items():
+            self.cols[c][pos] = v
+        self.n += m
+        return m
+
+    def view(self, start_ns=None, end_ns=None, columns=None):
+        o = self._order()
+        ts = self.ts[o]
+        lo = 0 if start_ns is None else int(np.searchsorted(ts, start_ns, side="left"))
+        hi = len(ts) if end_ns is None else int(np.searchsorted(ts, end_ns, side="right"))
+        o = o[lo:hi]
+        names = list(self.cols) if columns is None else list(columns)
+        return self.ts[o], {c: self.cols[c][o] for c in names}
+
+
+def _ns(t):
+    if t is None:
+        return None
+    t = pd.Timestamp(t)
+    return (t.tz_localize("UTC") if t.tzinfo is None else t).value
+
+
+class FeatureStore:
+    def __init__(self, specs=DEFAULT_SPECS, names=None, capacity: int = 5000, keep=CANDLE_COLS + ("close_time",),
+                 publish: bool = False):
+        self.specs = tuple(specs)
+        self.names = list(names) if names is not None else [s.name for s in self.specs]
+        self.plan = resolve(self.names, self.specs)
+        self.version = spec_hash(self.plan)
+        self.capacity = capacity
+        self.keep = tuple(keep)
+        self.series = {}
+        self.publish = publish
+        self.shm = {}   # série -> ShmFeatureRing (src/features/shm_ring.py) quando publish=True
+
+    def _ring(self, symbol, tf) -> SeriesRing:
+        key = (symbol, tf)
+        if key not in self.series:
+            self.series[key] = SeriesRing(self.capacity)
+        return self.series[key]
+
+    def check(self, ring: SeriesRing, version=None):
+        """Versão das linhas da série contra a esperada pelo leitor (padrão: a das specs do store)."""
+        want = self.version if version is None else version
+        if ring.version != want:
+            raise VersionMismatch(f"linhas calculadas com specs {ring.version}, leitor espera {want}")
+
+    # ---------- escrita ----------
+
+    def refresh_from_candles(self, symbol: str, tf: str, candles: pd.DataFrame, time_col: str = "open_time") -> int:
+        """Calcula as features sobre os candles e grava só as barras novas (>= último ts do ring)."""
+        if candles is None or candles.empty:
+            return 0
+        ts = pd.DatetimeIndex(pd.to_datetime(candles[time_col], utc=True)).asi8
+        feats = compute(candles_to_arrays(candles), self.names, self.specs)
+        ring = self._ring(symbol, tf)
+        start = 0
+        if ring.n == 0 or ring.version != self.version:
+            # partida a frio: descarta o aquecimento (linhas com alguma feature NaN no início)
+            ok = np.ones(len(ts), dtype=bool)
+            for v in feats.values():
+                if v.dtype.kind == "f" and np.isfinite(v).any():   # série auxiliar ausente não conta
+                    ok &= np.isfinite(v)
+            start = int(np.argmax(ok)) if ok.any() else len(ts)
+        else:
+            start = int(np.searchsorted(ts, ring.last_ts, side="left"))
+        data = {c: (candles[c].values if candles[c].dtype.kind == "M" else
+                    np.asarray(pd.to_numeric(candles[c], errors="coerce"), dtype=np.float64))[start:]
+                for c in self.keep if c in candles.columns}
+        data.update({k: v[start:] for k, v in feats.items()})
+        n = ring.append(ts[start:], data, self.version)
+        self._publish(symbol, tf, ts[start:], data)
+        return n
+
+    def refresh_from_table(self, cur, layout, symbol: str, tf: str, limit: int | None = None) -> int:
+        """Lê as barras novas da tabela `features` de um sink (src/features/sinks.py)."""
+        if layout.version() != self.version:
+            raise VersionMismatch(f"sink {layout.name} tem specs {layout.version()}, store {self.version}")
+        # tabela sem registro (writer anterior ao versionamento): assume as specs do layout
+        stored = read_version(cur, layout.name) or layout.version()
+        if stored != self.version:
+            raise VersionMismatch(f"tabela {layout.table} gravada com specs {stored}, store {self.version}")
+        ring = self._ring(symbol, tf)
+        since = ring.last_ts if ring.version == stored else None
+        ts, feats = layout.read(cur, symbol, tf, since=since, limit=limit or self.capacity)
+        n = ring.append(ts, feats, stored)
+        self._publish(symbol, tf, ts, feats)
+        return n
+
+    def _publish(self, symbol, tf, ts, data):
+        if not self.publish or len(ts) == 0:
+            return
+        from src.features.shm_ring import ShmFeatureRing, record_dtype
+        key = (symbol, tf)
+        if key not in self.shm:
+            dtype = record_dtype({c: np.asarray(v).dtype for c, v in data.items()})
+            self.shm[key] = ShmFeatureRing.create(symbol, tf, self.version, dtype, self.capacity)
+        self.shm[key].write(ts, data)
+
+    def close(self):
+        for r in self.shm.values():
+            r.close()
+        self.shm = {}
+
+    # ---------- leitura ----------
+
+    def latest(self, symbol: str, tf: str, version=None) -> dict | None:
+        ring = self.series.get((symbol, tf))
+        if ring is None or ring.n == 0:
+            return None
+        self.check(ring, version)
+        ts, data = ring.view(start_ns=ring.last_ts)
+        row = {c: v[-1] for c, v in data.items()}
+        row["ts"] = pd.Timestamp(int(ts[-1]), tz="UTC")
+        return row
+
+    def range(self, symbol: str, tf: str, start=None, end=None, columns=None, version=None,
+              dropna: bool = True, time_col: str = "open_time") -> pd.DataFrame:
+        ring = self.series.get((symbol, tf))
+        if ring is None or ring.n == 0:
+            return pd.DataFrame()
+        self.check(ring, version)
+        ts, data = ring.view(_ns(start), _ns(end), columns)
+        df = pd.DataFrame({time_col: pd.to_datetime(ts, utc=True)})
+        for c, v in data.items():
+            df[c] = pd.to_datetime(v, utc=True) if v.dtype.kind == "M" else v
+        if dropna:
+            df = df.dropna().reset_index(drop=True)
+        return df
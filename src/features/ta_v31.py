@@ -1,49 +1,29 @@
 import pandas as pd
 import numpy as np
+from src.features import kernels as K
+from src.features import jit as J
+
+# Indicadores em arrays float64 (src/features/kernels.py; compilados com numba quando disponível).
+# Mesma semântica das versões pandas anteriores: ewm(adjust=False), ATR = média simples do TR,
+# ADX = média de n DX com somas móveis de DM sobre o ATR simples.
+
+def _hlc(df):
+    return (np.ascontiguousarray(df[c], dtype=np.float64) for c in ("high", "low", "close"))
 
 def ema(series: pd.Series, span: int) -> pd.Series:
-    return series.ewm(span=span, adjust=False).mean()
+    if J.NUMBA:
+        return pd.Series(K.ema(series.to_numpy(dtype=np.float64), span), index=series.index)
+    return series.ewm(span=span, adjust=False).mean()   # laço Python do kernels.ewm é mais lento
 
 def vwap(price: pd.Series, volume: pd.Series, window: int) -> pd.Series:
     pv = price * volume
     return pv.rolling(window).sum() / volume.rolling(window).sum()
 
 def atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
-    high = df["high"].astype(float)
-    low = df["low"].astype(float)
-    close_prev = df["close"].astype(float).shift(1)
-    tr = pd.concat([
-        (high - low).abs(),
-        (high - close_prev).abs(),
-        (low - close_prev).abs()
-    ], axis=1).max(axis=1)
-    return tr.rolling(period).mean()
+    return pd.Series(K.atr(*_hlc(df), period, method="sma"), index=df.index)
 
 def dx_adx(df: pd.DataFrame, period: int = 14) -> pd.Series:
-    high = df["high"].astype(float)
-    low = df["low"].astype(float)
-    close_prev = df["close"].astype(float).shift(1)
-
-    up_move = high.diff()
-    down_move = -low.diff()
-
-    plus_dm = np.where((up_move > down_move) & (up_move > 0), up_move, 0.0)
-    minus_dm = np.where((down_move > up_move) & (down_move > 0), down_move, 0.0)
-
-    tr1 = pd.concat([
-        (high - low).abs(),
-        (high - close_prev).abs(),
-        (low - close_prev).abs()
-    ], axis=1).max(axis=1)
-
-    atr_ = tr1.rolling(period).mean()
-
-    plus_di = 100 * pd.Series(plus_dm).rolling(period).sum() / atr_
-    minus_di = 100 * pd.Series(minus_dm).rolling(period).sum() / atr_
-
-    dx = ( (plus_di - minus_di).abs() / (plus_di + minus_di) ) * 100
-    adx = dx.rolling(period).mean()
-    return adx
+    return pd.Series(K.adx(*_hlc(df), period, method="sma"), index=df.index)
 
 def build_features(df: pd.DataFrame, ema_fast: int, ema_slow: int, atr_period: int, adx_period: int, vwap_window: int) -> pd.DataFrame:
     out = df.copy()
@@ -0,0 +1,198 @@
+import os, time
+import numpy as np
+import pandas as pd
+from src.features import kernels as K
+from src.features.zscore import group_zscore, zscore_by_group
+from src.features.spec import DEFAULT_SPECS, AUX_INPUTS, resolve, max_warmup
+
+# Feature engine unificado: um kernel NumPy, spec declarativa (src/features/spec.py)
+# e sinks plugáveis para os layouts de tabela `features` existentes (src/features/sinks.py).
+#
+# uso: FEATURE_SINKS=jobs,services FEATURE_DSN=postgresql://... python -m src.features.unified --once
+
+
+def _scaled(x, scale):
+    return x if scale == 1.0 else x * scale
+
+
+def _vol_regime(x, q_low=0.33, q_high=0.66, bounds=None):
+    # bounds=(lo, hi) fixa os cortes (backfill em blocos); senão quantis da janela
+    out = np.full(len(x), None, dtype=object)
+    ok = np.isfinite(x)
+    if bounds is None and ok.sum() < 3:
+        return out
+    lo, hi = bounds if bounds is not None else np.quantile(x[ok], [q_low, q_high])
+    out[ok & (x <= lo)] = "low"
+    out[ok & (x > lo) & (x <= hi)] = "mid"
+    out[ok & (x > hi)] = "high"
+    return out
+
+
+def _zscore_regime(x, groups, n=200, min_periods=50):
+    # equivalente a groupby(regime)[x].transform(rolling z): janela móvel sobre as barras de cada regime
+    return zscore_by_group(x, groups, n=n, min_periods=min_periods)
+
+
+def _zroll(x, n=500, min_periods=50):
+    if not np.isfinite(x).any():   # série auxiliar ausente
+        return np.full(len(x), np.nan)
+    sd = K.rolling_std(x, n, min_periods=min_periods)
+    return (x - K.sma(x, n, min_periods)) / np.where(sd == 0, np.nan, sd)
+
+
+def _trend_label(adx, slope, adx_min=20.0, slope_min=0.0):
+    with np.errstate(invalid="ignore"):
+        trend = (adx >= adx_min) & (np.abs(slope) > slope_min)
+    return np.where(trend, "trend", "range").astype(object)
+
+
+def _bfill(x):
+    # preenche NaN com o próximo valor válido (pandas bfill)
+    ok = np.isfinite(x)
+    if ok.all() or not ok.any():
+        return x
+    nxt = np.where(ok, np.arange(len(x)), len(x))
+    nxt = np.minimum.accumulate(nxt[::-1])[::-1]
+    return np.where(nxt < len(x), x[np.minimum(nxt, len(x) - 1)], np.nan)
+
+
+def _sign_label(x):
+    out = np.full(len(x), "sideways", dtype=object)
+    with np.errstate(invalid="ignore"):
+        out[x > 0] = "bull"; out[x < 0] = "bear"
+    return out
+
+
+KERNELS = {
+    "ema": lambda x, span: K.ema(x, span),
+    "sma": lambda x, n: K.sma(x, n),
+    "std": lambda x, n, ddof=1, min_periods=None: K.rolling_std(x, n, ddof=ddof, min_periods=min_periods),
+    "atr": lambda h, l, c, n, method="wilder": K.atr(h, l, c, n, method),
+    "adx": lambda h, l, c, n, method="wilder": K.adx(h, l, c, n, method),
+    "bb_width": lambda c, n, k, scale=1.0, over="mid": _scaled(K.bb_width(c, n, k, over=over), scale),
+    "vwap": lambda h, l, c, v, n=None: K.vwap(K.typical_price(h, l, c), v, n),
+    "pvwap": lambda p, v, n=None, min_periods=None, bfill=False:
+        (_bfill if bfill else np.asarray)(K.vwap(p, v, n, min_periods)),
+    "absret_mean": lambda c, n, min_periods=None, scale=1.0: _scaled(K.sma(np.abs(K.pct_change(c)), n, min_periods), scale),
+    "range_mean": lambda h, l, n, min_periods=None: K.sma(np.abs(K._f64(h) - K._f64(l)), n, min_periods),
+    "gt": lambda a, b: (a > b).astype(np.float64),
+    "logret_std": lambda c, n: K.logret_std(c, n),
+    "ratio": lambda a, b, scale=1.0: _scaled(a / np.where(b == 0, np.nan, b), scale),
+    "roc": lambda x, k=1, scale=1.0: _scaled(K.pct_change(x, k), scale),
+    "slope": lambda x, k=1, per_bar=True: K.diff(x, k) / (k if per_bar else 1),
+    "vol_regime": _vol_regime,
+    "zscore_regime": _zscore_regime,
+    "zscore_group": lambda x, g, fallback=1.0: group_zscore(x, g, fallback=fallback),
+    "zroll": _zroll,
+    "trend_label": _trend_label,
+    "sign_label": _sign_label,
+}
+
+
+def candles_to_arrays(df: pd.DataFrame) -> dict:
+    return {c: np.ascontiguousarray(pd.to_numeric(df[c], errors="coerce"), dtype=np.float64)
+            for c in ("open", "high", "low", "close", "volume") if c in df.columns}
+
+
+def compute(candles: dict, names=None, specs=DEFAULT_SPECS) -> dict:
+    """Calcula as features pedidas (ou todas) sobre arrays de candles; cada spec roda uma única vez.
+    Features já presentes em `candles` (calculadas antes, ex. acumuladas no backfill) não são recalculadas."""
+    plan = resolve(names if names is not None else [s.name for s in specs], specs)
+    values = dict(candles)
+    n = len(next(iter(candles.values()))) if candles else 0
+    for a in AUX_INPUTS:
+        values.setdefault(a, np.full(n, np.nan))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for s in plan:
+            if s.name in values:
+                continue
+            values[s.name] = KERNELS[s.kernel](*[values[i] for i in s.inputs], **s.params)
+    wanted = names if names is not None else [s.name for s in specs]
+    return {n: values[n] for n in wanted}
+
+
+def compute_frame(df: pd.DataFrame, names=None, specs=DEFAULT_SPECS) -> pd.DataFrame:
+    feats = compute(candles_to_arrays(df), names, specs)
+    return pd.DataFrame(feats, index=df.index)
+
+
+# ---------- runner ----------
+
+def _connect(dsn: str):
+    try:
+        import psycopg
+        return psycopg.connect(dsn, autocommit=True)
+    except ImportError:
+        import psycopg2
+        conn = psycopg2.connect(dsn); conn.autocommit = True
+        return conn
+
+
+def run_once(sinks, source, symbols, timeframes, lookback: int, dsn: str, sink_dsn: dict | None = None,
+             aux_cache=None):
+    from src.features.sinks import record_version
+    from src.features.asof import attach_aux
+    names = sorted({f for s in sinks for f in s.features()})
+    warm = max_warmup(resolve(names))
+    src_conn = _connect(dsn)
+    conns = {s.name: _connect((sink_dsn or {}).get(s.name, dsn)) for s in sinks}
+    total = 0
+    try:
+        for s in sinks:
+            with conns[s.name].cursor() as cur:
+                record_version(cur, s)
+        for sym in symbols:
+            for tf in timeframes:
+                t0 = time.perf_counter()
+                with src_conn.cursor() as cur:
+                    ts, arrays = source.load(cur, sym, tf, lookback + warm)
+                    if len(ts) == 0:
+                        print(f"[unified] sem candles {sym} {tf}", flush=True)
+                        continue
+                    arrays = attach_aux(cur, source, names, sym, tf, ts.asi8, arrays, aux_cache)
+                feats = compute(arrays, names)
+                keep = slice(min(warm, max(len(ts) - lookback, 0)), None)
+                for s in sinks:
+                    with conns[s.name].cursor() as cur:
+                        total += s.write(cur, sym, tf, ts[keep], {k: v[keep] for k, v in feats.items()})
+                print(f"[unified] {sym} {tf}: {len(ts)} barras, {len(names)} features, "
+                      f"{len(sinks)} sinks em {(time.perf_counter()-t0)*1000:.1f} ms", flush=True)
+    finally:
+        src_conn.close()
+        for c in conns.values():
+            c.close()
+    return total
+
+
+def main():
+    import argparse
+    from src.features.sinks import LAYOUTS, SOURCES
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--once", action="store_true")
+    ap.add_argument("--sinks", default=os.getenv("FEATURE_SINKS", "jobs"))
+    ap.add_argument("--source", default=os.getenv("FEATURE_SOURCE", "ts"), choices=sorted(SOURCES))
+    ap.add_argument("--lookback", type=int, default=int(os.getenv("FEATURE_LOOKBACK", "500")))
+    ap.add_argument("--poll", type=int, default=int(os.getenv("FEATURE_POLL_SECONDS", "30")))
+    args = ap.parse_args()
+
+    dsn = os.getenv("FEATURE_DSN", "postgresql://localhost/botfutures")
+    sinks = [LAYOUTS[n.strip()] for n in args.sinks.split(",") if n.strip()]
+    sink_dsn = {s.name: os.getenv(f"FEATURE_DSN_{s.name.upper()}") for s in sinks}
+    sink_dsn = {k: v for k, v in sink_dsn.items() if v}
+    symbols = [s.strip() for s in os.getenv("FEATURE_SYMBOLS", "BTCUSDT,ETHUSDT").split(",") if s.strip()]
+    tfs = [t.strip() for t in os.getenv("FEATURE_TIMEFRAMES", "1m,5m,15m").split(",") if t.strip()]
+    from src.features.asof import AsofCache
+    aux_cache = AsofCache()
+    while True:
+        try:
+            n = run_once(sinks, SOURCES[args.source], symbols, tfs, args.lookback, dsn, sink_dsn, aux_cache)
+            print(f"[unified] upsert total={n}", flush=True)
+        except Exception as e:
+            print(f"[unified] LOOP_ERROR {type(e).__name__}: {e}", flush=True)
+        if args.once:
+            break
+        time.sleep(args.poll)
+
+
+if __name__ == "__main__":
+    main()
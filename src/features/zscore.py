@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+# Z-scores por regime sem groupby.transform: todas as colunas e todos os regimes numa passada
+# sobre um array 2D (n, k). As linhas são reordenadas de forma estável por regime e os
+# momentos móveis saem de somas acumuladas com a janela cortada no início de cada grupo,
+# o que equivale a groupby(regime)[col].transform(lambda s: s.rolling(n, min_periods).*).
+#
+# RollingGroupZ é a variante incremental (caminho ao vivo, src/features/engine.py): guarda as
+# últimas n linhas de cada regime e calcula só as linhas novas.
+
+
+def _codes(groups):
+    codes, uniq = pd.factorize(pd.Series(np.asarray(groups, dtype=object)))
+    return codes, uniq   # NaN/None -> -1
+
+
+def _as2d(X):
+    X = np.asarray(X, dtype=np.float64)
+    return (X[:, None], True) if X.ndim == 1 else (X, False)
+
+
+def zscore_by_group(X, groups, n: int = 200, min_periods: int = 50, ddof: int = 1):
+    X, squeeze = _as2d(X)
+    codes, _ = _codes(groups)
+    out = np.full(X.shape, np.nan)
+    sel = np.flatnonzero(codes >= 0)
+    if len(sel) == 0:
+        return out[:, 0] if squeeze else out
+    order = sel[np.argsort(codes[sel], kind="stable")]
+    g = codes[order]
+    xs = X[order]
+    m = len(order)
+    starts = np.r_[0, np.flatnonzero(np.diff(g)) + 1]
+    gstart = np.repeat(starts, np.diff(np.r_[starts, m]))
+    pos = np.arange(m)
+    lo = np.maximum(gstart, pos - n + 1)
+
+    valid = np.isfinite(xs)
+    # centraliza por coluna (não muda o z) para reduzir cancelamento em sum(x²) - sum(x)²/n
+    center = np.where(valid, xs, 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    z = np.where(valid, xs - center, 0.0)
+    zero = np.zeros((1, X.shape[1]))
+    C = np.vstack([zero, np.cumsum(valid, axis=0, dtype=np.float64)])
+    S = np.vstack([zero, np.cumsum(z, axis=0)])
+    Q = np.vstack([zero, np.cumsum(z * z, axis=0)])
+    cnt = C[pos + 1] - C[lo]
+    s = S[pos + 1] - S[lo]
+    q = Q[pos + 1] - Q[lo]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = s / cnt
+        var = (q - s * mean) / (cnt - ddof)
+        var = np.where(var > 1e-12 * (q / cnt), var, 0.0)   # ruído de arredondamento -> 0
+        res = (z - mean) / np.sqrt(var)
+    res[~valid | (cnt < min_periods)] = np.nan
+    res[~np.isfinite(res)] = np.nan
+    out[order] = res
+    return out[:, 0] if squeeze else out
+
+
+def group_zscore(X, groups, ddof: int = 1, fallback: float = 1.0):
+    # z sobre a janela inteira de cada regime (datahub): (x - média) / desvio, desvio inválido -> fallback
+    X, squeeze = _as2d(X)
+    codes, uniq = _codes(groups)
+    out = np.full(X.shape, np.nan)
+    sel = codes >= 0
+    if not sel.any():
+        return out[:, 0] if squeeze else out
+    G, k = len(uniq), X.shape[1]
+    xs, c = X[sel], codes[sel]
+    valid = np.isfinite(xs)
+    x0 = np.where(valid, xs, 0.0)
+    cnt = np.zeros((G, k)); s = np.zeros((G, k))
+    np.add.at(cnt, c, valid)
+    np.add.at(s, c, x0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = s / cnt
+        d = np.where(valid, xs - mean[c], 0.0)
+        ss = np.zeros((G, k))
+        np.add.at(ss, c, d * d)
+        sd = np.sqrt(ss / (cnt - ddof))
+    sd = np.where(np.isfinite(sd) & (sd > 0), sd, fallback)
+    res = (xs - mean[c]) / sd[c]
+    res[~valid] = np.nan
+    out[sel] = res
+    return out[:, 0] if squeeze else out
+
+
+class RollingGroupZ:
+    """Estado incremental de zscore_by_group: últimas `n` linhas por regime."""
+
+    def __init__(self, k: int, n: int = 200, min_periods: int = 50, ddof: int = 1):
+        self.k, self.n, self.min_periods, self.ddof = k, n, min_periods, ddof
+        self.buf = {}   # regime -> array (n, k) circular
+        self.pos = {}   # regime -> total de linhas vistas
+
+    def seed(self, X, groups):
+        X, _ = _as2d(X)
+        g = np.asarray(groups, dtype=object)
+        for key in pd.unique(g[pd.notna(g)]):
+            tail = X[g == key][-self.n:]
+            b = np.full((self.n, self.k), np.nan)
+            b[:len(tail)] = tail
+            self.buf[key], self.pos[key] = b, len(tail)
+
+    def update(self, X, groups):
+        X, squeeze = _as2d(X)
+        out = np.full(X.shape, np.nan)
+        for i, key in enumerate(np.asarray(groups, dtype=object)):
+            if key is None or (isinstance(key, float) and np.isnan(key)):
+                continue
+            b = self.buf.get(key)
+            if b is None:
+                b = self.buf[key] = np.full((self.n, self.k), np.nan)
+                self.pos[key] = 0
+            b[self.pos[key] % self.n] = X[i]
+            self.pos[key] += 1
+            valid = np.isfinite(b)
+            cnt = valid.sum(axis=0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mean = np.where(valid, b, 0.0).sum(axis=0) / cnt
+                var = (np.where(valid, b - mean, 0.0) ** 2).sum(axis=0) / (cnt - self.ddof)
+                z = (X[i] - mean) / np.sqrt(var)
+            z[(cnt < self.min_periods) | ~np.isfinite(z)] = np.nan
+            out[i] = z
+        return out[:, 0] if squeeze else out
@@ -1,4 +1,5 @@
 import os, time, sys
+import numpy as np
 import pandas as pd
 import psycopg2
 import psycopg2.extras as pxe
@@ -68,7 +69,81 @@ def normalize_columns(df: pd.DataFrame) -> pd.DataFrame | None:
 
     return df
 
-def fetch_candles(conn, symbol, timeframe, lookback=400) -> pd.DataFrame:
+# Sinônimos aceitos por coluna canônica (mesma ordem de preferência de normalize_columns)
+CANDLE_SYNONYMS = {
+    "ts": ["ts","timestamp","time","open_time","dt"],
+    "symbol": ["symbol","pair","ticker"],
+    "timeframe": ["timeframe","tf","interval"],
+    "open": ["open","o"],
+    "high": ["high","h"],
+    "low": ["low","l"],
+    "close": ["close","c","price"],
+    "volume": ["volume","v","vol"],
+}
+NUMERIC_COLS = ("open","high","low","close","volume")
+
+class CandleQuery:
+    """Query tipada e só com as colunas usadas, montada uma vez a partir do schema real da tabela."""
+
+    def __init__(self, colmap: dict):
+        self.colmap = colmap
+        self.numeric = [k for k in NUMERIC_COLS if k in colmap]
+        ts = colmap["ts"]
+        sel = [f"(extract(epoch from {ts}) * 1000000)::int8"] + [f"{colmap[k]}::float8" for k in self.numeric]
+        self.sql = (f"SELECT {', '.join(sel)} FROM {CANDLES_TABLE} "
+                    f"WHERE {colmap['symbol']} = %s AND {colmap['timeframe']} = %s AND {ts} <= now() "
+                    f"ORDER BY {ts} DESC NULLS LAST LIMIT %s;")
+
+    def fetch(self, conn, symbol, timeframe, lookback) -> dict:
+        with conn.cursor() as c:
+            c.execute(self.sql, (symbol, timeframe, lookback))
+            rows = c.fetchall()
+        n = len(rows)
+        if n == 0:
+            return {}
+        cols = list(zip(*rows))
+        # linhas vêm em ordem decrescente de ts; inverte para ascendente
+        out = {"ts": np.fromiter(cols[0], dtype=np.int64, count=n)[::-1]}
+        for i, k in enumerate(self.numeric, start=1):
+            out[k] = np.fromiter((np.nan if x is None else x for x in cols[i]), dtype=np.float64, count=n)[::-1]
+        return out
+
+def probe_candles_schema(conn) -> CandleQuery | None:
+    schema, _, table = CANDLES_TABLE.rpartition(".")
+    with conn.cursor() as c:
+        c.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = %s AND table_schema = COALESCE(NULLIF(%s, ''), current_schema())
+        """, (table, schema))
+        cols = {r[0].lower(): r[0] for r in c.fetchall()}
+    colmap = {}
+    for target, keys in CANDLE_SYNONYMS.items():
+        for k in keys:
+            if k in cols:
+                colmap[target] = cols[k]
+                break
+    missing = {"ts","symbol","timeframe","close"} - set(colmap)
+    if missing:
+        _log(f"SCHEMA_PROBE_INCOMPLETE table={CANDLES_TABLE} missing={sorted(missing)} cols={sorted(cols)}", "ERROR")
+        return None
+    _log(f"SCHEMA_PROBE table={CANDLES_TABLE} map={colmap}")
+    return CandleQuery(colmap)
+
+def candles_frame(arrays: dict, symbol, timeframe) -> pd.DataFrame:
+    if not arrays:
+        return pd.DataFrame()
+    df = pd.DataFrame({k: v for k, v in arrays.items() if k != "ts"})
+    df.insert(0, "ts", pd.to_datetime(arrays["ts"], unit="us", utc=True))
+    df["symbol"] = symbol
+    df["timeframe"] = timeframe
+    return df
+
+def fetch_candles(conn, symbol, timeframe, lookback=400, query: CandleQuery | None = None) -> pd.DataFrame:
+    if query is not None:
+        df = candles_frame(query.fetch(conn, symbol, timeframe, lookback), symbol, timeframe)
+        _log(f"TYPED cols={list(df.columns)} size={len(df)} sym={symbol} tf={timeframe}", "DEBUG")
+        return df
+    # fallback: schema desconhecido -> SELECT * + normalize_columns por chamada
     with conn.cursor(cursor_factory=pxe.DictCursor) as c:
         c.execute(f"""
             SELECT *
@@ -147,13 +222,17 @@ def upsert_features(cur, rows):
 
 def main_loop():
     _log(f"START symbols={SYMBOLS} tf={TF} poll={POLL_SECS}s")
+    query = None
     while True:
         total = 0
+        t_cycle = time.perf_counter()
         try:
             with connect() as conn:
+                if query is None:
+                    query = probe_candles_schema(conn)
                 for sym in SYMBOLS:
                     for tf in TF:
-                        df = fetch_candles(conn, sym, tf)
+                        df = fetch_candles(conn, sym, tf, query=query)
                         if df.empty:
                             _log(f"SKIP_EMPTY sym={sym} tf={tf}", "DEBUG")
                             continue
@@ -200,7 +279,7 @@ def main_loop():
                         total += len(rows)
                         _log(f"UPSERT {len(rows)} sym={sym} tf={tf}")
 
-            _log(f"UPSERT_TOTAL {total}")
+            _log(f"UPSERT_TOTAL {total} cycle_ms={(time.perf_counter()-t_cycle)*1000:.0f}")
         except Exception as e:
             _log(f"LOOP_ERROR {type(e).__name__}: {e}", "ERROR")
         time.sleep(POLL_SECS)
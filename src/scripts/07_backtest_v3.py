@@ -1,16 +1,25 @@
-import pandas as pd, yaml
+import yaml
+from src.backtest.history import locate
+from src.backtest.intrabar import SubBars
 from src.features.ta_v3 import build_features
 from src.strategies.baseline_atr_v3 import baseline_atr_v3
 
 if __name__ == "__main__":
     cfg = yaml.safe_load(open("config/settings_v3.yml"))
     sym, tf, days = cfg["symbol"], cfg["timeframe"], cfg["history_days"]
-    in_file = f"data/{sym}_{tf}_{days}d.csv"
-    df = pd.read_csv(in_file, parse_dates=["open_time","close_time"])
+    src = locate(sym, tf, days)
+    if src is None:
+        raise SystemExit(f"{sym}: sem histórico (data/history/{sym}_{tf} nem data/{sym}_{tf}_{days}d.csv). Rode o fetch antes.")
+    df = src.load()
 
     # construir features
     inds = cfg["indicators"]
     df_feat = build_features(df, inds["ema_fast"], inds["ema_slow"], inds["atr_period"], inds["adx_period"])
 
-    res = baseline_atr_v3(df_feat, cfg)
+    # execution.intrabar_tf (ex.: "1m"): TP/stop pelo caminho do timeframe menor no store colunar
+    sub_tf = cfg["execution"].get("intrabar_tf")
+    path = SubBars.build(df_feat, sym, sub_tf) if sub_tf else None
+    if sub_tf and path is None:
+        print(f"sem {sym} {sub_tf} em data/history; usando só o close")
+    res = baseline_atr_v3(df_feat, cfg, path)
     print(f"PnL total: {res['pnl_total']:.2f} USDT | Trades: {res['num_trades']} | Wins: {res['wins']} | Losses: {res['losses']} | Avg: {res['avg_trade']:.4f}")
@@ -1,5 +1,6 @@
-import pandas as pd, yaml
-from pathlib import Path
+import yaml
+from src.backtest.history import locate
+from src.backtest.result_cache import CACHE
 from src.features.ta_v31 import build_features
 from src.strategies.orchestrator_v33 import run_backtest_orchestrated
 
@@ -25,17 +26,20 @@ if __name__ == "__main__":
     inds = cfg["indicators"]
 
     for sym in symbols:
-        in_file = f"data/{sym}_{tf}_{days}d.csv"
-        if not Path(in_file).exists():
-            print(f"{sym}: arquivo não encontrado: {in_file}. Rode o fetch antes.");
+        src = locate(sym, tf, days)
+        if src is None:
+            print(f"{sym}: sem histórico (data/history/{sym}_{tf} nem data/{sym}_{tf}_{days}d.csv). Rode o fetch antes.");
             continue
 
-        df = pd.read_csv(in_file, parse_dates=["open_time","close_time"])
-        df_feat = build_features(
-            df, inds["ema_fast"], inds["ema_slow"], inds["atr_period"], inds["adx_period"], inds.get("vwap_window",20)
-        )
+        def run():
+            df = src.load()
+            df_feat = build_features(
+                df, inds["ema_fast"], inds["ema_slow"], inds["atr_period"], inds["adx_period"], inds.get("vwap_window",20)
+            )
+            return run_backtest_orchestrated(df_feat, cfg)
 
-        res = run_backtest_orchestrated(df_feat, cfg)
+        # rerun com os mesmos candles/cfg/código sai do cache (src/backtest/result_cache.py)
+        res = CACHE.run(src.fingerprint(), cfg, run, tag="ta_v31+orch_v33")
 
         trades_vals = extract_trade_pnls(res.get("trades") or res.get("trade_log") or res.get("executions"))
         wins = sum(1 for x in trades_vals if x > 0)
@@ -0,0 +1,92 @@
+import argparse, time
+from pathlib import Path
+import pandas as pd
+import yaml
+from src.backtest import array_engine as AE
+from src.backtest.history import locate
+from src.features.ta_v31 import build_features
+from src.scripts.bench_kernels import candles
+from src.strategies.meanrev_v31 import run_meanrev
+from src.strategies.trend_v31 import run_trend
+
+# Paridade e tempo: strategies/*_v31 (iterrows/iloc) x src/backtest/array_engine.py, em cada preset de
+# config/presets (mesclado sobre settings_v31) com candles do histórico do preset (store/CSV) ou sintéticos.
+# Exige tupla idêntica (pnl_total, trades, wins, losses); sai com código 1 se algo divergir.
+# "regimes": laço original dos orquestradores (iloc por barra + cópia por bloco) x array_engine.run_regimes;
+# "1-pass" (single_pass, semântica própria) só mostra tempo e resultado, sem exigir igualdade.
+#
+# uso: python -m src.scripts.bench_backtest [--rows 20000] [--synthetic]
+
+
+def merge(base, override):
+    out = dict(base)
+    for k, v in override.items():
+        out[k] = merge(out[k], v) if isinstance(v, dict) and isinstance(out.get(k), dict) else v
+    return out
+
+
+def frame(cfg, rows, synthetic):
+    ind = cfg["indicators"]
+    src = None if synthetic else locate(cfg["symbols"][0], cfg["timeframe"], cfg["history_days"])
+    if src is not None:
+        df = src.load()
+    else:
+        df = candles(rows, seed=1)
+        t = pd.date_range("2025-01-01", periods=rows, freq="5min", tz="UTC")
+        df.insert(0, "open_time", t); df.insert(5, "close_time", t + pd.Timedelta("5min") - pd.Timedelta("1ms"))
+    return build_features(df, ind["ema_fast"], ind["ema_slow"], ind["atr_period"], ind["adx_period"],
+                          ind.get("vwap_window", 20))
+
+
+def legacy_regimes(df_feat, cfg):
+    # laço de orchestrator_v31/v33 antes de run_regimes
+    df = df_feat.copy().reset_index(drop=True)
+    regimes = (df["adx"] >= cfg["filters"]["adx_trend_min"]).astype(int)
+    total, trades, wins, losses, start = 0.0, [], 0, 0, 0
+    for i in range(1, len(df)+1):
+        if i == len(df) or regimes.iloc[i] != regimes.iloc[i-1]:
+            block = df.iloc[start:i].copy()
+            if len(block) > 10:
+                pnl, tr, w, l = (run_trend if regimes.iloc[start] == 1 else run_meanrev)(block, cfg)
+                total += pnl; trades.extend(tr); wins += w; losses += l
+            start = i
+    return total, trades, wins, losses
+
+
+def timed(fn, *a):
+    t0 = time.perf_counter(); r = fn(*a)
+    return time.perf_counter() - t0, r
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--synthetic", action="store_true", help="ignora o histórico em data/")
+    args = ap.parse_args()
+    base = yaml.safe_load(open("config/settings_v31.yml"))
+    print(f"numba={'sim' if AE.NUMBA else 'não'}")
+    if AE.NUMBA:
+        AE.run_trend(frame(base, 500, True), base)   # compila antes de medir
+
+    ok = True
+    for p in sorted(Path("config/presets").glob("*.yml")):
+        cfg = merge(base, yaml.safe_load(open(p)))
+        df = frame(cfg, args.rows, args.synthetic)
+        # ADX mínimo baixo (trend) / alto (meanrev) para exercitar os dois laços; "trend*" sem o corte por perdas seguidas
+        for name, old, new, c in (("trend", run_trend, AE.run_trend, merge(cfg, {"filters": {"adx_trend_min": 10}})),
+                                  ("trend*", run_trend, AE.run_trend,
+                                   merge(cfg, {"filters": {"adx_trend_min": 10}, "risk": {"max_consecutive_losses": 10**9}})),
+                                  ("meanrev", run_meanrev, AE.run_meanrev, merge(cfg, {"filters": {"adx_trend_min": 40}})),
+                                  ("regimes", legacy_regimes, AE.run_regimes, cfg)):
+            t_old, r_old = timed(old, df, c)
+            t_new, r_new = timed(new, df, c)
+            same = r_old == r_new
+            ok &= same
+            print(f"{p.stem:24s} {name:8s} trades={len(r_old[1]):5d} pnl={r_old[0]:12.4f} "
+                  f"antigo {t_old*1000:8.1f} ms | arrays {t_new*1000:7.2f} ms | x{t_old/max(t_new, 1e-9):6.1f} "
+                  f"| {'igual' if same else 'DIFERENTE'}")
+        t_one, r_one = timed(AE.run_regimes, df, merge(cfg, {"orchestrator": {"single_pass": True}}))
+        print(f"{p.stem:24s} {'1-pass':8s} trades={len(r_one[1]):5d} pnl={r_one[0]:12.4f} "
+              f"{'':21s}| arrays {t_one*1000:7.2f} ms | blocos: trades={len(r_new[1])} pnl={r_new[0]:.4f}")
+    print("[OK] paridade" if ok else "[FALHA] resultados diferentes")
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,99 @@
+import argparse, time
+from datetime import timedelta
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from src.jobs import feature_engine_v1 as fe
+
+# Wall time por ciclo do src/jobs/feature_engine_v1 (20 símbolos x 3 timeframes por padrão):
+# legado (SELECT * + DictCursor + dicts por linha + normalize_columns) x query tipada/podada (CandleQuery).
+#
+# com banco: python -m src.scripts.bench_candle_loading --db   (usa DB_* do ambiente, como o job)
+# sem banco: python -m src.scripts.bench_candle_loading        (simula as linhas devolvidas pelo driver)
+
+TFS = ["1m", "5m", "15m"]
+
+
+def _dict_rows(n, seed):
+    # o que o DictCursor devolve para SELECT *: dict por linha, numeric -> Decimal
+    rng = np.random.default_rng(seed)
+    t0 = pd.Timestamp("2025-01-01", tz="UTC").to_pydatetime()
+    c = 100 + np.cumsum(rng.normal(0, 0.1, n))
+    return [{"id": i, "symbol": "X", "timeframe": "tf", "ts": t0 + timedelta(minutes=n - i),
+             "open": Decimal(f"{c[i]:.4f}"), "high": Decimal(f"{c[i]+0.1:.4f}"), "low": Decimal(f"{c[i]-0.1:.4f}"),
+             "close": Decimal(f"{c[i]:.4f}"), "volume": Decimal("12.5"), "trades": 10}
+            for i in range(n)]
+
+
+def _typed_rows(n, seed):
+    # o que CandleQuery devolve: tuplas (ts_us int8, float8...)
+    rng = np.random.default_rng(seed)
+    t0 = pd.Timestamp("2025-01-01", tz="UTC").value // 1000
+    c = 100 + np.cumsum(rng.normal(0, 0.1, n))
+    return [(t0 + (n - i) * 60_000_000, c[i], c[i] + 0.1, c[i] - 0.1, c[i], 12.5) for i in range(n)]
+
+
+def offline_cycle(symbols, lookback, legacy: bool, compute: bool):
+    q = fe.CandleQuery({k: k for k in ("ts", "symbol", "timeframe", "open", "high", "low", "close", "volume")})
+    t_load = t_comp = 0.0
+    for i, sym in enumerate(symbols):
+        for tf in TFS:
+            rows = _dict_rows(lookback, i) if legacy else _typed_rows(lookback, i)
+            t0 = time.perf_counter()
+            if legacy:
+                df = fe.normalize_columns(pd.DataFrame([dict(r) for r in rows]))
+            else:
+                n = len(rows); cols = list(zip(*rows))
+                arrays = {"ts": np.fromiter(cols[0], dtype=np.int64, count=n)[::-1]}
+                for j, k in enumerate(q.numeric, start=1):
+                    arrays[k] = np.fromiter(cols[j], dtype=np.float64, count=n)[::-1]
+                df = fe.candles_frame(arrays, sym, tf)
+            t1 = time.perf_counter()
+            if compute:
+                fe.compute_features(df)
+            t_load += t1 - t0; t_comp += time.perf_counter() - t1
+    return t_load, t_comp
+
+
+def db_cycle(conn, symbols, lookback, query, compute: bool):
+    t_load = t_comp = 0.0
+    for sym in symbols:
+        for tf in TFS:
+            t0 = time.perf_counter()
+            df = fe.fetch_candles(conn, sym, tf, lookback, query=query)
+            t1 = time.perf_counter()
+            if compute and not df.empty:
+                fe.compute_features(df)
+            t_load += t1 - t0; t_comp += time.perf_counter() - t1
+    return t_load, t_comp
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--symbols", type=int, default=20)
+    ap.add_argument("--lookback", type=int, default=400)
+    ap.add_argument("--cycles", type=int, default=3)
+    ap.add_argument("--db", action="store_true")
+    args = ap.parse_args()
+
+    if args.db:
+        conn = fe.connect()
+        syms = fe.SYMBOLS * (args.symbols // max(len(fe.SYMBOLS), 1) + 1)
+        syms = syms[:args.symbols]
+        t0 = time.perf_counter(); query = fe.probe_candles_schema(conn)
+        print(f"probe do schema (uma vez): {(time.perf_counter()-t0)*1000:.1f} ms")
+        runs = {"legado": lambda: db_cycle(conn, syms, args.lookback, None, True),
+                "tipado": lambda: db_cycle(conn, syms, args.lookback, query, True)}
+    else:
+        syms = [f"SYM{i}" for i in range(args.symbols)]
+        runs = {"legado": lambda: offline_cycle(syms, args.lookback, True, True),
+                "tipado": lambda: offline_cycle(syms, args.lookback, False, True)}
+
+    print(f"{args.symbols} símbolos x {len(TFS)} timeframes, lookback={args.lookback}")
+    for name, fn in runs.items():
+        best = None
+        for _ in range(args.cycles):
+            t_load, t_comp = fn()
+            if best is None or t_load + t_comp < sum(best):
+                best = (t_load, t_comp)
+        print(f"{name:7s}: ciclo {sum(best)*1000:8.1f} ms | carga {best[0]*1000:8.1f} ms | cálculo {best[1]*1000:8.1f} ms")
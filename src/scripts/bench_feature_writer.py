@@ -0,0 +1,71 @@
+import argparse, time
+import numpy as np
+import pandas as pd
+from src.features.copy_writer import encode_copy_binary
+
+# Benchmark: conversão de features para escrita (48h de 1m x N símbolos)
+# legado = iterrows + n2none por célula; novo = encode_copy_binary (COPY binário vetorizado)
+# uso: python -m src.scripts.bench_feature_writer --symbols 10 --hours 48
+
+SPEC = [("symbol", "text"), ("interval", "text"), ("ts", "timestamptz")] + \
+       [(c, "float8") for c in ["ema20_slope","ema50_slope","vwap_slope","adx14","atr_pct","bb_width",
+                                "delta_aggr_1m","bid_ask_ratio"]] + [("vol_regime", "text")] + \
+       [(c, "float8") for c in ["z_ema20_slope","z_ema50_slope","z_vwap_slope","z_adx14","z_atr_pct",
+                                "z_bb_width","z_delta_aggr_1m"]]
+
+def synth(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range("2025-01-01", periods=n, freq="1min", tz="UTC")
+    df = pd.DataFrame({c: rng.normal(size=n) for c, t in SPEC if t == "float8"}, index=idx)
+    df = df.mask(rng.random(df.shape) < 0.05)  # ~5% NaN
+    df["vol_regime"] = rng.choice(np.array(["low", "mid", "high", None], dtype=object), size=n)
+    return df
+
+def legacy_rows(symbol, interval, feat):
+    def n2none(x):
+        if x is None:
+            return None
+        try:
+            xv = float(x)
+            if np.isnan(xv) or np.isinf(xv):
+                return None
+            return xv
+        except Exception:
+            return None
+    num = [c for c, t in SPEC if t == "float8"]
+    rows = []
+    for ts, r in feat.iterrows():
+        vr = r.get("vol_regime")
+        vr = None if pd.isna(vr) else str(vr)
+        rows.append((symbol, interval, ts.to_pydatetime(), *[n2none(r[c]) for c in num[:8]], vr,
+                     *[n2none(r[c]) for c in num[8:]]))
+    return rows
+
+def vectorized(symbol, interval, feat):
+    out = feat.assign(symbol=symbol, interval=interval, ts=feat.index)
+    return encode_copy_binary(out, SPEC)
+
+def bench(fn, frames, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for sym, df in frames:
+            fn(sym, "1m", df)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--symbols", type=int, default=10)
+    ap.add_argument("--hours", type=int, default=48)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    n = args.hours * 60
+    frames = [(f"SYM{i}USDT", synth(n, seed=i)) for i in range(args.symbols)]
+    total = n * args.symbols
+    t_old = bench(legacy_rows, frames, args.repeat)
+    t_new = bench(vectorized, frames, args.repeat)
+    print(f"linhas={total} ({args.hours}h x {args.symbols} símbolos)")
+    print(f"legado  iterrows+n2none : {t_old*1000:9.1f} ms | {total/t_old:12,.0f} linhas/s")
+    print(f"vetorizado COPY binário : {t_new*1000:9.1f} ms | {total/t_new:12,.0f} linhas/s | {t_old/t_new:.1f}x")
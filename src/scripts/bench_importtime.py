@@ -0,0 +1,87 @@
+import argparse, os, re, subprocess, sys, time
+from datetime import datetime, timezone
+from pathlib import Path
+import pandas as pd
+
+# Cold start (python -X importtime) de cada entry point de serviço.
+# Cada módulo é importado num interpretador novo; registra o tempo de import acumulado do módulo,
+# o wall time do processo e as dependências de topo mais pesadas. Acrescenta uma linha por entry point
+# em reports/importtime.csv (com o commit) para acompanhar regressões.
+#
+# uso: python -m src.scripts.bench_importtime [--repeat 3] [--only features_md,datahub]
+
+ENTRY_POINTS = {
+    # nome: (módulo, PYTHONPATH extra)
+    "features_md": ("src.features.engine", ""),
+    "datahub": ("features.engine", "datahub/src"),
+    "fe_v1": ("src.feature_engine.feature_engine_v1", ""),
+    "jobs": ("src.jobs.feature_engine_v1", ""),
+    "services": ("src.services.feature_engine", ""),
+    "unified": ("src.features.unified", ""),
+    "scheduler": ("src.features.scheduler", ""),
+    "multi_tf": ("src.features.multi_tf", ""),
+    "shm_ring": ("src.features.shm_ring", ""),
+    "shadow": ("src.scripts.run_shadow_v33", ""),
+    "executor": ("src.scripts.executor_testnet_v33", ""),
+    "panel": ("panel.main", ""),
+}
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(module: str, extra_path: str):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (extra_path, os.getcwd(), env.get("PYTHONPATH", "")) if p)
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                       env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    deps, target = [], None
+    for line in p.stderr.splitlines():
+        m = LINE.match(line)
+        if not m:
+            continue
+        cum, depth, name = int(m.group(2)), len(m.group(3)) // 2, m.group(4)
+        if name == module:
+            target = cum
+        elif depth <= 1:
+            deps.append((cum, name))
+    err = ""
+    if p.returncode != 0:
+        tail = [l for l in p.stderr.splitlines() if not l.startswith("import time:")]
+        err = tail[-1] if tail else f"exit {p.returncode}"
+    top = sorted(deps, reverse=True)[:5]
+    return {"import_ms": (target or 0) / 1000, "wall_ms": wall * 1000,
+            "top_deps": "; ".join(f"{n}={c/1000:.0f}ms" for c, n in top), "error": err}
+
+
+def git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", default="")
+    ap.add_argument("--out", default="reports/importtime.csv")
+    args = ap.parse_args()
+    names = [n.strip() for n in args.only.split(",") if n.strip()] or list(ENTRY_POINTS)
+
+    rev, now = git_rev(), datetime.now(timezone.utc).isoformat(timespec="seconds")
+    rows = []
+    for name in names:
+        module, extra = ENTRY_POINTS[name]
+        runs = [measure(module, extra) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["wall_ms"])
+        rows.append({"time_utc": now, "rev": rev, "entry": name, "module": module,
+                     "import_ms": round(best["import_ms"], 1), "wall_ms": round(best["wall_ms"], 1),
+                     "top_deps": best["top_deps"], "error": best["error"]})
+    rep = pd.DataFrame(rows)
+    out = Path(args.out); out.parent.mkdir(parents=True, exist_ok=True)
+    rep.to_csv(out, index=False, mode="a", header=not out.exists())
+    with pd.option_context("display.width", 220, "display.max_colwidth", 80):
+        print(rep[["entry", "import_ms", "wall_ms", "top_deps", "error"]].to_string(index=False))
+    print(f"\n[OK] acrescentado em {out}")
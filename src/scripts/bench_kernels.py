@@ -0,0 +1,165 @@
+import argparse, time
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from src.features import jit as J
+from src.features import kernels as K
+from src.features import ta_v31
+
+# Paridade e tempo dos kernels de TR/ATR/DMI/ADX/EMA:
+#   pandas (ta_v31 antigo, copiado abaixo) x NumPy (kernels.py sem numba) x Numba (src/features/jit.py)
+# Sem numba instalado, --check-py roda o código-fonte dos laços (_py_*) em Python puro contra o NumPy.
+# Sai com código 1 se alguma paridade passar da tolerância.
+# Paridade por kernel (TR, ATR simples/Wilder, DMI/ADX, EMA) sem medir tempo: python -m src.scripts.check_kernels
+#
+# uso: python -m src.scripts.bench_kernels [--rows 5000] [--repeat 20] [--check-py]
+
+TOL = 1e-12
+
+
+def legacy_atr(df, period=14):
+    high = df["high"].astype(float); low = df["low"].astype(float)
+    close_prev = df["close"].astype(float).shift(1)
+    tr = pd.concat([(high - low).abs(), (high - close_prev).abs(), (low - close_prev).abs()], axis=1).max(axis=1)
+    return tr.rolling(period).mean()
+
+
+def legacy_dx_adx(df, period=14):
+    high = df["high"].astype(float); low = df["low"].astype(float)
+    close_prev = df["close"].astype(float).shift(1)
+    up_move = high.diff(); down_move = -low.diff()
+    plus_dm = np.where((up_move > down_move) & (up_move > 0), up_move, 0.0)
+    minus_dm = np.where((down_move > up_move) & (down_move > 0), down_move, 0.0)
+    tr1 = pd.concat([(high - low).abs(), (high - close_prev).abs(), (low - close_prev).abs()], axis=1).max(axis=1)
+    atr_ = tr1.rolling(period).mean()
+    plus_di = 100 * pd.Series(plus_dm).rolling(period).sum() / atr_
+    minus_di = 100 * pd.Series(minus_dm).rolling(period).sum() / atr_
+    dx = ((plus_di - minus_di).abs() / (plus_di + minus_di)) * 100
+    return dx.rolling(period).mean()
+
+
+def legacy_ema(s, span):
+    return s.ewm(span=span, adjust=False).mean()
+
+
+def legacy_build(df, ema_fast, ema_slow, atr_period, adx_period, vwap_window):
+    out = df.copy()
+    out["ema_fast"] = legacy_ema(out["close"], ema_fast)
+    out["ema_slow"] = legacy_ema(out["close"], ema_slow)
+    out["atr"] = legacy_atr(out, atr_period)
+    out["atr_pct"] = (out["atr"] / out["close"]).clip(lower=0)
+    out["trend"] = (out["ema_fast"] > out["ema_slow"]).astype(int)
+    out["adx"] = legacy_dx_adx(out, adx_period)
+    out["vwap"] = ta_v31.vwap(out["close"], out["volume"], vwap_window)
+    out.dropna(inplace=True)
+    return out
+
+
+@contextmanager
+def numpy_only():
+    # desliga os laços compilados (kernels.py cai no caminho NumPy)
+    names = ("ewm", "ewm_rows", "ewm_mean", "rma", "true_range", "window_mean", "dmi_sma")
+    saved = {n: getattr(J, n) for n in names}
+    for n in names:
+        setattr(J, n, None)
+    try:
+        yield
+    finally:
+        for n, f in saved.items():
+            setattr(J, n, f)
+
+
+def candles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    c = 30000 + np.cumsum(rng.normal(0, 25, n))
+    o = c + rng.normal(0, 5, n)
+    h = np.maximum(o, c) + rng.random(n) * 20
+    l = np.minimum(o, c) - rng.random(n) * 20
+    return pd.DataFrame({"open": o, "high": h, "low": l, "close": c, "volume": rng.gamma(2, 10, n)})
+
+
+def best(fn, repeat):
+    t = []
+    for _ in range(repeat):
+        t0 = time.perf_counter(); r = fn(); t.append(time.perf_counter() - t0)
+    return min(t), r
+
+
+def diff(a, b):
+    a = np.asarray(a, dtype=float); b = np.asarray(b, dtype=float)
+    both = np.isfinite(a) & np.isfinite(b)
+    d = np.abs(a[both] - b[both]) / np.maximum(np.abs(a[both]), 1.0)
+    return (float(d.max()) if len(d) else 0.0), int((np.isfinite(a) != np.isfinite(b)).sum())
+
+
+def cases(df, n=14, span=20):
+    h, l, c = (df[k].to_numpy() for k in ("high", "low", "close"))
+    return {
+        # nome: (pandas legado, caminho kernels)
+        "true_range": (lambda: pd.concat([(df.high - df.low).abs(), (df.high - df.close.shift()).abs(),
+                                          (df.low - df.close.shift()).abs()], axis=1).max(axis=1),
+                       lambda: K.true_range(h, l, c)),
+        "atr_sma": (lambda: legacy_atr(df, n), lambda: K.atr(h, l, c, n, "sma")),
+        "adx_sma": (lambda: legacy_dx_adx(df, n), lambda: K.adx(h, l, c, n, "sma")),
+        "ema": (lambda: legacy_ema(df["close"], span), lambda: K.ema(c, span)),
+        "atr_wilder": (None, lambda: K.atr(h, l, c, n, "wilder")),
+        "adx_wilder": (None, lambda: K.adx(h, l, c, n, "wilder")),
+        "build_features": (lambda: legacy_build(df, 12, 26, n, n, 20).to_numpy(),
+                           lambda: ta_v31.build_features(df, 12, 26, n, n, 20).to_numpy()),
+    }
+
+
+def check_py(df, n=14):
+    # lógica dos laços numba executada em Python puro x NumPy
+    h, l, c = (df[k].to_numpy() for k in ("high", "low", "close"))
+    x = df["close"].to_numpy().copy(); x[::97] = np.nan
+    with numpy_only():
+        ref = {
+            "ewm": K.ewm(x, 0.1), "ewm_mean": K.ewm_mean(x, 1 / n, n), "rma": K.rma(x[1:], n),
+            "true_range": K.true_range(h, l, c), "atr_sma": K.atr(h, l, c, n, "sma"),
+            "dmi_sma": np.column_stack(K.dmi(h, l, c, n, "sma")),
+        }
+    got = {
+        "ewm": J._py_ewm(x, 0.1), "ewm_mean": J._py_ewm_mean(x, 1 / n, n), "rma": J._py_rma(x[1:], n),
+        "true_range": J._py_true_range(h, l, c), "atr_sma": J._py_window_mean(J._py_true_range(h, l, c), n),
+        "dmi_sma": np.column_stack(J._py_dmi_sma(h, l, c, n)[1:]),
+    }
+    bad = False
+    for k in ref:
+        d, nan = diff(ref[k], got[k])
+        bad |= d > TOL or nan > 0
+        print(f"  {k:12s} max_rel_diff={d:.2e} nan_mismatch={nan}")
+    return not bad
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--check-py", action="store_true")
+    args = ap.parse_args()
+    df = candles(args.rows)
+    ok = True
+    print(f"numba={'sim' if J.NUMBA else 'não'} rows={args.rows}")
+    if J.NUMBA:
+        cases(df)["adx_sma"][1]()   # compila antes de medir
+
+    for name, (old, new) in cases(df).items():
+        t_old, r_old = best(old, args.repeat) if old is not None else (np.nan, None)
+        with numpy_only():
+            t_np, r_np = best(new, args.repeat)
+        t_nb, r_nb = best(new, args.repeat) if J.NUMBA else (np.nan, r_np)
+        line = f"{name:15s} pandas {t_old*1000:8.3f} ms | numpy {t_np*1000:8.3f} ms | numba {t_nb*1000:8.3f} ms"
+        if r_old is not None:
+            d, nan = diff(r_old, r_np); ok &= d <= TOL and nan == 0
+            line += f" | pandas~numpy {d:.1e}/{nan}"
+        if J.NUMBA and name != "build_features":
+            d, nan = diff(r_np, r_nb); ok &= d <= TOL and nan == 0
+            line += f" | numpy~numba {d:.1e}/{nan}"
+        print(line)
+
+    if args.check_py:
+        print("laços _py_* (fonte do numba) x NumPy:")
+        ok &= check_py(df.iloc[:2000])
+    print("[OK] paridade" if ok else "[FALHA] paridade fora da tolerância")
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,84 @@
+import argparse, time
+import numpy as np
+import pandas as pd
+from src.features.zscore import zscore_by_group, group_zscore, RollingGroupZ
+
+# Z-score por regime: implementação atual (groupby.transform / máscaras df.loc) x kernel 2D.
+# uso: python -m src.scripts.bench_zscore [--rows 3000] [--cols 7] [--repeat 5]
+
+
+def data(n, k, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, k)) * rng.uniform(1e-3, 50, k)
+    X[rng.random((n, k)) < 0.02] = np.nan
+    g = rng.choice(np.array(["low", "mid", "high", None], dtype=object), n, p=[.32, .32, .32, .04])
+    return X, g
+
+
+def legacy_rolling(X, g):
+    # src/features/engine.py (compute_features_from_1m)
+    out = pd.DataFrame(X, columns=[f"c{i}" for i in range(X.shape[1])])
+    out["vol_regime"] = g
+    def zscore(s):
+        m = s.rolling(200, min_periods=50).mean()
+        sd = s.rolling(200, min_periods=50).std()
+        return (s - m) / sd
+    return np.column_stack([out.groupby("vol_regime")[c].transform(zscore) for c in out.columns[:-1]])
+
+
+def legacy_masks(X, g):
+    # datahub/src/features/engine.py (compute_features)
+    df = pd.DataFrame(X, columns=[f"c{i}" for i in range(X.shape[1])])
+    cols = list(df.columns)
+    df["vol_regime"] = g
+    for reg in ["low", "mid", "high"]:
+        m = df["vol_regime"] == reg
+        for col in cols:
+            mu = df.loc[m, col].mean()
+            sd = df.loc[m, col].std()
+            denom = sd if (pd.notna(sd) and sd and sd > 0) else 1.0
+            df.loc[m, f"z_{col}"] = (df.loc[m, col] - mu) / denom
+    return df[[f"z_{c}" for c in cols]].to_numpy(dtype=float)
+
+
+def best(fn, repeat):
+    t = []
+    for _ in range(repeat):
+        t0 = time.perf_counter(); r = fn(); t.append(time.perf_counter() - t0)
+    return min(t), r
+
+
+def diff(a, b):
+    both = np.isfinite(a) & np.isfinite(b)
+    return float(np.max(np.abs(a[both] - b[both]))) if both.any() else 0.0, int((np.isfinite(a) != np.isfinite(b)).sum())
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=3000)
+    ap.add_argument("--cols", type=int, default=7)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--live", type=int, default=50, help="barras novas no caminho incremental")
+    args = ap.parse_args()
+    X, g = data(args.rows, args.cols)
+
+    t_old, ref = best(lambda: legacy_rolling(X, g), args.repeat)
+    t_new, new = best(lambda: zscore_by_group(X, g), args.repeat)
+    d, nan = diff(ref, new)
+    print(f"rolling por regime : groupby.transform {t_old*1000:8.2f} ms | kernel 2D {t_new*1000:7.2f} ms "
+          f"| {t_old/t_new:5.1f}x | max|d|={d:.2e} nan_mismatch={nan}")
+
+    t_old, ref = best(lambda: legacy_masks(X, g), args.repeat)
+    t_new, new = best(lambda: group_zscore(X, g), args.repeat)
+    d, nan = diff(ref, new)
+    print(f"janela por regime  : máscaras df.loc    {t_old*1000:8.2f} ms | kernel 2D {t_new*1000:7.2f} ms "
+          f"| {t_old/t_new:5.1f}x | max|d|={d:.2e} nan_mismatch={nan}")
+
+    # ao vivo: recalcular a janela inteira x atualizar só as barras novas
+    k = args.rows - args.live
+    full = zscore_by_group(X, g)
+    st = RollingGroupZ(args.cols); st.seed(X[:k], g[:k])
+    t0 = time.perf_counter(); inc = st.update(X[k:], g[k:]); t_inc = time.perf_counter() - t0
+    d, nan = diff(full[k:], inc)
+    print(f"incremental ({args.live} barras): {t_inc*1000:.2f} ms ({t_inc/args.live*1e6:.0f} us/barra) "
+          f"| max|d|={d:.2e} nan_mismatch={nan}")
@@ -0,0 +1,108 @@
+import argparse
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from src.features import jit as J
+from src.features import kernels as K
+from src.scripts.bench_kernels import candles, diff, legacy_atr, legacy_dx_adx, legacy_ema, numpy_only
+
+# Paridade dos kernels de TR/ATR/DMI/ADX/EMA, sem medir tempo (o tempo fica em bench_kernels):
+#   pandas (ta_v31 antigo) x NumPy (kernels.py sem laços compilados) x Numba (src/features/jit.py;
+#   sem numba instalado, os laços _py_* que ele compilaria rodam em Python puro)
+# Cada kernel tem a sua tolerância (diferença relativa, como bench_kernels.diff): 0 = bit a bit.
+# Médias/somas móveis ficam em TOL: o NumPy usa soma acumulada, o laço e o pandas somam a janela,
+# e a ordem das somas muda o último bit. Sai com código 1 se algum par divergir.
+#
+# uso: python -m src.scripts.check_kernels [--rows 5000] [--seeds 3]
+
+TOL = 1e-12
+LOOPS = ("ewm", "ewm_rows", "ewm_mean", "rma", "true_range", "window_mean", "dmi_sma")
+
+
+@contextmanager
+def compiled():
+    # caminho do numba; sem ele, os mesmos laços (_py_*) em Python puro
+    if J.NUMBA:
+        yield
+        return
+    saved = {n: getattr(J, n) for n in LOOPS}
+    for n in LOOPS:
+        setattr(J, n, getattr(J, f"_py_{n}"))
+    try:
+        yield
+    finally:
+        for n, f in saved.items():
+            setattr(J, n, f)
+
+
+def legacy_tr(df):
+    high = df["high"].astype(float); low = df["low"].astype(float)
+    close_prev = df["close"].astype(float).shift(1)
+    return pd.concat([(high - low).abs(), (high - close_prev).abs(), (low - close_prev).abs()], axis=1).max(axis=1)
+
+
+def legacy_rma(s, n):
+    # Wilder em pandas: semente = média das n primeiras válidas, depois ewm(alpha=1/n, adjust=False)
+    x = s.to_numpy(dtype=float)
+    v = int(np.flatnonzero(np.isfinite(x))[0])
+    seeded = np.r_[np.full(v + n - 1, np.nan), x[v:v + n].mean(), x[v + n:]]
+    return pd.Series(seeded, index=s.index).ewm(alpha=1.0 / n, adjust=False).mean()
+
+
+def legacy_dmi_wilder(df, n):
+    high = df["high"].astype(float); low = df["low"].astype(float)
+    up = high.diff(); dn = -low.diff()
+    plus = pd.Series(np.where((up > dn) & (up > 0), up, 0.0)); minus = pd.Series(np.where((dn > up) & (dn > 0), dn, 0.0))
+    plus[0] = minus[0] = np.nan
+    tr = legacy_tr(df).reset_index(drop=True); tr[0] = np.nan
+    str_ = legacy_rma(tr, n)
+    pdi = 100.0 * legacy_rma(plus, n) / str_
+    mdi = 100.0 * legacy_rma(minus, n) / str_
+    dx = 100.0 * (pdi - mdi).abs() / (pdi + mdi)
+    dx[~np.isfinite(dx) & pdi.notna()] = 0.0
+    return np.column_stack([pdi, mdi, legacy_rma(dx, n)])
+
+
+def cases(df, n=14, span=20):
+    """nome: (pandas legado ou None, kernel, tolerância pandas~numpy, tolerância numpy~numba)."""
+    h, l, c = (df[k].to_numpy() for k in ("high", "low", "close"))
+    return {
+        "TR": (lambda: legacy_tr(df), lambda: K.true_range(h, l, c), 0.0, 0.0),
+        "ATR simples": (lambda: legacy_atr(df, n), lambda: K.atr(h, l, c, n, "sma"), TOL, TOL),
+        # pandas faz (1-a)*y + a*x, o kernel y + a*(x-y): mesma recursão, arredondamento diferente
+        "ATR Wilder": (lambda: legacy_rma(legacy_tr(df), n), lambda: K.atr(h, l, c, n, "wilder"), TOL, 0.0),
+        "ADX simples": (lambda: legacy_dx_adx(df, n), lambda: K.adx(h, l, c, n, "sma"), TOL, TOL),
+        "DMI simples": (None, lambda: np.column_stack(K.dmi(h, l, c, n, "sma")), None, TOL),
+        "DMI/ADX Wilder": (lambda: legacy_dmi_wilder(df, n), lambda: np.column_stack(K.dmi(h, l, c, n, "wilder")), TOL, 0.0),
+        "EMA": (lambda: legacy_ema(df["close"], span), lambda: K.ema(c, span), 0.0, 0.0),
+    }
+
+
+def check(df) -> bool:
+    ok = True
+    for name, (old, new, tol_old, tol_jit) in cases(df).items():
+        with numpy_only():
+            r_np = new()
+        with compiled():
+            r_jit = new()
+        line = f"  {name:15s}"
+        if old is not None:
+            d, nan = diff(old(), r_np); good = d <= tol_old and nan == 0; ok &= good
+            line += f" | pandas~numpy {d:.1e}/{nan} (tol {tol_old:.0e}) {'ok' if good else 'FALHA'}"
+        d, nan = diff(r_np, r_jit); good = d <= tol_jit and nan == 0; ok &= good
+        line += f" | numpy~{'numba' if J.NUMBA else 'laços _py_*'} {d:.1e}/{nan} (tol {tol_jit:.0e}) {'ok' if good else 'FALHA'}"
+        print(line)
+    return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--seeds", type=int, default=3)
+    args = ap.parse_args()
+    ok = True
+    for seed in range(args.seeds):
+        print(f"numba={'sim' if J.NUMBA else 'não'} rows={args.rows} seed={seed}")
+        ok &= check(candles(args.rows, seed=seed))
+    print("[OK] paridade dos kernels" if ok else "[FALHA] paridade dos kernels")
+    raise SystemExit(0 if ok else 1)
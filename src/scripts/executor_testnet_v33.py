@@ -12,7 +12,9 @@ from urllib.parse import urlencode
 from datetime import datetime, timezone
 import pandas as pd
 from pathlib import Path
-from src.features.ta_v31 import build_features
+from src.features.spec import strategy_specs
+from src.features.store import FeatureStore
+from src.features.shm_ring import attach_fresh
 
 def base_url(testnet: bool):
     return "https://testnet.binancefuture.com" if testnet else "https://fapi.binance.com"
@@ -106,25 +108,6 @@ def place_oco_exits(symbol, side, qty, tp, sl, key, secret, testnet):
     qty = round(qty, 6)
     tp_r = api_post(f"{base}/fapi/v1/order", {
         "symbol": symbol, "side": close_side, "type": "TAKE_PROFIT_MARKET",
-# === RISK FILL (auto-injetado) ===
-    try:
-        _pnl = realized_pnl_usdt
-    except NameError:
-        try:
-            _pnl = realized_pnl
-        except NameError:
-            try:
-                _pnl = pnl_usdt
-            except NameError:
-                try:
-                    _pnl = pnl
-                except NameError:
-                    _pnl = 0.0
-    try:
-        _risk_report_fill(_pnl)
-    except Exception as _e:
-        print(f"[RISK] Falha ao chamar _risk_report_fill: {_e}")
-    # === /RISK FILL ===
         "stopPrice": f"{tp:.2f}", "closePosition": "true", "reduceOnly": "true",
         "newClientOrderId": f"tp-{int(time.time()*1000)}"
     }, key, secret)
@@ -165,14 +148,17 @@ if __name__ == "__main__":
     intents_csv = logs / f"live_intents_{sym}_{tf}.csv"
     state_file  = logs / f"live_state_{sym}_{tf}.json"
     state = {"pos": 0, "qty": 0.0, "last_bar": None}
+    inds = cfg["indicators"]
+    store = FeatureStore(strategy_specs(inds["ema_fast"], inds["ema_slow"], inds["atr_period"],
+                                        inds["adx_period"], inds.get("vwap_window",20)))
     if state_file.exists():
         try: state.update(json.loads(state_file.read_text()))
         except: pass
 
     KILL_SWITCH_MDD_PCT = 8.0  # corta se MDD passar disso (teste)
-print(f"[executor] START sym={sym} tf={tf} testnet={testnet} dry_run={dry_run}")
+    print(f"[executor] START sym={sym} tf={tf} testnet={testnet} dry_run={dry_run}")
     mdd_accum = 0.0
-while True:
+    while True:
         try:
             limit = max(200, hist_min // (1 if tf.endswith("m") else 5))
             url = f"{base_url(testnet)}/fapi/v1/klines"
@@ -186,9 +172,14 @@ while True:
                 raw[c]=pd.to_numeric(raw[c], errors="coerce")
             raw=raw.sort_values("close_time").reset_index(drop=True)
 
-            feats = build_features(raw, cfg["indicators"]["ema_fast"], cfg["indicators"]["ema_slow"],
-                                   cfg["indicators"]["atr_period"], cfg["indicators"]["adx_period"],
-                                   cfg["indicators"].get("vwap_window",20))
+            # features do ring compartilhado (publicador src.features.shm_ring) se estiver em dia com os
+            # klines; senão do store local
+            ring = attach_fresh(sym, tf, store.version, raw["open_time"].iloc[-1])
+            if ring is not None:
+                feats = ring.frame(limit).dropna().reset_index(drop=True); ring.close()
+            else:
+                store.refresh_from_candles(sym, tf, raw)
+                feats = store.range(sym, tf, start=raw["open_time"].iloc[0], version=store.version)
 
             ex   = cfg["execution"]; dec = decide_and_size(feats, cfg)
             bar_close = raw.iloc[-1]["close_time"].isoformat()
@@ -233,7 +224,7 @@ while True:
                     "dry_run": dry_run
                 }
                 mdd_accum = max(mdd_accum, 0.0)  # placeholder simples; plugue PnL real aqui
-pd.DataFrame([row]).to_csv(intents_csv, index=False, mode="a", header=not intents_csv.exists())
+                pd.DataFrame([row]).to_csv(intents_csv, index=False, mode="a", header=not intents_csv.exists())
                 print(f"[executor] {row['action']} | qty {row['qty']} | px {row['price']} | tp/sl {row['tp']}/{row['sl']} | dry_run={dry_run}")
 
             state["last_bar"] = bar_close
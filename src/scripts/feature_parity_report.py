@@ -0,0 +1,124 @@
+import argparse, ast
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.features.unified import compute, candles_to_arrays
+from src.features.sinks import LAYOUTS
+
+# Relatório de paridade: engine unificado x os 4 engines legados, coluna a coluna de cada layout.
+# Os engines legados são carregados por AST (só imports + constantes + funções), sem os efeitos
+# colaterais de import (create_engine/CREATE TABLE na carga do módulo).
+#
+# uso: python -m src.scripts.feature_parity_report [--csv data/BTCUSDT_5m_60d.csv] [--out reports/feature_parity.csv]
+
+LEGACY = {
+    # layout: (arquivo, função, chamada)
+    "md": ("src/features/engine.py", ["compute_features_from_1m"],
+           lambda ns, df: ns["compute_features_from_1m"](df, None)),
+    "datahub": ("datahub/src/features/engine.py", ["compute_features"],
+                lambda ns, df: ns["compute_features"](df.reset_index())),
+    "fe_v1": ("src/feature_engine/feature_engine_v1.py", ["vwap", "slope", "zroll", "build"],
+              lambda ns, df: ns["build"](df.rename_axis("ts").reset_index())),
+    "jobs": ("src/jobs/feature_engine_v1.py", ["compute_features"],
+             lambda ns, df: ns["compute_features"](df.rename_axis("ts").reset_index().assign(symbol="X", timeframe="tf"))),
+    "services": ("src/services/feature_engine.py", ["_ema", "add_indicators"],
+                 lambda ns, df: ns["add_indicators"](df.rename_axis("ts").reset_index())),
+}
+
+
+def load_legacy(path: str, names):
+    tree = ast.parse(Path(path).read_text(encoding="utf-8"))
+    ns = {}
+    for node in tree.body:
+        keep = isinstance(node, (ast.Import, ast.ImportFrom)) or \
+            (isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant)) or \
+            (isinstance(node, ast.FunctionDef) and node.name in names)
+        if not keep:
+            continue
+        try:
+            exec(compile(ast.Module([node], []), path, "exec"), ns)
+        except Exception:
+            pass  # dependência ausente (ta, pandas_ta, sqlalchemy...) -> a função falha ao rodar
+    return ns
+
+
+def synth(n: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    c = 60000 + np.cumsum(rng.normal(0, 25, n))
+    o = np.r_[c[0], c[:-1]]
+    h = np.maximum(o, c) + rng.random(n) * 20
+    l = np.minimum(o, c) - rng.random(n) * 20
+    v = rng.gamma(2.0, 50.0, n)
+    idx = pd.date_range("2025-01-01", periods=n, freq="5min", tz="UTC", name="ts")
+    return pd.DataFrame({"open": o, "high": h, "low": l, "close": c, "volume": v}, index=idx)
+
+
+def compare(a, b) -> dict:
+    a = pd.to_numeric(pd.Series(a), errors="coerce").to_numpy(dtype=float)
+    b = pd.to_numeric(pd.Series(b), errors="coerce").to_numpy(dtype=float)
+    both = np.isfinite(a) & np.isfinite(b)
+    out = {"n": int(both.sum()), "nan_mismatch": int((np.isfinite(a) != np.isfinite(b)).sum())}
+    if both.any():
+        d = np.abs(a[both] - b[both])
+        scale = np.maximum(np.abs(b[both]), 1e-12)
+        out.update(max_abs=float(d.max()), max_rel=float(np.max(d / scale)))
+    if both.sum() >= 2 and np.std(a[both]) > 0 and np.std(b[both]) > 0:
+        out["corr"] = float(np.corrcoef(a[both], b[both])[0, 1])
+    return out
+
+
+def report(df: pd.DataFrame) -> pd.DataFrame:
+    rows = []
+    for name, layout in LAYOUTS.items():
+        path, funcs, call = LEGACY[name]
+        try:
+            legacy = call(load_legacy(path, funcs), df.copy())
+        except Exception as e:
+            rows.append({"layout": name, "column": "*", "status": f"indisponível: {type(e).__name__}: {e}"})
+            continue
+        if legacy is None or len(legacy) == 0:
+            rows.append({"layout": name, "column": "*", "status": "legado vazio"})
+            continue
+        feats = compute(candles_to_arrays(df), layout.features())
+        # jobs devolve só a última barra; os demais a série inteira alinhada ao df
+        tail = len(legacy)
+        for col, f, pgtype, scale in layout.columns:
+            if col not in legacy.columns:
+                rows.append({"layout": name, "column": col, "feature": f, "status": "coluna ausente no legado"})
+                continue
+            new = feats[f][-tail:]
+            old = np.asarray(legacy[col])[-tail:]
+            if pd.isna(old).all():
+                rows.append({"layout": name, "column": col, "feature": f, "status": "legado só NaN"})
+                continue
+            if pgtype == "text":
+                m = pd.notna(old) & pd.notna(new)
+                agree = float(np.mean(np.asarray(old[m], dtype=str) == np.asarray(new[m], dtype=str))) if m.any() else np.nan
+                rows.append({"layout": name, "column": col, "feature": f, "status": "ok", "label_agreement": agree})
+                continue
+            rows.append({"layout": name, "column": col, "feature": f, "status": "ok",
+                         **compare(new * scale, old)})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv", default=None, help="candles (open_time, open, high, low, close, volume)")
+    ap.add_argument("--bars", type=int, default=3000)
+    ap.add_argument("--out", default="reports/feature_parity.csv")
+    args = ap.parse_args()
+
+    if args.csv:
+        raw = pd.read_csv(args.csv, parse_dates=["open_time"])
+        df = raw.set_index(pd.DatetimeIndex(raw["open_time"], name="ts"))[["open", "high", "low", "close", "volume"]]
+        df = df.astype(float).tail(args.bars)
+    else:
+        df = synth(args.bars)
+    # datahub/md esperam a coluna de tempo como open_time
+    df.index.name = "open_time"
+    rep = report(df)
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    rep.to_csv(args.out, index=False)
+    with pd.option_context("display.width", 200, "display.max_rows", 200):
+        print(rep.to_string(index=False))
+    print(f"\n[OK] salvo {args.out}")
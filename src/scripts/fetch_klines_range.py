@@ -1,6 +1,7 @@
 import math
 import pandas as pd
 from datetime import datetime, timedelta, timezone
+from src.backtest.history import HistoryStore
 from src.exchange.binance_client import client
 
 # Este script usa o cliente já existente (você já configurou no projeto base)
@@ -39,12 +40,20 @@ def fetch_klines_range(symbol: str, interval: str, days: int) -> pd.DataFrame:
     return out
 
 if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tf", default=None, help="padrão: timeframe do settings_v3 (ex.: --tf 1m para o intrabar)")
+    ap.add_argument("--days", type=int, default=None)
+    args = ap.parse_args()
     cfg = yaml.safe_load(open("config/settings_v3.yml"))
     sym = cfg["symbol"]
-    tf = cfg["timeframe"]
-    days = cfg["history_days"]
+    tf = args.tf or cfg["timeframe"]
+    days = args.days or cfg["history_days"]
 
     df = fetch_klines_range(sym, tf, days)
     out = f"data/{sym}_{tf}_{days}d.csv"
     df.to_csv(out, index=False)
     print(f"OK: salvo {len(df)} candles em {out}")
+    # histórico colunar (src/backtest/history.py): mescla com o que já existe, usado pelos backtests v31+
+    n = HistoryStore().write(sym, tf, df)
+    print(f"OK: store {HistoryStore().path(sym, tf)} com {n} candles")
@@ -1,7 +1,10 @@
 import yaml, pandas as pd
-from pathlib import Path
 from math import sqrt
-from src.features.ta_v31 import build_features
+from pathlib import Path
+from src.backtest.history import locate
+from src.backtest.result_cache import CACHE
+from src.features.spec import strategy_specs
+from src.features.store import FeatureStore
 from src.strategies.orchestrator_v33 import run_backtest_orchestrated
 
 def extract_pnls(raw):
@@ -39,13 +42,18 @@ if __name__ == "__main__":
           }
     sym = cfg["symbols"][0]; tf=cfg.get("timeframe","5m"); days=cfg.get("history_days",60)
     inds = cfg["indicators"]
-    path = Path(f"data/{sym}_{tf}_{days}d.csv")
-    if not path.exists():
-        print(f"faltam dados: {path}"); raise SystemExit(1)
+    src = locate(sym, tf, days)
+    if src is None:
+        print(f"faltam dados: {sym} {tf} {days}d"); raise SystemExit(1)
+
+    def run():
+        df = src.load()
+        store = FeatureStore(strategy_specs(inds["ema_fast"], inds["ema_slow"], inds["atr_period"],
+                                            inds["adx_period"], inds.get("vwap_window",20)), capacity=len(df))
+        store.refresh_from_candles(sym, tf, df)
+        return run_backtest_orchestrated(store.range(sym, tf, version=store.version), cfg)
 
-    df = pd.read_csv(path, parse_dates=["open_time","close_time"])
-    feats = build_features(df, inds["ema_fast"], inds["ema_slow"], inds["atr_period"], inds["adx_period"], inds.get("vwap_window",20))
-    res = run_backtest_orchestrated(feats, cfg)
+    res = CACHE.run(src.fingerprint(), cfg, run, tag="store+orch_v33")
     pnls = extract_pnls(res.get("trades"))
     pos = sum(x for x in pnls if x>0); neg = -sum(x for x in pnls if x<0)
     pf = (pos/(neg if neg>1e-9 else 1e-9)) if pnls else 0.0
@@ -2,10 +2,13 @@ import yaml, pandas as pd
 from pathlib import Path
 from math import sqrt
 from copy import deepcopy
-from src.features.ta_v31 import build_features
+from src.backtest.history import locate
+from src.backtest.result_cache import CACHE as RESULTS
+from src.features.batch import IndicatorCache, build_features_cached
 from src.strategies.orchestrator_v31 import run_backtest_orchestrated
 
 BASE = yaml.safe_load(open("config/settings_v31.yml"))
+CACHE = IndicatorCache()   # presets que repetem períodos reaproveitam os indicadores
 
 def merge(base, override):
     out = deepcopy(base)
@@ -51,13 +54,15 @@ def run_one(cfg):
     days = cfg.get("history_days",60)
     inds = cfg["indicators"]
     for sym in symbols:
-        path = Path(f"data/{sym}_{tf}_{days}d.csv")
-        if not path.exists():
-            rows.append({"symbol": sym, "error": f"missing {path}"})
+        src = locate(sym, tf, days)
+        if src is None:
+            rows.append({"symbol": sym, "error": f"missing {sym}_{tf}_{days}d"})
             continue
-        df = pd.read_csv(path, parse_dates=["open_time","close_time"])
-        feats = build_features(df, inds["ema_fast"], inds["ema_slow"], inds["atr_period"], inds["adx_period"], inds.get("vwap_window",20))
-        res = run_backtest_orchestrated(feats, cfg)
+        def run(src=src):
+            df = src.load()
+            feats = build_features_cached(df, inds["ema_fast"], inds["ema_slow"], inds["atr_period"], inds["adx_period"], inds.get("vwap_window",20), CACHE)
+            return run_backtest_orchestrated(feats, cfg)
+        res = RESULTS.run(src.fingerprint(), cfg, run, tag="ta_v31+orch_v31")
         pnls = extract_pnls(res.get("trades") or res.get("trade_log") or res.get("executions"))
         pos = sum(x for x in pnls if x>0); neg = -sum(x for x in pnls if x<0)
         pf = (pos/(neg if neg>1e-9 else 1e-9)) if pnls else 0.0
@@ -2,7 +2,9 @@ import time, yaml, pandas as pd, argparse
 from pathlib import Path
 from datetime import datetime, timezone
 import requests
-from src.features.ta_v31 import build_features
+from src.features.spec import strategy_specs
+from src.features.store import FeatureStore
+from src.features.shm_ring import attach_fresh
 
 def base_url(testnet: bool):
     return "https://testnet.binancefuture.com" if testnet else "https://fapi.binance.com"
@@ -48,20 +50,30 @@ if __name__ == "__main__":
     outdir = Path("logs"); outdir.mkdir(parents=True, exist_ok=True)
     outcsv = outdir / f"shadow_{sym}_{tf}.csv"
     last_bar = None
+    store = FeatureStore(strategy_specs(inds["ema_fast"], inds["ema_slow"], inds["atr_period"],
+                                        inds["adx_period"], inds.get("vwap_window",20)))
 
     print(f"[shadow] symbol={sym} tf={tf} testnet={testnet} poll={poll}s history={hist_min}m")
     while True:
         try:
             limit = max(200, hist_min // (1 if tf.endswith("m") else 5))
+            # com publicador ativo (python -m src.features.shm_ring) e em dia com os klines lê o ring
+            # compartilhado; senão calcula localmente
+            # (reanexa a cada poll: um publicador reiniciado recria o segmento)
             raw = fetch_klines(sym, tf, limit, testnet)
-            feats = build_features(raw, inds["ema_fast"], inds["ema_slow"], inds["atr_period"], inds["adx_period"], inds.get("vwap_window",20))
+            ring = attach_fresh(sym, tf, store.version, raw["open_time"].iloc[-1])
+            if ring is not None:
+                feats = ring.frame(limit).dropna().reset_index(drop=True); ring.close()
+            else:
+                store.refresh_from_candles(sym, tf, raw)
+                feats = store.range(sym, tf, start=raw["open_time"].iloc[0], version=store.version)
+            bar_close = raw.iloc[-1]["close_time"]
             # métrica simples de sanity: soma de PnLs do bloco
             from src.strategies.orchestrator_v33 import run_backtest_orchestrated
             res = run_backtest_orchestrated(feats, cfg)
             pnls = extract_pnls(res.get("trades"))
             pnl_total = float(sum(pnls))
 
-            bar_close = raw.iloc[-1]["close_time"]
             if bar_close != last_bar:
                 last_bar = bar_close
                 row = {
@@ -30,6 +30,12 @@ DB_USER = os.getenv("DB_USER", "botfutures_user")
 DB_PASS = os.getenv("DB_PASSWORD", "postgres")
 
 CANDLES_TABLE = os.getenv("CANDLES_TABLE", "candles")  # ajuste se sua tabela tiver outro nome
+CATALOG_REFRESH_SEC = int(os.getenv("FEATURE_CATALOG_REFRESH_SEC", "600"))
+
+# Barras anteriores necessárias para recalcular exatamente a última barra:
+# ADX = atr(14) -> soma(14) -> média(14) do DX; slope_vwap = vwap(20) + shift(10); vol = log-ret + std(20).
+# EMAs são recursivas e continuam a partir do valor já gravado (semente), não de padding.
+WARMUP_BARS = max(3 * ADX_LEN, VWAP_WIN + SLOPE_WIN, VOL_WIN + 1)
 
 engine = create_engine(
     f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
@@ -39,6 +45,72 @@ engine = create_engine(
 def log(msg):
     print(time.strftime("%Y-%m-%d %H:%M:%S"), "-", msg, flush=True)
 
+def ensure_watermark_tables():
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS feature_series (
+              symbol      VARCHAR(20) NOT NULL,
+              timeframe   VARCHAR(10) NOT NULL,
+              added_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              PRIMARY KEY (symbol, timeframe)
+            );
+            CREATE TABLE IF NOT EXISTS feature_watermark (
+              symbol      VARCHAR(20) NOT NULL,
+              timeframe   VARCHAR(10) NOT NULL,
+              last_ts     TIMESTAMPTZ NOT NULL,
+              updated_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              PRIMARY KEY (symbol, timeframe)
+            );
+        """))
+
+def refresh_catalog():
+    # loose index scan: salta de par em par pelo índice (symbol, timeframe, ...) em vez de DISTINCT na tabela toda
+    q = text(f"""
+        WITH RECURSIVE s AS (
+          (SELECT symbol, timeframe FROM {CANDLES_TABLE} ORDER BY symbol, timeframe LIMIT 1)
+          UNION ALL
+          SELECT n.symbol, n.timeframe FROM s, LATERAL (
+            SELECT symbol, timeframe FROM {CANDLES_TABLE}
+             WHERE (symbol, timeframe) > (s.symbol, s.timeframe)
+             ORDER BY symbol, timeframe LIMIT 1
+          ) n
+        )
+        INSERT INTO feature_series (symbol, timeframe)
+        SELECT symbol, timeframe FROM s
+        ON CONFLICT (symbol, timeframe) DO NOTHING
+    """)
+    with engine.begin() as conn:
+        conn.execute(q)
+
+def load_catalog():
+    q = text("SELECT symbol, timeframe FROM feature_series ORDER BY symbol, timeframe")
+    return pd.read_sql(q, engine)
+
+def load_watermarks() -> dict:
+    df = pd.read_sql(text("SELECT symbol, timeframe, last_ts FROM feature_watermark"), engine)
+    return {(r.symbol, r.timeframe): pd.Timestamp(r.last_ts) for r in df.itertuples(index=False)}
+
+def fetch_candles_after(symbol, timeframe, after_ts):
+    q = text(f"""
+        SELECT ts, open, high, low, close, volume
+        FROM {CANDLES_TABLE}
+        WHERE symbol=:s AND timeframe=:tf AND ts > :after
+        ORDER BY ts
+    """)
+    return pd.read_sql(q, engine, params={"s": symbol, "tf": timeframe, "after": after_ts})
+
+def fetch_warmup_tail(symbol, timeframe, until_ts, bars=WARMUP_BARS):
+    # cold start: reconstrói o tail em cache a partir das últimas barras <= watermark + EMAs já gravadas
+    q = text(f"""
+        SELECT c.ts, c.open, c.high, c.low, c.close, c.volume, f.ema_fast, f.ema_slow
+        FROM (SELECT ts, open, high, low, close, volume FROM {CANDLES_TABLE}
+               WHERE symbol=:s AND timeframe=:tf AND ts <= :until
+               ORDER BY ts DESC LIMIT :n) c
+        LEFT JOIN features f ON f.symbol=:s AND f.timeframe=:tf AND f.ts=c.ts
+        ORDER BY c.ts
+    """)
+    return pd.read_sql(q, engine, params={"s": symbol, "tf": timeframe, "until": until_ts, "n": bars})
+
 def fetch_symbols_timeframes():
     q = text(f"""
         SELECT DISTINCT symbol, timeframe
@@ -75,13 +147,21 @@ def fetch_candles(symbol, timeframe, since_ts=None, pad_bars=200):
         df = df.iloc[-(pad_bars + SLOW_EMA + VOL_WIN + 10):].copy()
     return df
 
-def add_indicators(df: pd.DataFrame) -> pd.DataFrame:
+def _ema(close: pd.Series, span: int, seed=None) -> pd.Series:
+    # adjust=False começa em y0 = x0; trocar x0 pela EMA já conhecida da 1ª barra continua a série exata
+    if seed is not None and pd.notna(seed):
+        close = close.copy()
+        close.iloc[0] = seed
+    return close.ewm(span=span, adjust=False).mean()
+
+def add_indicators(df: pd.DataFrame, seeds: dict | None = None) -> pd.DataFrame:
     if df.empty:
         return df
     df = df.copy()
+    seeds = seeds or {}
     # EMAs
-    df["ema_fast"] = df["close"].ewm(span=FAST_EMA, adjust=False).mean()
-    df["ema_slow"] = df["close"].ewm(span=SLOW_EMA, adjust=False).mean()
+    df["ema_fast"] = _ema(df["close"], FAST_EMA, seeds.get("ema_fast"))
+    df["ema_slow"] = _ema(df["close"], SLOW_EMA, seeds.get("ema_slow"))
 
     # VWAP de janela (se quiser VWAP cumulativo, trocar por cumulativo)
     pv = df["close"] * df["volume"].replace(0, np.nan)
@@ -126,7 +206,7 @@ def add_indicators(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
-def upsert_features(symbol, timeframe, fdf: pd.DataFrame):
+def upsert_features(symbol, timeframe, fdf: pd.DataFrame, watermark: bool = False):
     if fdf.empty:
         return 0
     cols = ["symbol","timeframe","ts","ema_fast","ema_slow","vwap","adx","atr","vol_logret","slope_ema_fast","slope_vwap","regime"]
@@ -184,6 +264,12 @@ def upsert_features(symbol, timeframe, fdf: pd.DataFrame):
         if batch:
             conn.execute(text(insert_sql), batch)
             count += len(batch)
+        if count and watermark:
+            conn.execute(text("""
+                INSERT INTO feature_watermark (symbol, timeframe, last_ts, updated_at)
+                VALUES (:s, :tf, :ts, NOW())
+                ON CONFLICT (symbol, timeframe) DO UPDATE SET last_ts=EXCLUDED.last_ts, updated_at=NOW()
+            """), {"s": symbol, "tf": timeframe, "ts": fdf["ts"].max()})
         return count
 
 def process_once(lookback_bars=3000):
@@ -213,12 +299,87 @@ def process_once(lookback_bars=3000):
         except Exception as e:
             log(f"[{s} {tf}] ERRO: {e}")
 
+FEATURE_COLS = ["ema_fast","ema_slow","vwap","adx","atr","vol_logret","slope_ema_fast","slope_vwap","regime"]
+CANDLE_COLS = ["ts","open","high","low","close","volume"]
+
+class IncrementalState:
+    """Catálogo de séries + watermark por série + tail (WARMUP_BARS) já calculado, em memória entre ciclos."""
+
+    def __init__(self):
+        ensure_watermark_tables()
+        self.watermarks = load_watermarks()
+        self.tails = {}
+        self.catalog = None
+        self.catalog_at = 0.0
+
+    def series(self):
+        if self.catalog is None or time.time() - self.catalog_at >= CATALOG_REFRESH_SEC:
+            refresh_catalog()
+            self.catalog = load_catalog()
+            self.catalog_at = time.time()
+        return self.catalog
+
+def process_series_incremental(st: IncrementalState, s, tf, lookback_bars=3000):
+    wm = st.watermarks.get((s, tf))
+    if wm is None:
+        # série nova: cálculo completo com padding, como no modo padrão
+        df = add_indicators(fetch_candles(s, tf, since_ts=None, pad_bars=lookback_bars))
+        if df.empty:
+            return 0
+        fdf = df.dropna(subset=FEATURE_COLS).copy()
+    else:
+        new = fetch_candles_after(s, tf, wm)
+        if new.empty:
+            return 0
+        tail = st.tails.get((s, tf))
+        if tail is None:
+            tail = fetch_warmup_tail(s, tf, wm)
+        seeds = tail.iloc[0][["ema_fast","ema_slow"]].to_dict() if not tail.empty else None
+        if seeds is not None and pd.isna(list(seeds.values())).any():
+            # sem EMA gravada para semear: volta ao padding
+            tail = fetch_candles(s, tf, since_ts=None, pad_bars=lookback_bars)
+            tail = tail[tail["ts"] <= wm]
+            seeds = None
+        frame = pd.concat([tail[CANDLE_COLS], new[CANDLE_COLS]], ignore_index=True)
+        df = add_indicators(frame, seeds=seeds)
+        fdf = df[df["ts"] > wm].dropna(subset=FEATURE_COLS).copy()
+    inserted = upsert_features(s, tf, fdf, watermark=True)
+    if inserted:
+        st.watermarks[(s, tf)] = pd.Timestamp(fdf["ts"].max())
+    st.tails[(s, tf)] = df[df["ts"] <= st.watermarks.get((s, tf), df["ts"].max())][CANDLE_COLS + ["ema_fast","ema_slow"]] \
+        .tail(WARMUP_BARS).reset_index(drop=True)
+    return inserted
+
+def process_incremental(st: IncrementalState, lookback_bars=3000):
+    pairs = st.series()
+    if pairs.empty:
+        log("Catálogo de séries vazio. Finalizando.")
+        return
+    for r in pairs.itertuples(index=False):
+        s, tf = r.symbol, r.timeframe
+        try:
+            inserted = process_series_incremental(st, s, tf, lookback_bars)
+            log(f"[{s} {tf}] incremental: upsert de {inserted} linhas.")
+        except Exception as e:
+            st.tails.pop((s, tf), None)
+            log(f"[{s} {tf}] ERRO: {e}")
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--once", action="store_true", help="Roda apenas uma vez e sai")
     ap.add_argument("--lookback", type=int, default=3000, help="Barras para recomputo (padding)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Watermark por série + catálogo persistido; busca só barras novas + tail de aquecimento")
     args = ap.parse_args()
 
+    if args.incremental:
+        st = IncrementalState()
+        while True:
+            process_incremental(st, lookback_bars=args.lookback)
+            if args.once:
+                return
+            time.sleep(30)
+
     if args.once:
         process_once(lookback_bars=args.lookback)
         return
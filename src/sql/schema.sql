@@ -91,3 +91,13 @@ create index if not exists ix_book_time   on md_book (ts);
 create index if not exists ix_oi_time     on md_open_interest (ts);
 create index if not exists ix_fund_time   on md_funding (ts);
 create index if not exists ix_spread_time on md_spread (ts);
+
+-- Sketch P² dos quantis de regime (src/features/quantiles.py), estado por símbolo/intervalo
+create table if not exists feature_quantile_sketch (
+  symbol text not null,
+  interval text not null,
+  name text not null,          -- série de origem (ex. atr_pct)
+  state jsonb not null,        -- marcadores P² + marca d'água last_ts (ns)
+  updated_at timestamptz not null default now(),
+  primary key (symbol, interval, name)
+);
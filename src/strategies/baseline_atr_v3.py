@@ -9,7 +9,8 @@ def _in_funding_block(ts, minutes: int) -> bool:
     minute = ts.minute
     return (minute < minutes) or (minute >= 60 - minutes)
 
-def baseline_atr_v3(df: pd.DataFrame, cfg: dict) -> dict:
+def baseline_atr_v3(df: pd.DataFrame, cfg: dict, path=None) -> dict:
+    # path: src/backtest/intrabar.SubBars de df -> TP/stop pelo primeiro toque no caminho 1m (senão, close)
     tp_mult = cfg["execution"]["tp_atr_mult"]
     sl_mult = cfg["execution"]["sl_atr_mult"]
     partial_r = cfg["execution"]["partial_at_r"]
@@ -52,7 +53,7 @@ def baseline_atr_v3(df: pd.DataFrame, cfg: dict) -> dict:
 
     trades = []
 
-    for i, row in df.iterrows():
+    for n, (i, row) in enumerate(df.iterrows()):
         ts = row["close_time"]
         price = float(row["close"])
         atr = float(row["atr"])
@@ -60,6 +61,30 @@ def baseline_atr_v3(df: pd.DataFrame, cfg: dict) -> dict:
         adx = float(row["adx"])
         atrp = float(row["atr_pct"])
 
+        # TP/stop em repouso contra as sub-barras da barra (antes de qualquer filtro: a ordem está no book)
+        covered = path is not None and path.hi[n] > path.lo[n]
+        if position != 0 and covered:
+            stop = sl
+            if trail is not None:
+                stop = max(sl, trail) if position == 1 else min(sl, trail)
+            kind, fill = path.touch(n, position, tp, stop)
+            if kind != 0:
+                # TP é limite (sai no nível); stop sai a mercado, com slippage
+                slip = 0.0 if kind == 1 else est_slippage(fill, atr, slip_bps_base, slip_frac_atr)
+                exit_p = fill - slip if position == 1 else fill + slip
+                hours = max(0.0, (ts - entry_time).total_seconds() / 3600.0)
+                fund = funding_cost(hours, exit_p * qty, cfg["funding"]["rate_per_hour"])
+                cost = trade_cost(entry_price, exit_p, qty, maker_bps, taker_bps, mode)
+                pnl_trade = ((exit_p - entry_price) if position == 1 else (entry_price - exit_p)) * qty - cost - fund
+                realized += pnl_trade
+                trades.append(pnl_trade)
+                consec_losses = consec_losses + 1 if pnl_trade < 0 else 0
+                position = 0
+                qty = 0.0
+                if consec_losses >= max_consec:
+                    break
+                continue
+
         # aplicar bloqueio de funding (simplificado por hora)
         if _in_funding_block(ts, block_minutes):
             # opcionalmente fechar posição próxima do funding (não faremos aqui)
@@ -126,9 +151,9 @@ def baseline_atr_v3(df: pd.DataFrame, cfg: dict) -> dict:
                     # move SL para BE
                     sl = min(sl, entry_price)
 
-                hit_tp = price >= tp
-                hit_sl = price <= sl if sl is not None else False
-                hit_trail = trail is not None and price <= trail
+                hit_tp = not covered and price >= tp
+                hit_sl = not covered and (price <= sl if sl is not None else False)
+                hit_trail = not covered and trail is not None and price <= trail
 
                 if hit_tp or hit_sl or hit_trail or (use_adx and adx < adx_min):
                     exit_p = price - est_slippage(price, atr, slip_bps_base, slip_frac_atr) if mode=="taker" else price
@@ -156,9 +181,9 @@ def baseline_atr_v3(df: pd.DataFrame, cfg: dict) -> dict:
                     qty -= half
                     sl = max(sl, entry_price)
 
-                hit_tp = price <= tp
-                hit_sl = price >= sl if sl is not None else False
-                hit_trail = trail is not None and price >= trail
+                hit_tp = not covered and price <= tp
+                hit_sl = not covered and (price >= sl if sl is not None else False)
+                hit_trail = not covered and trail is not None and price >= trail
 
                 if hit_tp or hit_sl or hit_trail or (use_adx and adx < adx_min):
                     exit_p = price + est_slippage(price, atr, slip_bps_base, slip_frac_atr) if mode=="taker" else price
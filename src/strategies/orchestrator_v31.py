@@ -1,27 +1,12 @@
 import pandas as pd
-from src.strategies.trend_v31 import run_trend
-from src.strategies.meanrev_v31 import run_meanrev
+# mesmas regras de strategies/trend_v31 e meanrev_v31, sobre arrays
+from src.backtest.array_engine import run_regimes
 
-def run_backtest_orchestrated(df_feat: pd.DataFrame, cfg: dict):
+def run_backtest_orchestrated(df_feat: pd.DataFrame, cfg: dict, sub=None):
+    # sub: src/backtest/intrabar.SubBars de df_feat (TP/stop pelo caminho 1m) ou None (só close)
     # Segmenta por regime usando ADX: >= limiar => tendência; < limiar => range
-    adx_min = cfg["filters"]["adx_trend_min"]
-    df = df_feat.copy().reset_index(drop=True)
-    regimes = (df["adx"] >= adx_min).astype(int)  # 1 trend, 0 range
-
-    total_pnl=0.0; all_trades=[]; wins=0; losses=0
-
-    # quebras de regime
-    start=0
-    for i in range(1, len(df)+1):
-        if i==len(df) or regimes.iloc[i] != regimes.iloc[i-1]:
-            block = df.iloc[start:i].copy()
-            if len(block) > 10:
-                if regimes.iloc[start]==1:
-                    pnl, tr, w, l = run_trend(block, cfg)
-                else:
-                    pnl, tr, w, l = run_meanrev(block, cfg)
-                total_pnl += pnl; all_trades.extend(tr); wins+=w; losses+=l
-            start=i
+    # (run-length sobre o array de regime; cfg orchestrator.single_pass roda cada estratégia uma vez só)
+    total_pnl, all_trades, wins, losses = run_regimes(df_feat, cfg, sub=sub)
 
     return {
         "pnl_total": total_pnl,
@@ -1,6 +1,6 @@
 import pandas as pd
-from src.strategies.trend_v31 import run_trend
-from src.strategies.meanrev_v31 import run_meanrev
+# mesmas regras de strategies/trend_v31 e meanrev_v31, sobre arrays
+from src.backtest.array_engine import run_regimes
 
 def _pnls_from_trades(trades):
     vals=[]
@@ -74,28 +74,13 @@ def _apply_risk_guards(df_all, trades, cfg):
     total = sum(t["pnl"] for t in out)
     return out, total, wins, losses
 
-def run_backtest_orchestrated(df_feat: pd.DataFrame, cfg: dict):
-    adx_min = cfg["filters"]["adx_trend_min"]
-    df = df_feat.copy().reset_index(drop=True)
-    regimes = (df["adx"] >= adx_min).astype(int)  # 1 trend, 0 range
-
-    raw_trades=[]; total_pnl=0.0; wins=0; losses=0
-    start=0
-    for i in range(1, len(df)+1):
-        if i==len(df) or regimes.iloc[i] != regimes.iloc[i-1]:
-            block = df.iloc[start:i].copy()
-            if len(block)>10:
-                if regimes.iloc[start]==1:
-                    pnl, tr, w, l = run_trend(block, cfg)
-                else:
-                    pnl, tr, w, l = run_meanrev(block, cfg)
-                raw_trades.extend(tr)
-                total_pnl += pnl
-                wins += w; losses += l
-            start=i
+def run_backtest_orchestrated(df_feat: pd.DataFrame, cfg: dict, sub=None):
+    # sub: src/backtest/intrabar.SubBars de df_feat (TP/stop pelo caminho 1m) ou None (só close)
+    # blocos de regime por ADX (>= limiar => tendência; < limiar => range), sem laço por barra
+    total_pnl, raw_trades, wins, losses = run_regimes(df_feat, cfg, sub=sub)
 
     # aplica cortes de risco sobre os trades consolidados
-    cut_trades, cut_total, cw, cl = _apply_risk_guards(df, raw_trades, cfg)
+    cut_trades, cut_total, cw, cl = _apply_risk_guards(df_feat, raw_trades, cfg)
     return {
         "pnl_total": cut_total,
         "trades": cut_trades,